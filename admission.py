@@ -0,0 +1,198 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from metrics import counter, gauge
+
+AdmissionKey = Tuple[int, int, str]  # (guild_id, user_id, category)
+# Called with the submitter's place in the queue (1 = next) while they wait for the server-wide budget.
+Notify = Callable[[int], Awaitable[None]]
+
+ADMIT = "admit"
+DUPLICATE = "duplicate"
+RATE_LIMITED = "rate_limited"
+BUSY = "busy"
+
+DECISIONS = counter("admission_decisions_total", "Ticket submissions by admission decision (admit, duplicate, rate_limited, busy)", ("decision",))
+QUEUED = gauge("admission_queued", "Ticket submissions waiting for the server-wide open budget")
+
+LIMIT_KEYS = ("max_open_per_user", "user_per_hour", "user_burst")
+
+
+class TokenBuckets:
+    # One token bucket per key, refilled lazily on use. A bucket that has refilled completely is the same as
+    # no bucket, so those are dropped once the dict doubles in size: memory follows recent submitters only.
+    def __init__(self):
+        self._buckets: Dict[Any, Tuple[float, float, float]] = {}  # key -> (tokens, last refill, time it is full again)
+        self._prune_at = 1024
+
+    def take(self, key: Any, per_second: float, burst: float, now: float) -> float:
+        # Takes a token and returns 0, or returns the seconds until one is available.
+        if per_second <= 0:
+            return 0.0
+        tokens, last, _ = self._buckets.get(key, (burst, now, 0.0))
+        tokens = min(burst, tokens + (now - last) * per_second)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / per_second)
+            return (1 - tokens) / per_second
+        tokens -= 1
+        self._buckets[key] = (tokens, now, now + (burst - tokens) / per_second)
+        if len(self._buckets) >= self._prune_at:
+            self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+            self._prune_at = max(1024, 2 * len(self._buckets))
+        return 0.0
+
+    def give_back(self, key: Any, burst: float):
+        if key in self._buckets:
+            tokens, last, full_at = self._buckets[key]
+            self._buckets[key] = (min(burst, tokens + 1), last, full_at)
+
+
+class AdmissionControl:
+    # Sits in front of ticket creation, so repeated panel submissions can't each create a channel, thread,
+    # forum post and row. In order, per submission:
+    # - a duplicate of an open ticket (more than max_open_per_user in that category) is pointed to the existing
+    #   one; a submission arriving while the same user's open in that category is still running waits for it;
+    # - a per-user bucket (user_per_hour, bursts of user_burst) rejects with a retry time;
+    # - a per-server bucket (creates_per_minute, bursts of burst) protects the server's channel-create budget.
+    #   When it is empty, submissions wait in a bounded FIFO queue and are told their position.
+    # Limits apply per category, with overrides in `categories`. The common path is a few dict lookups and no I/O.
+    def __init__(self, owned: Callable[[int, int, str], List[Dict[str, Any]]], *, max_open_per_user: int = 1,
+                 user_per_hour: float = 6.0, user_burst: float = 2.0, creates_per_minute: float = 30.0, burst: float = 10.0,
+                 queue_size: int = 50, queue_timeout: float = 300.0, notify_interval: float = 5.0,
+                 categories: Optional[Dict[str, Dict[str, float]]] = None, clock: Callable[[], float] = time.monotonic):
+        self.owned = owned
+        self.defaults = {"max_open_per_user": max_open_per_user, "user_per_hour": user_per_hour, "user_burst": user_burst}
+        self.categories = {name: {k: v for k, v in limits.items() if k in LIMIT_KEYS} for name, limits in (categories or {}).items()}
+        self.creates_per_minute = creates_per_minute
+        self.burst = burst
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.notify_interval = notify_interval
+        self.clock = clock
+        self._users = TokenBuckets()
+        self._servers = TokenBuckets()
+        self._inflight: Dict[AdmissionKey, asyncio.Future] = {}
+        self._queues: Dict[int, Deque[asyncio.Future]] = {}
+
+    def limits(self, category: str) -> Dict[str, float]:
+        overrides = self.categories.get(category)
+        return {**self.defaults, **overrides} if overrides else self.defaults
+
+    def existing(self, guild_id: int, user_id: int, category: str) -> Optional[Dict[str, Any]]:
+        # The ticket a new submission in this category would be redirected to, if any.
+        max_open = int(self.limits(category)["max_open_per_user"])
+        if max_open <= 0:
+            return None
+        owned = self.owned(guild_id, user_id, category)
+        return owned[0] if len(owned) >= max_open else None
+
+    def queued(self, guild_id: Optional[int] = None) -> int:
+        if guild_id is not None:
+            return len(self._queues.get(guild_id, ()))
+        return sum(len(q) for q in self._queues.values())
+
+    async def admit(self, guild_id: int, user_id: int, category: str, notify: Optional[Notify] = None) -> Tuple[str, Any]:
+        # Returns (decision, detail): (ADMIT, None), (DUPLICATE, ticket row), (RATE_LIMITED, seconds to wait)
+        # or (BUSY, None). After ADMIT the caller must call finish() with the opened ticket's row, or None.
+        key = (guild_id, user_id, category)
+        while True:
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            # A double submit while the first is still being created: answer with the first one's ticket.
+            try:
+                row = await asyncio.wait_for(asyncio.shield(pending), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                return self._decide(BUSY, None)
+            if row is not None:
+                return self._decide(DUPLICATE, row)
+        row = self.existing(guild_id, user_id, category)
+        if row is not None:
+            return self._decide(DUPLICATE, row)
+
+        limits = self.limits(category)
+        wait = self._users.take(key, limits["user_per_hour"] / 3600, max(1.0, limits["user_burst"]), self.clock())
+        if wait > 0:
+            return self._decide(RATE_LIMITED, wait)
+
+        self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            admitted = await self._server_turn(guild_id, notify)
+        except BaseException:
+            self.finish(guild_id, user_id, category, None)
+            raise
+        if not admitted:
+            self._users.give_back(key, max(1.0, limits["user_burst"]))
+            self.finish(guild_id, user_id, category, None)
+            return self._decide(BUSY, None)
+        return self._decide(ADMIT, None)
+
+    def finish(self, guild_id: int, user_id: int, category: str, row: Optional[Dict[str, Any]]):
+        pending = self._inflight.pop((guild_id, user_id, category), None)
+        if pending is not None and not pending.done():
+            pending.set_result(row)
+
+    @staticmethod
+    def _decide(decision: str, detail: Any) -> Tuple[str, Any]:
+        DECISIONS.labels(decision).inc()
+        return decision, detail
+
+    def _take_server(self, guild_id: int) -> float:
+        return self._servers.take(guild_id, self.creates_per_minute / 60, max(1.0, self.burst), self.clock())
+
+    async def _server_turn(self, guild_id: int, notify: Optional[Notify]) -> bool:
+        queue = self._queues.get(guild_id)
+        if not queue and self._take_server(guild_id) == 0:
+            return True
+        queue = self._queues.setdefault(guild_id, deque())
+        if len(queue) >= self.queue_size:
+            return False
+        # Each waiter holds a future that is resolved when it reaches the head of the queue; only the head
+        # waits on the bucket, so the order of arrival is kept.
+        turn = asyncio.get_running_loop().create_future()
+        queue.append(turn)
+        QUEUED.set(self.queued())
+        if len(queue) == 1:
+            turn.set_result(None)
+        deadline = self.clock() + self.queue_timeout
+        position = 0
+        try:
+            while not turn.done():
+                current = queue.index(turn) + 1
+                if current != position:
+                    position = current
+                    await self._notify(notify, position)
+                remaining = deadline - self.clock()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(asyncio.shield(turn), timeout=min(remaining, self.notify_interval))
+                except asyncio.TimeoutError:
+                    pass
+            while (wait := self._take_server(guild_id)) > 0:
+                if position != 1:
+                    position = 1
+                    await self._notify(notify, position)
+                if self.clock() + wait > deadline:
+                    return False
+                await asyncio.sleep(wait)
+            return True
+        finally:
+            head = queue[0] is turn
+            queue.remove(turn)
+            if head and queue and not queue[0].done():
+                queue[0].set_result(None)
+            if not queue:
+                self._queues.pop(guild_id, None)
+            QUEUED.set(self.queued())
+
+    @staticmethod
+    async def _notify(notify: Optional[Notify], position: int):
+        if notify is None:
+            return
+        try:
+            await notify(position)
+        except Exception as e:
+            print("Admission queue notice failed:", e)
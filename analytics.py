@@ -0,0 +1,222 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import tomllib
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from db import DB_CALL_MS, get_db, ensure_schema, close_db
+from metrics import timed
+
+GRANULARITIES = {"hour": 3600, "day": 86400}
+ALL_STAFF = 0
+CURSOR_KEY = "analytics_cursor"
+COUNTED_STATUSES = {"open": "opened", "claimed": "claimed", "closed": "closed", "failed": "failed"}
+SKETCH_COLUMNS = {"claimed": "claim_sketch", "closed": "close_sketch"}
+
+
+class LatencySketch:
+    # Relative-error quantile sketch (DDSketch-style): a value lands in log bucket ceil(log_gamma(v)), so every
+    # estimate is within `alpha` of the true quantile. Two sketches merge by adding bucket counts, which is what
+    # lets hourly buckets roll up into any window without keeping raw samples.
+    def __init__(self, alpha: float = 0.01, bins: Optional[Dict[int, int]] = None, zero: int = 0):
+        self.alpha = alpha
+        self.gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = dict(bins or {})
+        self.zero = zero
+
+    @property
+    def count(self) -> int:
+        return self.zero + sum(self.bins.values())
+
+    def add(self, value: float, count: int = 1):
+        if value <= 1e-3:
+            self.zero += count
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self.bins[index] = self.bins.get(index, 0) + count
+
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        if other.alpha != self.alpha:
+            raise ValueError("cannot merge sketches with different accuracy")
+        self.zero += other.zero
+        for index, n in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + n
+        return self
+
+    def quantile(self, q: float) -> Optional[float]:
+        total = self.count
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = self.zero
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.bins):
+            seen += self.bins[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_json(self) -> str:
+        return json.dumps({"a": self.alpha, "z": self.zero, "b": {str(k): v for k, v in self.bins.items()}}, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text: Optional[str]) -> "LatencySketch":
+        if not text:
+            return cls()
+        data = json.loads(text)
+        return cls(data["a"], {int(k): v for k, v in data["b"].items()}, data["z"])
+
+
+# ---------- Folding events into rollups ----------
+
+EVENTS_SQL = """
+SELECT e.id, e.ticket_id, e.status, e.actor_id, e.at, COALESCE(t.guild_id, 0) AS guild_id, COALESCE(t.category, '') AS category, t.claimed_by,
+       (SELECT MIN(f.at) FROM ticket_events f WHERE f.ticket_id = e.ticket_id) AS opened_at,
+       EXISTS (SELECT 1 FROM ticket_events f WHERE f.ticket_id = e.ticket_id AND f.status = e.status AND f.id < e.id) AS repeated
+FROM ticket_events e LEFT JOIN tickets t ON t.id = e.ticket_id
+WHERE e.id > ? ORDER BY e.id LIMIT ?
+"""
+
+# (guild_id, granularity, bucket_start, category, staff_id), the ticket_rollups primary key.
+RollupKey = Tuple[int, str, int, str, int]
+
+
+def fold_events(rows: Iterable[Dict[str, Any]]) -> Dict[RollupKey, Dict[str, Any]]:
+    # Only the first time a ticket reaches a status counts, so reopen/close cycles don't inflate volumes.
+    deltas: Dict[RollupKey, Dict[str, Any]] = {}
+    for row in rows:
+        column = COUNTED_STATUSES.get(row["status"])
+        if column is None or row["repeated"]:
+            continue
+        staff = row["actor_id"] if row["status"] == "claimed" else row["claimed_by"]
+        elapsed = max(0.0, row["at"] - row["opened_at"]) if row["opened_at"] is not None else None
+        for granularity, width in GRANULARITIES.items():
+            bucket = int(row["at"] // width * width)
+            for staff_id in {ALL_STAFF, staff or ALL_STAFF}:
+                delta = deltas.setdefault((row["guild_id"], granularity, bucket, row["category"], staff_id), {"opened": 0, "claimed": 0, "closed": 0, "failed": 0})
+                delta[column] += 1
+                if column in SKETCH_COLUMNS and elapsed is not None:
+                    delta.setdefault(SKETCH_COLUMNS[column], LatencySketch()).add(elapsed)
+    return deltas
+
+
+@timed(DB_CALL_MS)
+async def apply_event_batch(db_path: str, batch_size: int) -> int:
+    database = await get_db(db_path)
+    async with database.write() as conn:
+        # BEGIN IMMEDIATE: a backfill in another process and the bot's loop can't fold the same events twice.
+        await conn.execute("BEGIN IMMEDIATE")
+        cursor_rows = await conn.execute_fetchall("SELECT value FROM kv WHERE key = ?", (CURSOR_KEY,))
+        cursor = int(cursor_rows[0][0]) if cursor_rows else 0
+        rows = [dict(r) for r in await conn.execute_fetchall(EVENTS_SQL, (cursor, batch_size))]
+        if not rows:
+            return 0
+        for key, delta in fold_events(rows).items():
+            existing = await conn.execute_fetchall(
+                "SELECT opened, claimed, closed, failed, claim_sketch, close_sketch FROM ticket_rollups "
+                "WHERE guild_id = ? AND granularity = ? AND bucket_start = ? AND category = ? AND staff_id = ?", key
+            )
+            current = dict(existing[0]) if existing else {"opened": 0, "claimed": 0, "closed": 0, "failed": 0, "claim_sketch": None, "close_sketch": None}
+            sketches = []
+            for name in ("claim_sketch", "close_sketch"):
+                if name in delta:
+                    sketches.append(LatencySketch.from_json(current[name]).merge(delta[name]).to_json())
+                else:
+                    sketches.append(current[name])
+            await conn.execute(
+                "INSERT OR REPLACE INTO ticket_rollups (guild_id, granularity, bucket_start, category, staff_id, opened, claimed, closed, failed, claim_sketch, close_sketch) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (*key, current["opened"] + delta["opened"], current["claimed"] + delta["claimed"], current["closed"] + delta["closed"],
+                 current["failed"] + delta["failed"], *sketches)
+            )
+        await conn.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (CURSOR_KEY, str(rows[-1]["id"])))
+        return len(rows)
+
+
+async def apply_events(db_path: str, batch_size: int = 5000) -> int:
+    # Folds every event past the stored cursor; the cursor moves in the same transaction as the rollups.
+    applied = 0
+    while True:
+        n = await apply_event_batch(db_path, batch_size)
+        applied += n
+        if n < batch_size:
+            return applied
+
+
+async def backfill(db_path: str, rebuild: bool = False) -> Tuple[int, int]:
+    # Tickets from before the event log get synthesized events: opened at created_at, and the current
+    # status at updated_at. Their claim times are unknown, so only closes get a latency.
+    database = await get_db(db_path)
+    async with database.write() as conn:
+        await conn.execute("BEGIN IMMEDIATE")
+        missing = "NOT EXISTS (SELECT 1 FROM ticket_events e WHERE e.ticket_id = t.id AND e.status IN ('pending', 'open'))"
+        epoch = "(julianday({}) - 2440587.5) * 86400.0"
+        cur = await conn.execute(
+            f"INSERT INTO ticket_events (ticket_id, status, actor_id, at, backfilled) "
+            f"SELECT t.id, 'open', t.user_id, {epoch.format('t.created_at')}, 1 FROM tickets t WHERE {missing}"
+        )
+        synthesized = cur.rowcount
+        await conn.execute(
+            f"INSERT INTO ticket_events (ticket_id, status, actor_id, at, backfilled) "
+            f"SELECT t.id, t.status, CASE WHEN t.status = 'claimed' THEN t.claimed_by END, {epoch.format('t.updated_at')}, 1 "
+            f"FROM tickets t WHERE t.status IN ('claimed', 'closed', 'failed') "
+            f"AND NOT EXISTS (SELECT 1 FROM ticket_events e WHERE e.ticket_id = t.id AND e.status = t.status)"
+        )
+        if rebuild:
+            await conn.execute("DELETE FROM ticket_rollups")
+            await conn.execute("DELETE FROM kv WHERE key = ?", (CURSOR_KEY,))
+    return synthesized, await apply_events(db_path)
+
+
+# ---------- Reading rollups ----------
+
+def summarize(rows: Iterable[Dict[str, Any]], key: str) -> List[Dict[str, Any]]:
+    # Merges rollup rows that share `key` (e.g. category or staff_id) into counts and latency percentiles (minutes).
+    groups: Dict[Any, Dict[str, Any]] = {}
+    for row in rows:
+        g = groups.setdefault(row[key], {key: row[key], "opened": 0, "claimed": 0, "closed": 0, "failed": 0,
+                                         "claim": LatencySketch(), "close": LatencySketch()})
+        for column in ("opened", "claimed", "closed", "failed"):
+            g[column] += row[column]
+        g["claim"].merge(LatencySketch.from_json(row["claim_sketch"]))
+        g["close"].merge(LatencySketch.from_json(row["close_sketch"]))
+    out = []
+    for g in groups.values():
+        claim, close = g.pop("claim"), g.pop("close")
+        for name, sketch in (("claim", claim), ("close", close)):
+            for q in (50, 90):
+                value = sketch.quantile(q / 100)
+                g[f"time_to_{name}_p{q}_min"] = round(value / 60, 1) if value is not None else None
+        out.append(g)
+    return sorted(out, key=lambda g: -g["opened"])
+
+
+def _default_db_path() -> str:
+    config_path = "config.toml" if os.path.exists("config.toml") else "config.example.toml"
+    with open(config_path, "rb") as f:
+        return tomllib.load(f)["app"]["db_path"]
+
+
+async def _main(args: argparse.Namespace):
+    db_path = args.db or _default_db_path()
+    await ensure_schema(db_path)
+    try:
+        if args.command == "backfill":
+            synthesized, applied = await backfill(db_path, rebuild=args.rebuild)
+            print(f"Synthesized events for {synthesized} ticket(s); folded {applied} event(s) into rollups.")
+        else:
+            print(f"Folded {await apply_events(db_path)} event(s) into rollups.")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ticket analytics rollups")
+    parser.add_argument("command", choices=["backfill", "apply"])
+    parser.add_argument("--db", help="SQLite file (defaults to [app] db_path)")
+    parser.add_argument("--rebuild", action="store_true", help="with backfill: drop the rollups and fold every event again")
+    asyncio.run(_main(parser.parse_args()))
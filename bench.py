@@ -0,0 +1,1359 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import random
+import sqlite3
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiosqlite
+from aiohttp import web
+
+import db
+import integrations
+import metrics
+import transcripts
+from guild_settings import GuildSettingsCache
+from outbox import OutboxEngine
+from retention import Retention, format_report
+from transcripts import TranscriptArchiver
+import warm_pool
+from warm_pool import WarmPool
+
+Op = Callable[[str, int], Awaitable]
+
+# ---------- db: connect-per-call vs pooled ----------
+
+# The pre-pool db.py opened a fresh connection (thread + file handle) for every call.
+async def _legacy_write(db_path: str, query: str, params: tuple):
+    async with aiosqlite.connect(db_path) as conn:
+        await conn.execute(query, params)
+        await conn.commit()
+
+async def _legacy_read(db_path: str, query: str, params: tuple):
+    async with aiosqlite.connect(db_path) as conn:
+        conn.row_factory = aiosqlite.Row
+        rows = await conn.execute_fetchall(query, params)
+        return [dict(r) for r in rows]
+
+LEGACY_OPS: List[Tuple[str, Op]] = [
+    ("add_ticket_full", lambda p, i: _legacy_write(p, "INSERT INTO tickets (user_id, username, reason, guild_id, thread_id, channel_id, forum_post_id, category, ko_fi, steam_id, cftools_id, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'open')", (i, f"user{i}", "bench", 1, i, 0, 0, "General", None, None, None))),
+    ("get_ticket_by_thread", lambda p, i: _legacy_read(p, "SELECT * FROM tickets WHERE thread_id = ?", (i,))),
+    ("set_ticket_status", lambda p, i: _legacy_write(p, "UPDATE tickets SET status = ?, claimed_by = COALESCE(?, claimed_by), updated_at = CURRENT_TIMESTAMP WHERE thread_id = ?", ("claimed", 42, i))),
+    ("queue_message", lambda p, i: _legacy_write(p, "INSERT INTO outbox (thread_id, message, created_by, delivered) VALUES (?, ?, ?, 0)", (i, f"msg {i}", "bench"))),
+    ("mark_outbox_delivered", lambda p, i: _legacy_write(p, "UPDATE outbox SET delivered = 1 WHERE id = ?", (i + 1,))),
+    ("fetch_outbox", lambda p, i: _legacy_read(p, "SELECT * FROM outbox WHERE delivered = 0 ORDER BY created_at ASC", ())),
+]
+
+POOLED_OPS: List[Tuple[str, Op]] = [
+    ("add_ticket_full", lambda p, i: db.add_ticket_full(p, user_id=i, username=f"user{i}", reason="bench", guild_id=1, thread_id=i, channel_id=None, forum_post_id=None, category="General", ko_fi=None, steam_id=None, cftools_id=None)),
+    ("get_ticket_by_thread", lambda p, i: db.get_ticket_by_thread(p, i)),
+    ("set_ticket_status", lambda p, i: db.set_ticket_status(p, i, "claimed", claimed_by=42)),
+    ("queue_message", lambda p, i: db.queue_message(p, i, f"msg {i}", "bench")),
+    ("mark_outbox_delivered", lambda p, i: db.mark_outbox_delivered(p, i + 1)),
+    ("fetch_outbox", lambda p, i: db.fetch_outbox(p)),
+]
+
+async def _run_ops(db_path: str, ops: List[Tuple[str, Op]], n: int, concurrency: int) -> Dict[str, float]:
+    results = {}
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(op: Op, i: int):
+        async with sem:
+            await op(db_path, i)
+
+    for name, op in ops:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(op, i) for i in range(1, n + 1)))
+        results[name] = n / (time.perf_counter() - start)
+    return results
+
+async def bench_db(n: int, concurrency: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.db")
+        con = sqlite3.connect(legacy_path)
+        con.executescript(db.SCHEMA + db.INDEXES)
+        con.close()
+        legacy = await _run_ops(legacy_path, LEGACY_OPS, n, concurrency)
+
+        pooled_path = os.path.join(tmp, "pooled.db")
+        await db.open_db(pooled_path)
+        await db.ensure_schema(pooled_path)
+        pooled = await _run_ops(pooled_path, POOLED_OPS, n, concurrency)
+        await db.close_db(pooled_path)
+
+    print(f"db API, {n} ops each, concurrency {concurrency}")
+    print(f"{'operation':<24}{'before ops/s':>14}{'after ops/s':>14}{'speedup':>10}")
+    for name, _ in POOLED_OPS:
+        print(f"{name:<24}{legacy[name]:>14.0f}{pooled[name]:>14.0f}{pooled[name] / legacy[name]:>9.1f}x")
+
+# ---------- outbox: drain time and end-to-end latency ----------
+
+class FakeChannel:
+    def __init__(self, channel_id: int, latency: float, delivered: Dict[str, float]):
+        self.id = channel_id
+        self.latency = latency
+        self.delivered = delivered
+
+    async def send(self, content: str):
+        await asyncio.sleep(self.latency)
+        self.delivered[content] = time.perf_counter()
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+async def bench_outbox(n: int, channels: int, latency: float, batch_size: int, concurrency: int):
+    delivered: Dict[str, float] = {}
+    fakes = {i: FakeChannel(i, latency, delivered) for i in range(1, channels + 1)}
+
+    async def resolve(target_id: int):
+        return fakes.get(target_id)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "outbox.db")
+        await db.open_db(path)
+        await db.ensure_schema(path)
+        engine = OutboxEngine(path, resolve, batch_size=batch_size, concurrency=concurrency)
+        worker = asyncio.create_task(engine.run_forever())
+
+        queued: Dict[str, float] = {}
+        sem = asyncio.Semaphore(32)
+
+        async def enqueue(i: int):
+            async with sem:
+                text = f"bench message {i}"
+                queued[text] = time.perf_counter()
+                await db.queue_message(path, (i % channels) + 1, text, "bench")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(enqueue(i) for i in range(n)))
+        enqueued = time.perf_counter() - start
+        while len(delivered) < n:
+            await asyncio.sleep(0.01)
+        drain = time.perf_counter() - start
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+        await db.close_db(path)
+
+    latencies = [(delivered[k] - queued[k]) * 1000 for k in queued]
+    print(f"outbox: {n} messages over {channels} channels, send latency {latency * 1000:.0f} ms, batch {batch_size}, concurrency {concurrency}")
+    print(f"enqueue time      {enqueued:8.2f} s")
+    print(f"drain time        {drain:8.2f} s  ({n / drain:.0f} msg/s)")
+    print(f"e2e latency ms    p50 {percentile(latencies, 50):.0f}  p95 {percentile(latencies, 95):.0f}  p99 {percentile(latencies, 99):.0f}  max {max(latencies):.0f}")
+
+# ---------- enrich: concurrent, cached, timeout-bounded profile lookups ----------
+
+async def start_fake_profile_server(latency: Dict[str, float], hits: Dict[str, int]) -> Tuple[web.AppRunner, str]:
+    async def handler(request: web.Request):
+        provider = request.match_info["provider"]
+        hits[provider] = hits.get(provider, 0) + 1
+        await asyncio.sleep(latency.get(provider, 0))
+        return web.json_response({"id": request.match_info["key"], "source": provider})
+
+    app = web.Application()
+    app.router.add_get("/{provider}/{key}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+async def bench_enrich(latency_ms: float, slow_ms: float, timeout: float, n: int):
+    latency = {"kofi": latency_ms / 1000, "steam": latency_ms / 1000, "cftools": latency_ms / 1000}
+    hits: Dict[str, int] = {}
+    runner, base = await start_fake_profile_server(latency, hits)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "enrich.db")
+        await db.ensure_schema(path)
+        integrations.configure(db_path=path, kofi_url=f"{base}/kofi", steam_url=f"{base}/steam",
+                               cftools_url=f"{base}/cftools", timeout_seconds=timeout)
+        args = lambda i: (f"https://ko-fi.com/player{i}", f"7656119{i:010d}", f"cf{i}")
+
+        start = time.perf_counter()
+        for i in range(n):
+            ko_fi, steam, cftools = args(i)
+            await integrations.fetch_kofi_profile(ko_fi)
+            await integrations.fetch_steam_profile(steam)
+            await integrations.fetch_cftools_profile(cftools)
+        sequential = (time.perf_counter() - start) / n * 1000
+
+        start = time.perf_counter()
+        for i in range(n):
+            await integrations.enrich_context(*args(n + i))
+        cold = (time.perf_counter() - start) / n * 1000
+
+        start = time.perf_counter()
+        for i in range(n):
+            await integrations.enrich_context(*args(n + i))
+        warm = (time.perf_counter() - start) / n * 1000
+
+        # Fresh memory cache, same SQLite file: simulates a restart.
+        integrations.configure()
+        start = time.perf_counter()
+        for i in range(n):
+            await integrations.enrich_context(*args(n + i))
+        restart = (time.perf_counter() - start) / n * 1000
+
+        hits.clear()
+        await asyncio.gather(*(integrations.enrich_context(*args(10 * n)) for _ in range(50)))
+        dedup_hits = sum(hits.values())
+
+        latency["steam"] = slow_ms / 1000
+        start = time.perf_counter()
+        partial = await integrations.enrich_context(*args(20 * n))
+        partial_ms = (time.perf_counter() - start) * 1000
+
+        await integrations.close()
+        await db.close_db(path)
+    await runner.cleanup()
+
+    print(f"enrich: provider latency {latency_ms:.0f} ms, timeout {timeout * 1000:.0f} ms, {n} tickets")
+    print(f"sequential, uncached   {sequential:8.1f} ms/ticket")
+    print(f"concurrent, cold       {cold:8.1f} ms/ticket")
+    print(f"memory cache hit       {warm:8.3f} ms/ticket")
+    print(f"after restart (SQLite) {restart:8.2f} ms/ticket")
+    print(f"50 concurrent same-key lookups -> {dedup_hits} upstream requests")
+    print(f"steam at {slow_ms:.0f} ms -> returned in {partial_ms:.0f} ms with {sorted(partial)}")
+
+# ---------- fts: search latency at volume ----------
+
+FTS_TOPICS = ["duplication glitch", "base raided", "car despawned", "stuck in wall", "lost gear after restart",
+              "hacker spotted", "appeal ban", "donation perks missing", "server lag", "helicopter crash loot"]
+
+def generate_ticket_rows(n: int, seed: int = 7):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(20000)]
+    for i in range(1, n + 1):
+        words = rng.sample(vocab, 12)
+        if rng.random() < 0.02:
+            words.insert(rng.randrange(len(words)), rng.choice(FTS_TOPICS))
+        yield (i % 50000, f"player{i % 50000}", " ".join(words), 1, i, 0, 0,
+               rng.choice(["General Support", "Appeals", "Bug Report"]), f"7656119{i % 50000:010d}",
+               rng.choice(["open", "claimed", "closed"]))
+
+async def bench_fts(rows: int, messages: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "fts.db")
+        await db.ensure_schema(path)
+        await db.close_db(path)
+
+        start = time.perf_counter()
+        con = sqlite3.connect(path)
+        con.executemany(
+            "INSERT INTO tickets (user_id, username, reason, guild_id, thread_id, channel_id, forum_post_id, category, steam_id, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            generate_ticket_rows(rows)
+        )
+        rng = random.Random(11)
+        con.executemany(
+            "INSERT INTO outbox (thread_id, message, created_by, delivered) VALUES (?, ?, 'bench', 1)",
+            ((rng.randrange(1, rows + 1), f"Staff reply about {rng.choice(FTS_TOPICS)} w{rng.randrange(20000)}") for _ in range(messages))
+        )
+        con.commit()
+        con.close()
+        print(f"fts: generated {rows} tickets + {messages} outbox messages in {time.perf_counter() - start:.0f} s")
+
+        queries = ["duplication glitch", "w1234", "helicopter*", "player4242", "lag server", "76561190000000042", "w1 w2"]
+        print(f"{'query':<24}{'hits':>6}{'p50 ms':>10}{'max ms':>10}")
+        for q in queries:
+            timings = []
+            for _ in range(repeat):
+                t = time.perf_counter()
+                hits = await db.search(path, q, limit=20)
+                timings.append((time.perf_counter() - t) * 1000)
+            print(f"{q:<24}{len(hits):>6}{percentile(timings, 50):>10.2f}{max(timings):>10.2f}")
+        t = time.perf_counter()
+        await db.search(path, "duplication glitch", limit=20, offset=200)
+        print(f"{'page 11 (offset 200)':<24}{'':>6}{(time.perf_counter() - t) * 1000:>10.2f}")
+        await db.close_db(path)
+
+# ---------- plans: every query in db.py and the dashboard must use an index ----------
+
+async def bench_plans(rows: int):
+    # The check itself lives in tests/test_query_plans.py; this prints its report.
+    from tests.test_query_plans import collect_full_scans
+
+    checked, full_scans = await collect_full_scans(rows)
+    for origin, sql, plan in full_scans:
+        print(f"FULL SCAN [{origin}] {sql[:160]}")
+        for p in plan:
+            print(f"    {p}")
+    print(f"plans: {checked} distinct queries checked, {len(full_scans)} full table scan(s)")
+    return len(full_scans)
+
+# ---------- metrics: instrumentation overhead ----------
+
+async def bench_metrics(n: int):
+    family = metrics.histogram("bench_call_ms", "bench", ("call",))
+    hits = metrics.counter("bench_hits_total", "bench", ("provider", "outcome"))
+
+    async def noop():
+        pass
+
+    timed_noop = metrics.timed(family)(noop)
+
+    def per_call_ns(elapsed: float) -> float:
+        return elapsed / n * 1e9
+
+    start = time.perf_counter()
+    for _ in range(n):
+        await noop()
+    bare = per_call_ns(time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(n):
+        await timed_noop()
+    wrapped = per_call_ns(time.perf_counter() - start)
+
+    child = family.labels("direct")
+    start = time.perf_counter()
+    for i in range(n):
+        child.observe(i % 200)
+    observe = per_call_ns(time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(n):
+        hits.labels("steam", "hit").inc()
+    labelled_inc = per_call_ns(time.perf_counter() - start)
+
+    # A typical hot-path call for scale: an indexed lookup through the pool.
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "metrics.db")
+        await db.open_db(path)
+        await db.ensure_schema(path)
+        await db.add_ticket(path, 1, "user", "bench", 1, 42)
+        lookups = 2000
+        start = time.perf_counter()
+        for _ in range(lookups):
+            await db.get_ticket_by_thread(path, 42)
+        lookup_ns = (time.perf_counter() - start) / lookups * 1e9
+        await db.close_db(path)
+
+    start = time.perf_counter()
+    text = metrics.render()
+    render_ms = (time.perf_counter() - start) * 1000
+
+    overhead = wrapped - bare
+    print(f"metrics: {n} iterations")
+    print(f"await bare coroutine     {bare:8.0f} ns")
+    print(f"await @timed coroutine   {wrapped:8.0f} ns  (+{overhead:.0f} ns)")
+    print(f"histogram observe        {observe:8.0f} ns")
+    print(f"counter labels().inc()   {labelled_inc:8.0f} ns")
+    print(f"db get_ticket_by_thread  {lookup_ns:8.0f} ns  -> @timed adds {overhead / lookup_ns * 100:.2f}%")
+    print(f"render {len(metrics.REGISTRY)} families     {render_ms:8.2f} ms  ({len(text)} bytes)")
+
+# ---------- transcripts: archival throughput, memory and crash/resume ----------
+
+async def bench_transcripts(messages: int, page_size: int, latency_ms: float):
+    from fake_discord import FakeAPI, FakeGateway, FakeMember, FakeMessage, FakeTextChannel
+
+    api = FakeAPI(latency_ms / 1000)
+    gateway = FakeGateway(api)
+    author = FakeMember("player")
+    attachment = SimpleNamespace(id=1, filename="screenshot.png", size=123456, content_type="image/png", url="https://cdn.example/screenshot.png")
+
+    def make_channel() -> FakeTextChannel:
+        channel = gateway.add(FakeTextChannel(gateway, "ticket"))
+        channel.messages = [FakeMessage(channel.id, author, f"message {i} " + "lorem ipsum " * (i % 20), [attachment] if i % 25 == 0 else None)
+                            for i in range(messages)]
+        return channel
+
+    async def resolve(channel_id: int):
+        return gateway.get_channel(channel_id)
+
+    def check(archive_dir: str, pages: List[Dict[str, Any]], job: Dict[str, Any], channel: FakeTextChannel) -> bool:
+        ids = [r["id"] for p in pages for r in transcripts.read_page(archive_dir, job["path"], p["byte_offset"], p["byte_length"])]
+        on_disk = os.path.getsize(os.path.join(archive_dir, job["path"]))
+        return ids == [m.id for m in channel.messages] and on_disk == job["bytes"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "transcripts.db")
+        archive_dir = os.path.join(tmp, "archive")
+        await db.open_db(path)
+        await db.ensure_schema(path)
+
+        # Straight run: throughput and peak Python memory while archiving.
+        channel = make_channel()
+        archiver = TranscriptArchiver(path, archive_dir, resolve, page_size=page_size, page_delay=0)
+        await archiver.enqueue(1, channel.id)
+        tracemalloc.start()
+        start = time.perf_counter()
+        job = (await db.claim_transcript_jobs(path, archiver.owner, 1, 60))[0]
+        await archiver.archive(job)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        await db.finish_transcript_job(path, 1, "done")
+        job = await db.get_transcript_job(path, 1)
+        pages = await db.list_transcript_pages(path, 1)
+        straight_ok = check(archive_dir, pages, job, channel)
+        archive_kib = job["bytes"] / 1024
+
+        # Lazy page load, as the dashboard does it.
+        middle = pages[len(pages) // 2]
+        start = time.perf_counter()
+        transcripts.read_page(archive_dir, job["path"], middle["byte_offset"], middle["byte_length"])
+        page_ms = (time.perf_counter() - start) * 1000
+
+        # Crash mid-run: the worker dies without releasing its lease, leaving a half-written page behind.
+        channel = make_channel()
+        await archiver.enqueue(2, channel.id)
+        job = (await db.claim_transcript_jobs(path, archiver.owner, 1, 60))[0]
+        task = asyncio.create_task(archiver.archive(job))
+        while job["pages"] < 3:
+            await asyncio.sleep(0.001)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        with open(os.path.join(archive_dir, job["path"]), "ab") as f:
+            f.write(b"\x1f\x8b torn write")
+        await db.finish_transcript_job(path, 2, "running", retry_at=time.time() - 1)  # lease lapsed
+        restarted = TranscriptArchiver(path, archive_dir, resolve, page_size=page_size, page_delay=0, idle_interval=0.05)
+        while (await db.get_transcript_job(path, 2))["status"] != "done":
+            await restarted.step()
+        job = await db.get_transcript_job(path, 2)
+        resumed_ok = check(archive_dir, await db.list_transcript_pages(path, 2), job, channel)
+        await db.close_db(path)
+
+    print(f"transcripts: {messages} messages, {page_size} per page, API latency {latency_ms:.0f} ms")
+    print(f"archive time         {elapsed:8.2f} s  ({messages / elapsed:.0f} msg/s, {len(pages)} pages, {archive_kib:.0f} KiB)")
+    print(f"peak traced memory   {peak / 1024:8.0f} KiB")
+    print(f"load one page        {page_ms:8.2f} ms")
+    print(f"straight run intact  {straight_ok}")
+    print(f"crash + resume intact {resumed_ok}")
+    return straight_ok and resumed_ok
+
+# ---------- lifecycle: open/claim/outbox/close through bot.py against a fake Discord ----------
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    return {
+        "count": len(values),
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "max": round(max(values), 2) if values else 0.0,
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+async def _run_phase(name: str, calls: List[Callable[[], Awaitable]], concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(call: Callable[[], Awaitable]):
+        async with sem:
+            start = time.perf_counter()
+            try:
+                await call()
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                return
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(c) for c in calls))
+    elapsed = time.perf_counter() - start
+    print(f"{name:8} {len(calls)} calls in {elapsed:.2f} s", file=sys.stderr)
+    return {
+        "calls": len(calls),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "latency_ms": latency_summary(latencies),
+    }
+
+async def bench_lifecycle(tickets: int, concurrency: int, latency_ms: float, rate_limit: float, retry_after_ms: float,
+                          enrich_ms: float, thread_share: float, messages: int, archive_concurrency: int, guilds: int, shards: int,
+                          pool_size: int, create_latency_ms: float, pool_creates_per_minute: float, seed: int) -> Dict[str, Any]:
+    import bot
+    from fake_discord import FakeAPI, FakeCategory, FakeForum, FakeGateway, FakeGuild, FakeInteraction, FakeMember, FakeTextChannel
+
+    create_route = "POST /guilds/{guild_id}/channels"
+    api = FakeAPI(latency_ms / 1000, rate_limit, retry_after_ms / 1000, seed=seed)
+    gateway = FakeGateway(api)
+    rng = random.Random(seed)
+    staff_role = 1
+    # Snowflake-shaped IDs, so guilds spread over shards the way Discord's (guild_id >> 22) % shards does.
+    fake_guilds = [FakeGuild(gateway, (rng.getrandbits(40) << 22) | i, [staff_role], f"guild{i}") for i in range(guilds)]
+    guild_by_id = {g.id: g for g in fake_guilds}
+    category = FakeCategory("Tickets")
+    gateway.add(category)
+    support = gateway.add(FakeTextChannel(gateway, "support"))
+    forum = gateway.add(FakeForum(gateway, "tickets-forum"))
+    staff = FakeMember("staff", [staff_role])
+
+    profile_hits: Dict[str, int] = {}
+    runner, base = await start_fake_profile_server({p: enrich_ms / 1000 for p in ("kofi", "steam", "cftools")}, profile_hits)
+    stages: Dict[str, List[float]] = {}
+
+    def on_ticket_opened(timings: Dict[str, float]):
+        for stage, ms in timings.items():
+            stages.setdefault(stage, []).append(ms)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "lifecycle.db")
+        bot.DB_PATH = path
+        bot.bot.get_channel = gateway.get_channel
+        bot.bot.fetch_channel = gateway.fetch_channel
+        bot.ticket_open_listeners.append(on_ticket_opened)
+        bot.ticket_index = bot.TicketIndex(path)
+        bot.guild_settings = GuildSettingsCache(path)
+        engines = [OutboxEngine(path, bot.resolve_channel, is_permanent=bot.is_permanent_send_error, shard=(shard_id, shards))
+                   for shard_id in range(shards)]
+        bot.transcript_archiver = TranscriptArchiver(path, os.path.join(tmp, "transcripts"), bot.resolve_channel,
+                                                     concurrency=archive_concurrency, is_permanent=bot.is_permanent_send_error)
+
+        await db.open_db(path)
+        await db.ensure_schema(path)
+        integrations.configure(db_path=path, kofi_url=f"{base}/kofi", steam_url=f"{base}/steam", cftools_url=f"{base}/cftools")
+        await bot.ticket_index.warm()
+        # Tickets in "Thread Category" have no mapped parent, so they take the thread fallback.
+        for g in fake_guilds:
+            await bot.guild_settings.update(g.id, name=g.name, support_channel_id=support.id, staff_role_id=staff_role, forum_channel_id=forum.id,
+                                            ticket_categories={"General Support": category.id})
+        workers = [asyncio.create_task(engine.run_forever()) for engine in engines]
+        bot.warm_pool = None
+        # One ticket per user, so admission control would only add its server-wide budget; see `bench.py admission`.
+        bot.admission = None
+        pool_counts = lambda: {r: warm_pool.TAKES.labels(r).value for r in ("hit", "miss", "stale")}
+        pool_before = pool_counts()
+        if pool_size:
+            # Filled up front, as it would be during a quiet period; refills during the run use the real budget.
+            bot.warm_pool = WarmPool(path, guild_by_id.get, bot.guild_settings.get, guild_ids=guild_by_id, min_size=pool_size, max_size=pool_size,
+                                     creates_per_minute=1e9, idle_interval=0.5, rate_limited=lambda: metrics.total(metrics.DISCORD_RATE_LIMITED))
+            start = time.perf_counter()
+            while bot.warm_pool.idle() < pool_size * guilds:
+                before = bot.warm_pool.idle()
+                await bot.warm_pool.refill()
+                if bot.warm_pool.idle() == before:
+                    break
+            print(f"pool     {bot.warm_pool.idle()} channels pre-created in {time.perf_counter() - start:.2f} s", file=sys.stderr)
+            bot.warm_pool.creates_per_minute = pool_creates_per_minute
+
+            async def pool_loop():
+                while True:
+                    await bot.warm_pool.step()
+
+            workers.append(asyncio.create_task(pool_loop()))
+        if create_latency_ms:
+            api.route_latency[create_route] = create_latency_ms / 1000
+
+        users = [FakeMember(f"player{i}") for i in range(tickets)]
+
+        def submit(i: int) -> Callable[[], Awaitable]:
+            async def call():
+                modal = bot.TicketInfoModal("Thread Category" if rng.random() < thread_share else "General Support")
+                modal.reason = f"load test ticket {i}: {rng.choice(FTS_TOPICS)}"
+                modal.steam_id = f"7656119{i:010d}"
+                modal.kofi = f"https://ko-fi.com/player{i}"
+                modal.cftools = f"cf{i}"
+                await modal.on_submit(FakeInteraction(api, users[i], fake_guilds[i % guilds]))
+            return call
+
+        phases: Dict[str, Any] = {}
+        phases["open"] = await _run_phase("open", [submit(i) for i in range(tickets)], concurrency)
+        phases["open"]["stages_ms"] = {stage: latency_summary(values) for stage, values in stages.items()}
+        pool_after = pool_counts()
+        phases["open"]["warm_pool"] = {r: int(pool_after[r] - pool_before[r]) for r in pool_after}
+
+        opened = await db.list_active_tickets(path)
+        targets = [(t["channel_id"] or t["thread_id"], t["user_id"], guild_by_id[t["guild_id"]]) for t in opened]
+        user_by_id = {u.id: u for u in users}
+
+        def command(cmd, member: FakeMember, channel_id: int, guild: FakeGuild) -> Callable[[], Awaitable]:
+            async def call():
+                await cmd.callback(FakeInteraction(api, member, guild, gateway.get_channel(channel_id)))
+            return call
+
+        phases["claim"] = await _run_phase("claim", [command(bot.ticket_claim, staff, c, g) for c, _, g in targets], concurrency)
+
+        # Outbox: dashboard-style messages, timed from queue_message to the fake channel's send.
+        sent_before = len(gateway.sent)
+        queued_at: Dict[str, float] = {}
+
+        def queue(channel_id: int, guild_id: int, j: int) -> Callable[[], Awaitable]:
+            async def call():
+                text = f"staff reply {j} for {channel_id}"
+                queued_at[text] = time.perf_counter()
+                await db.queue_message(path, channel_id, text, "loadtest", guild_id=guild_id)
+            return call
+
+        start = time.perf_counter()
+        await _run_phase("queue", [queue(c, g.id, j) for c, _, g in targets for j in range(messages)], concurrency)
+        expected = len(targets) * messages
+        while sum(1 for _, text, _ in gateway.sent[sent_before:] if text in queued_at) < expected and time.perf_counter() - start < 120:
+            await asyncio.sleep(0.05)
+        drain = time.perf_counter() - start
+        deliveries = [(at - queued_at[text]) * 1000 for _, text, at in gateway.sent[sent_before:] if text in queued_at]
+        phases["outbox"] = {
+            "calls": expected,
+            "delivered": len(deliveries),
+            "seconds": round(drain, 3),
+            "throughput_per_s": round(len(deliveries) / drain, 1) if drain else 0.0,
+            "latency_ms": latency_summary(deliveries),
+        }
+        print(f"outbox   {len(deliveries)}/{expected} delivered in {drain:.2f} s", file=sys.stderr)
+
+        phases["close"] = await _run_phase("close", [command(bot.ticket_close, user_by_id[u], c, g) for c, u, g in targets], concurrency)
+
+        # Transcripts of every closed ticket, archived by the background worker.
+        finished = lambda: sum(transcripts.JOBS_FINISHED.labels(r).value for r in ("done", "failed"))
+        finished_before = finished()
+        start = time.perf_counter()
+
+        async def archive_loop():
+            while True:
+                await bot.transcript_archiver.step()
+
+        archiver = asyncio.create_task(archive_loop())
+        while finished() - finished_before < len(targets) and time.perf_counter() - start < 300:
+            await asyncio.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        archived = finished() - finished_before
+        phases["archive"] = {
+            "calls": len(targets),
+            "archived": int(archived),
+            "seconds": round(elapsed, 3),
+            "throughput_per_s": round(archived / elapsed, 1) if elapsed else 0.0,
+        }
+        print(f"archive  {int(archived)}/{len(targets)} transcripts in {elapsed:.2f} s", file=sys.stderr)
+
+        archiver.cancel()
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(archiver, *workers, return_exceptions=True)
+        await bot.transcript_archiver.close()
+        statuses: Dict[str, int] = {}
+        for row in await db.list_tickets(path):
+            statuses[row["status"]] = statuses.get(row["status"], 0) + 1
+        await integrations.close()
+        await db.close_db(path)
+    await runner.cleanup()
+    bot.ticket_open_listeners.remove(on_ticket_opened)
+
+    return {
+        "suite": "lifecycle",
+        "commit": git_commit(),
+        "config": {
+            "tickets": tickets, "concurrency": concurrency, "api_latency_ms": latency_ms, "rate_limit": rate_limit,
+            "retry_after_ms": retry_after_ms, "enrich_latency_ms": enrich_ms, "thread_share": thread_share,
+            "messages_per_ticket": messages, "archive_concurrency": archive_concurrency, "guilds": guilds, "shards": shards,
+            "warm_pool": pool_size, "create_latency_ms": create_latency_ms or latency_ms, "pool_creates_per_minute": pool_creates_per_minute, "seed": seed,
+        },
+        "phases": phases,
+        "api": {
+            route: {"calls": s["calls"], "rate_limited": s["rate_limited"], "failed": s["failed"], "latency_ms": latency_summary(s["latencies"])}
+            for route, s in sorted(api.routes.items())
+        },
+        "tickets": statuses,
+        "enrich_requests": sum(profile_hits.values()),
+    }
+
+# ---------- bus: dashboard -> bot latency, command bus vs SQLite polling ----------
+
+async def bench_bus(n: int, latency_ms: float, batch: int) -> bool:
+    import bot
+    import command_bus
+    from fake_discord import FakeAPI, FakeGateway, FakeTextChannel
+
+    api = FakeAPI(latency_ms / 1000, seed=7)
+    gateway = FakeGateway(api)
+    guild_id = 1
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bus.db")
+        bot.DB_PATH = path
+        bot.bot.get_channel = gateway.get_channel
+        bot.bot.fetch_channel = gateway.fetch_channel
+        bot.ticket_index = bot.TicketIndex(path)
+        bot.transcript_archiver = TranscriptArchiver(path, os.path.join(tmp, "transcripts"), bot.resolve_channel)
+        await db.open_db(path)
+        await db.ensure_schema(path)
+        channels = [gateway.add(FakeTextChannel(gateway, f"ticket-{i}")) for i in range(max(batch, 4))]
+        for i, ch in enumerate(channels):
+            await db.add_ticket(path, i, f"user{i}", "bench", guild_id, ch.id)
+        await bot.ticket_index.warm()
+        engine = OutboxEngine(path, bot.resolve_channel, is_permanent=bot.is_permanent_send_error)
+        worker = asyncio.create_task(engine.run_forever())
+        runner = await bot.command_bus.serve("127.0.0.1", 0)
+        url = f"http://127.0.0.1:{runner.addresses[0][1]}/commands"
+
+        async def delivered(text: str, timeout: float = 10.0) -> float:
+            deadline = time.perf_counter() + timeout
+            while time.perf_counter() < deadline:
+                for _, sent, at in reversed(gateway.sent):
+                    if sent == text:
+                        return at
+                await asyncio.sleep(0.001)
+            raise TimeoutError(text)
+
+        def dashboard_insert(thread_id: int, text: str):
+            # What the dashboard does without the bus: its own connection, then wait for the bot to notice.
+            con = sqlite3.connect(path)
+            con.execute("INSERT INTO outbox (thread_id, message, created_by, delivered, guild_id) VALUES (?, ?, 'bench', 0, ?)", (thread_id, text, guild_id))
+            con.commit()
+            con.close()
+
+        results: Dict[str, List[float]] = {"sqlite poll: delivered": [], "bus: delivered": [], "bus: acknowledged": [],
+                                           "bus: claim acknowledged": [], f"bus: batch of {batch} acknowledged": []}
+        for i in range(n):
+            text = f"poll {i}"
+            start = time.perf_counter()
+            await asyncio.to_thread(dashboard_insert, channels[0].id, text)
+            results["sqlite poll: delivered"].append((await delivered(text) - start) * 1000)
+            await asyncio.sleep(random.uniform(0, 0.05))
+        failures = 0
+        for i in range(n):
+            text = f"bus {i}"
+            start = time.perf_counter()
+            reply = await asyncio.to_thread(command_bus.send_commands, url, [{"op": "queue_message", "guild_id": guild_id, "channel_id": channels[1].id, "message": text}])
+            acked = time.perf_counter()
+            failures += reply[0].get("delivery") != "delivered"
+            results["bus: delivered"].append((await delivered(text) - start) * 1000)
+            results["bus: acknowledged"].append((acked - start) * 1000)
+        for i in range(n):
+            status = "claimed" if i % 2 == 0 else "open"
+            start = time.perf_counter()
+            reply = await asyncio.to_thread(command_bus.send_commands, url, [{"op": "set_status", "guild_id": guild_id, "channel_id": channels[2].id, "status": status, "staff_id": 42}])
+            results["bus: claim acknowledged"].append((time.perf_counter() - start) * 1000)
+            failures += not reply[0]["ok"]
+        for i in range(max(1, n // 10)):
+            commands = [{"op": "queue_message", "guild_id": guild_id, "channel_id": ch.id, "message": f"batch {i} {j}"} for j, ch in enumerate(channels[:batch])]
+            start = time.perf_counter()
+            reply = await asyncio.to_thread(command_bus.send_commands, url, commands)
+            results[f"bus: batch of {batch} acknowledged"].append((time.perf_counter() - start) * 1000)
+            failures += sum(r.get("delivery") != "delivered" for r in reply)
+
+        await runner.cleanup()
+        offline = await asyncio.to_thread(command_bus.send_commands, url, [{"op": "close", "guild_id": guild_id, "channel_id": channels[3].id}])
+        worker.cancel()
+        await asyncio.gather(worker, return_exceptions=True)
+        await bot.transcript_archiver.close()
+        await db.close_db(path)
+
+    print(f"bus: {n} sequential commands, Discord API latency ~{latency_ms:.0f} ms")
+    for name, values in results.items():
+        summary = latency_summary(values)
+        print(f"{name:34} p50 {summary['p50']:8.1f} ms   p95 {summary['p95']:8.1f} ms   max {summary['max']:8.1f} ms")
+    print(f"undelivered or failed commands: {failures}; bot down -> client falls back: {offline is None}")
+    return failures == 0 and offline is None
+
+# ---------- timers: SLA scheduler tick cost vs scanning tickets ----------
+
+async def bench_timers(sizes: List[int], ticks: int) -> bool:
+    from timers import CURSOR_KEY, REMIND, TimerScheduler
+
+    remind_after, escalate_after, auto_close_after = 1800.0, 7200.0, 72 * 3600.0
+    ok = True
+    print(f"timers: cost per tick with nothing due, {ticks} ticks; naive = read every active ticket each tick")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "timers.db")
+            await db.ensure_schema(path)
+            await db.close_db(path)
+            con = sqlite3.connect(path)
+            con.executemany(
+                "INSERT INTO tickets (user_id, username, reason, guild_id, thread_id, channel_id, forum_post_id, category, steam_id, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                generate_ticket_rows(n)
+            )
+            con.commit()
+            unclaimed = con.execute("SELECT COUNT(*) FROM tickets WHERE status = 'open'").fetchone()[0]
+            con.close()
+
+            fired: List[Tuple[int, str]] = []
+
+            async def fire(ticket_id: int, kind: str, due_at: float) -> Optional[float]:
+                fired.append((ticket_id, kind))
+                return None
+
+            def scheduler() -> TimerScheduler:
+                return TimerScheduler(path, fire, remind_after=remind_after, escalate_after=escalate_after, auto_close_after=auto_close_after)
+
+            timers = scheduler()
+            start = time.perf_counter()
+            await timers.sync()
+            replay = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(ticks):
+                await timers.sync()
+                await timers.run_due()
+            tick_us = (time.perf_counter() - start) / ticks * 1e6
+            start = time.perf_counter()
+            for _ in range(ticks):
+                await db.list_active_tickets(path)
+            naive_us = (time.perf_counter() - start) / ticks * 1e6
+
+            # Recovery: a fresh scheduler rebuilds the same heap from SQLite.
+            restarted = scheduler()
+            start = time.perf_counter()
+            await restarted.load()
+            load_ms = (time.perf_counter() - start) * 1000
+            recovered = len(restarted) == len(timers)
+
+            # Exactly the due timers fire: every unclaimed ticket's reminder, and nothing else.
+            start = time.perf_counter()
+            count = await restarted.run_due(now=time.time() + remind_after + 1)
+            fire_us = (time.perf_counter() - start) / max(count, 1) * 1e6
+            exact = len(fired) == unclaimed and all(kind == REMIND for _, kind in fired)
+            await db.close_db(path)
+        ok = ok and recovered and exact
+        print(f"{n:>9} tickets  {len(timers):>8} timers  tick {tick_us:8.1f} us   naive {naive_us:10.1f} us   "
+              f"replay {replay:6.2f} s   reload {load_ms:8.1f} ms   fired {count} reminders at {fire_us:.0f} us each"
+              f"   recovered {recovered}  exact {exact}")
+
+    # A handler that fails (Discord down, a 429 that got through) is retried with backoff instead of dropping the timer;
+    # one that keeps failing is dropped after max_attempts.
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "retry.db")
+        await db.ensure_schema(path)
+        await db.add_ticket(path, 1, "alice", "retry", 1, 500)
+        calls: Dict[int, int] = {}
+        failures = {"flaky": 1, "broken": 1_000}
+
+        def failing(limit: int):
+            async def fire(ticket_id: int, kind: str, due_at: float) -> Optional[float]:
+                calls[limit] = calls.get(limit, 0) + 1
+                if calls[limit] <= limit:
+                    raise ConnectionError("Discord unavailable")
+                return None
+            return fire
+
+        results = {}
+        for name, limit in failures.items():
+            timers = TimerScheduler(path, failing(limit), remind_after=remind_after, max_attempts=3, retry_base=30, retry_max=60)
+            await timers.sync()
+            now = time.time() + remind_after + 1
+            for _ in range(4):
+                await timers.run_due(now=now)
+                now += 61
+            results[name] = (calls.get(limit, 0), len(timers), len(await db.load_ticket_timers(path)))
+            await db.save_ticket_timers(path, [], [], (CURSOR_KEY, "0"))
+        await db.close_db(path)
+    retried = results["flaky"] == (2, 0, 0)
+    given_up = results["broken"] == (3, 0, 0)
+    print(f"handler failing once: fired on retry {retried} {results['flaky']}; failing always: dropped after 3 attempts {given_up} {results['broken']}")
+    return ok and retried and given_up
+
+# ---------- admission: duplicate submissions, per-user limits and the server-wide queue ----------
+
+async def bench_admission(n: int, spam: int, users: int, creates_per_minute: float, queue_size: int, latency_ms: float) -> bool:
+    import bot
+    from admission import ADMIT, BUSY, DECISIONS, DUPLICATE, RATE_LIMITED, AdmissionControl
+    from fake_discord import FakeAPI, FakeCategory, FakeGateway, FakeGuild, FakeInteraction, FakeMember, FakeTextChannel
+
+    ok = True
+    # Common path: a user with no open ticket, nothing queued.
+    control = AdmissionControl(lambda g, u, c: [], user_per_hour=1e9, user_burst=1e9, creates_per_minute=1e12, burst=1e12)
+    start = time.perf_counter()
+    for i in range(n):
+        decision, _ = await control.admit(1, i, "General Support")
+        control.finish(1, i, "General Support", None)
+    admit_us = (time.perf_counter() - start) / n * 1e6
+    print(f"admission: common path (admit + finish, no I/O) {admit_us:.2f} us per submission over {n}")
+
+    api = FakeAPI(latency_ms / 1000, seed=7)
+    gateway = FakeGateway(api)
+    guild = FakeGuild(gateway, 1, [1])
+    category = gateway.add(FakeCategory("Tickets"))
+    support = gateway.add(FakeTextChannel(gateway, "support"))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "admission.db")
+        bot.DB_PATH = path
+        bot.bot.get_channel = gateway.get_channel
+        bot.ticket_index = bot.TicketIndex(path)
+        bot.guild_settings = GuildSettingsCache(path)
+        bot.warm_pool = None
+        integrations.configure(db_path=path)
+        await db.open_db(path)
+        await db.ensure_schema(path)
+        await bot.ticket_index.warm()
+        await bot.guild_settings.update(guild.id, name="guild", support_channel_id=support.id, staff_role_id=1, forum_channel_id=0,
+                                        ticket_categories={"General Support": category.id})
+        bot.admission = AdmissionControl(lambda g, u, c: bot.ticket_index.owned(g, u, c), user_per_hour=6, user_burst=2,
+                                         creates_per_minute=creates_per_minute, burst=5, queue_size=queue_size, notify_interval=0.2)
+
+        def submit(user: FakeMember) -> Tuple[Callable[[], Awaitable], FakeInteraction]:
+            interaction = FakeInteraction(api, user, guild)
+            modal = bot.TicketInfoModal("General Support")
+            modal.reason, modal.steam_id, modal.kofi, modal.cftools = "bench", "", "", ""
+            return lambda: modal.on_submit(interaction), interaction
+
+        # One user double-clicking: concurrent submissions, then more after the first ticket exists.
+        spammer = FakeMember("spammer")
+        creates = lambda: api.routes.get("POST /guilds/{guild_id}/channels", {}).get("calls", 0)
+        calls = [submit(spammer) for _ in range(spam)]
+        await asyncio.gather(*(call() for call, _ in calls))
+        later = [submit(spammer) for _ in range(spam)]
+        await asyncio.gather(*(call() for call, _ in later))
+        redirected = sum("already have an open" in i.messages[-1] for _, i in calls + later)
+        spam_ok = creates() == 1 and redirected == 2 * spam - 1
+        print(f"one user, {spam} concurrent + {spam} later submissions: {creates()} channel created, {redirected} redirected to it   ok {spam_ok}")
+
+        # Closing and reopening: user_burst = 2 opens go through, the third within the hour is rate limited.
+        replies = []
+        for _ in range(2):
+            for ticket in bot.ticket_index.owned(guild.id, spammer.id, "General Support"):
+                await bot.ticket_index.set_status(ticket["id"], "closed")
+            call, interaction = submit(spammer)
+            await call()
+            replies.append(interaction.messages[-1])
+        limited = replies[0].startswith("Ticket created") and "too quickly" in replies[1]
+        print(f"close and reopen twice: {replies[0][:15]!r}, then {replies[1][:40]!r}   ok {limited}")
+        spam_ok = spam_ok and limited
+
+        # A rush: more users at once than the server budget allows; the queue admits them in arrival order.
+        arrivals: List[int] = []
+        admitted: List[int] = []
+        positions: List[int] = []
+        admit, notifier = bot.admission.admit, bot.queue_notifier
+
+        async def recording_admit(guild_id: int, user_id: int, category: str, notify=None):
+            arrivals.append(user_id)
+            decision, detail = await admit(guild_id, user_id, category, notify)
+            if decision == ADMIT:
+                admitted.append(user_id)
+            return decision, detail
+
+        def recording_notifier(interaction):
+            notify = notifier(interaction)
+
+            async def record(position: int):
+                positions.append(position)
+                await notify(position)
+            return record
+
+        bot.admission.admit, bot.queue_notifier = recording_admit, recording_notifier
+        rush = [submit(FakeMember(f"player{i}")) for i in range(users)]
+        before = creates()
+        start = time.perf_counter()
+        await asyncio.gather(*(call() for call, _ in rush))
+        elapsed = time.perf_counter() - start
+        bot.queue_notifier = notifier
+        fifo = admitted == [u for u in arrivals if u in set(admitted)]
+        busy = sum("lot of tickets" in i.messages[-1] for _, i in rush)
+        expected = min(users, 5 + queue_size)
+        rush_ok = creates() - before == len(admitted) == expected and busy == users - expected and fifo
+        print(f"{users} users at once, {creates_per_minute:.0f} opens/min, burst 5, queue {queue_size}: {len(admitted)} opened in {elapsed:.1f} s, "
+              f"{busy} told to retry, positions shown up to #{max(positions, default=0)}, FIFO {fifo}   ok {rush_ok}")
+        ok = spam_ok and rush_ok
+        print(f"decisions: {({d: int(DECISIONS.labels(d).value) for d in (ADMIT, DUPLICATE, RATE_LIMITED, BUSY)})}")
+        await db.close_db(path)
+    return ok
+
+# ---------- retention: archive old rows, reclaim space, without stalling the bot's writes ----------
+
+async def bench_retention(tickets: int, messages: int, batch_size: int) -> bool:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "retention.db")
+        archive = os.path.join(tmp, "retention-archive.db")
+        await db.ensure_schema(path)
+        await db.close_db(path)
+        # A third of the tickets are from last week; the rest are 200 days old. One in three rows of each is still open.
+        con = sqlite3.connect(path)
+        old, recent = "datetime('now', '-200 days')", "datetime('now', '-7 days')"
+        con.executemany(
+            "INSERT INTO tickets (user_id, username, reason, guild_id, thread_id, channel_id, forum_post_id, category, steam_id, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            generate_ticket_rows(tickets)
+        )
+        con.execute(f"UPDATE tickets SET created_at = CASE WHEN id % 3 = 0 THEN {recent} ELSE {old} END, updated_at = CASE WHEN id % 3 = 0 THEN {recent} ELSE {old} END")
+        rng = random.Random(7)
+        con.executemany(
+            "INSERT INTO outbox (thread_id, message, created_by, delivered, guild_id, created_at) VALUES (?, ?, 'bench', ?, 1, "
+            f"CASE WHEN ? THEN {recent} ELSE {old} END)",
+            ((i % tickets + 1, " ".join(rng.choice(FTS_TOPICS + ["reply"] * 20) for _ in range(30)), 1 if i % 10 else 2, i % 3 == 0) for i in range(messages))
+        )
+        expected_tickets = con.execute(f"SELECT COUNT(*) FROM tickets WHERE status = 'closed' AND created_at < datetime('now', '-90 days')").fetchone()[0]
+        expected_outbox = con.execute(f"SELECT COUNT(*) FROM outbox WHERE delivered = 1 AND created_at < datetime('now', '-30 days')").fetchone()[0]
+        probe_id, probe_reason = con.execute("SELECT id, reason FROM tickets WHERE status = 'closed' AND id % 3 != 0 LIMIT 1").fetchone()
+        con.commit()
+        con.close()
+        totals = {"tickets": tickets, "outbox": messages}
+
+        # A crash between the copy and the delete leaves rows in both files; the run must finish the move without duplicates.
+        await db.ensure_archive_schema(archive)
+        con = sqlite3.connect(path)
+        con.execute("ATTACH DATABASE ? AS archive", (archive,))
+        con.execute(f"INSERT INTO archive.tickets ({db.ARCHIVE_TICKET_COLUMNS}, archived_at) SELECT {db.ARCHIVE_TICKET_COLUMNS}, 0 FROM tickets WHERE id = ?", (probe_id,))
+        con.commit()
+        con.close()
+
+        # The bot's writes during the run: queue + deliver a message every few ms, timed from call to commit.
+        stop = asyncio.Event()
+        write_ms: List[float] = []
+
+        async def bot_writes():
+            while not stop.is_set():
+                start = time.perf_counter()
+                outbox_id = await db.queue_message(path, 1, "live reply", guild_id=1)
+                await db.mark_outbox_delivered(path, outbox_id)
+                write_ms.append((time.perf_counter() - start) * 1000)
+                await asyncio.sleep(0.005)
+
+        await db.open_db(path)
+        writer = asyncio.create_task(bot_writes())
+        await asyncio.sleep(0.5)
+        idle = latency_summary(write_ms)
+        write_ms.clear()
+        retention = Retention(path, archive, days={"tickets": 90, "outbox": 30, "dead_letters": 0}, batch_size=batch_size)
+        report = await retention.run()
+        during = latency_summary(write_ms)
+        stop.set()
+        await writer
+        await db.close_db(path)
+
+        con = sqlite3.connect(path)
+        con.execute("ATTACH DATABASE ? AS archive", (archive,))
+        # The bot's own writes during the run are left out: only the seeded rows are counted.
+        seeded = {"tickets": "", "outbox": " WHERE created_by = 'bench'"}
+        live = {t: con.execute(f"SELECT COUNT(*) FROM main.{t}{seeded[t]}").fetchone()[0] for t in totals}
+        archived = {t: con.execute(f"SELECT COUNT(*) FROM archive.{t}{seeded[t]}").fetchone()[0] for t in totals}
+        overlap = {t: con.execute(f"SELECT COUNT(*) FROM main.{t} WHERE id IN (SELECT id FROM archive.{t})").fetchone()[0] for t in totals}
+        found = con.execute(db.ARCHIVE_SEARCH_TICKETS_SQL, {"q": db.fts_query(probe_reason.split()[0]), "candidates": db.SEARCH_CANDIDATES,
+                                                            "limit": 50, "guild_id": 1}).fetchall()
+        con.close()
+
+    print(format_report(report))
+    print(f"bot writes (queue + deliver): idle p50 {idle['p50']:.2f} ms p99 {idle['p99']:.2f} ms max {idle['max']:.2f} ms; "
+          f"during the run p50 {during['p50']:.2f} ms p99 {during['p99']:.2f} ms max {during['max']:.2f} ms ({len(write_ms)} writes)")
+    moved_ok = report["archived"]["tickets"] == expected_tickets and report["archived"]["outbox"] == expected_outbox
+    kept = all(live[t] + archived[t] == totals[t] and not overlap[t] for t in totals)
+    searchable = any(row[1] == probe_id for row in found)
+    shrunk = report["bytes_after"]["main"] < report["bytes_before"]["main"]
+    print(f"archived as expected {moved_ok} ({expected_tickets} tickets, {expected_outbox} messages); no row lost or duplicated {kept}; "
+          f"archived ticket found by search {searchable}; main file shrank {shrunk}")
+    return moved_ok and kept and searchable and shrunk
+
+# ---------- bulk: closing many tickets at once, by hand vs fire-and-forget vs the job executor ----------
+
+# db.py calls that open a write transaction on the bulk paths.
+BULK_WRITE_CALLS = {"set_ticket_status_by_id", "enqueue_transcript_job", "create_bulk_job", "claim_bulk_job", "start_bulk_items", "finish_bulk_items",
+                    "finish_bulk_job"}
+
+def db_write_calls() -> int:
+    return sum(child.count for values, child in db.DB_CALL_MS.children() if values[0] in BULK_WRITE_CALLS)
+
+async def bench_bulk(tickets: int, latency_ms: float, global_per_second: int, share: float, concurrency: int) -> bool:
+    import discord
+    import bot
+    from bulk import ROUTE_LIMITS, BulkExecutor, RouteLimiter
+    from fake_discord import FakeAPI, FakeGateway, FakeTextChannel, FakeThread
+
+    notice = bot.BULK_CLOSE_NOTICE
+    results: Dict[str, Dict[str, Any]] = {}
+    checks: Dict[str, bool] = {}
+
+    def executor(path: str) -> BulkExecutor:
+        return BulkExecutor(path, bot.bulk_executor.actions, limiter=RouteLimiter(global_per_second=share), concurrency=concurrency,
+                            idle_interval=0.05, is_permanent=bot.is_permanent_send_error, on_status=bot.bulk_executor.on_status)
+
+    async def setup(tmp: str, name: str, n: int = tickets):
+        # Discord's fixed windows: per channel and route, and 50 requests per second for the whole bot.
+        api = FakeAPI(latency_ms / 1000, seed=7, buckets={route: (int(n), per) for route, (n, per) in ROUTE_LIMITS.items()},
+                      global_per_second=global_per_second)
+        gateway = FakeGateway(api)
+        path = os.path.join(tmp, f"{name}.db")
+        bot.DB_PATH = path
+        bot.bot.get_channel = gateway.get_channel
+        bot.bot.fetch_channel = gateway.fetch_channel
+        bot.ticket_index = bot.TicketIndex(path)
+        bot.transcript_archiver = TranscriptArchiver(path, os.path.join(tmp, "transcripts"), bot.resolve_channel)
+        await db.open_db(path)
+        await db.ensure_schema(path)
+        channels = []
+        for i in range(n):
+            user_id = 10_000 + i
+            if i % 5 == 4:
+                ch = gateway.add(FakeThread(gateway, f"ticket-{i}", 1))
+            else:
+                ch = gateway.add(FakeTextChannel(gateway, f"ticket-{i}", overwrites={
+                    discord.Object(id=1): discord.PermissionOverwrite(view_channel=False),
+                    discord.Object(id=user_id): discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True),
+                }))
+            await db.add_ticket_full(path, user_id=user_id, username=f"user{i}", reason="bench", guild_id=1, thread_id=ch.id if isinstance(ch, FakeThread) else None,
+                                     channel_id=None if isinstance(ch, FakeThread) else ch.id, forum_post_id=None, category="Support", ko_fi=None,
+                                     steam_id=None, cftools_id=None, status="claimed" if i % 3 == 0 else "open")
+            channels.append((user_id, ch))
+        await bot.ticket_index.warm()
+        return api, path, channels
+
+    def locked(user_id: int, ch: Any) -> bool:
+        if isinstance(ch, FakeThread):
+            return ch.archived and ch.locked
+        return any(target.id == user_id and overwrite.send_messages is False for target, overwrite in ch.overwrites.items())
+
+    async def outcome(name: str, api: Any, path: str, channels: List[Tuple[int, Any]], seconds: float, writes: int, errors: int):
+        closed = len(await db.list_tickets(path, "closed"))
+        async with (await db.get_db(path)).read() as conn:
+            transcripts_queued = (await conn.execute_fetchall("SELECT COUNT(*) FROM transcript_jobs"))[0][0]
+        notices = [sum(1 for m in ch.messages if m.content == notice) for _, ch in channels]
+        results[name] = {
+            "seconds": seconds,
+            "429s": sum(r["rate_limited"] for r in api.routes.values()),
+            "failed calls": sum(r["failed"] for r in api.routes.values()) + errors,
+            "write tx": writes,
+            "closed": closed,
+            "locked": sum(locked(user_id, ch) for user_id, ch in channels),
+            "transcripts": transcripts_queued,
+            "duplicate notices": sum(n - 1 for n in notices if n > 1),
+            "missing notices": sum(1 for n in notices if n == 0),
+        }
+        await db.close_db(path)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # By hand: what staff do today, /ticket_close in one channel after another.
+        api, path, channels = await setup(tmp, "manual")
+        writes = db_write_calls()
+        start = time.perf_counter()
+        errors = 0
+        for _, ch in channels:
+            ticket = await bot.ticket_index.resolve(ch.id, 1)
+            try:
+                await bot.close_ticket(ticket, ch, notice)
+            except Exception:
+                errors += 1
+        await outcome("one by one", api, path, channels, time.perf_counter() - start, db_write_calls() - writes, errors)
+
+        # A script firing every close at once: finishes sooner, but the global limit answers with 429s.
+        api, path, channels = await setup(tmp, "gather")
+        writes = db_write_calls()
+        start = time.perf_counter()
+        tickets_by_channel = [await bot.ticket_index.resolve(ch.id, 1) for _, ch in channels]
+        outcomes = await asyncio.gather(*(bot.close_ticket(t, ch, notice) for t, (_, ch) in zip(tickets_by_channel, channels)), return_exceptions=True)
+        await outcome("all at once", api, path, channels, time.perf_counter() - start, db_write_calls() - writes,
+                      sum(isinstance(o, Exception) for o in outcomes))
+
+        # The executor, stopped (as by a restart) a third of the way in and resumed by a fresh executor.
+        api, path, channels = await setup(tmp, "executor")
+        writes = db_write_calls()
+        start = time.perf_counter()
+        job_id, total = await db.create_bulk_job(path, 1, "close", {"message": None}, "bench")
+        first = executor(path)
+        task = asyncio.create_task(first.step())
+        while True:
+            job = await db.get_bulk_job(path, job_id)
+            if job["done"] >= total // 3:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        stopped_at = (await db.get_bulk_job(path, job_id))["done"]
+        second = executor(path)
+        while (await db.get_bulk_job(path, job_id))["status"] in ("pending", "running"):
+            await second.step()
+        job = await db.get_bulk_job(path, job_id)
+        await outcome("executor (stopped, resumed)", api, path, channels, time.perf_counter() - start, db_write_calls() - writes, job["failed"])
+        checks["job done"] = job["status"] == "done" and job["done"] == total
+
+        # Channels deleted before the job: their items fail, and their tickets keep their status.
+        api, path, channels = await setup(tmp, "failures", 20)
+        gone = [ch for _, ch in channels[:5]]
+        for ch in gone:
+            ch.gateway.remove(ch.id)
+        job_id, _ = await db.create_bulk_job(path, 1, "close", {"message": None}, "bench")
+        second = executor(path)
+        while (await db.get_bulk_job(path, job_id))["status"] in ("pending", "running"):
+            await second.step()
+        job = await db.get_bulk_job(path, job_id)
+        kept = [(await db.get_ticket_by_channel(path, ch.id))["status"] for ch in gone]
+        indexed = [(await bot.ticket_index.resolve(ch.id, 1))["status"] for ch in gone]
+        await db.close_db(path)
+        checks["failed tickets keep their status"] = (job["done"], job["failed"]) == (15, 5) and all(s != "closed" for s in kept + indexed)
+
+    print(f"bulk close of {tickets} tickets ({tickets // 5} threads), API latency ~{latency_ms:.0f} ms, global limit {global_per_second}/s "
+          f"(executor's share {share:.0f}/s, concurrency {concurrency}); executor stopped at {stopped_at}/{tickets} and resumed")
+    columns = list(next(iter(results.values())))
+    print(f"{'':28}" + "".join(f"{c:>19}" for c in columns))
+    for name, r in results.items():
+        print(f"{name:28}" + "".join(f"{r[c]:19.1f}" if isinstance(r[c], float) else f"{r[c]:19}" for c in columns))
+    ex = results["executor (stopped, resumed)"]
+    checks["every ticket closed, locked and queued for a transcript"] = ex["closed"] == ex["locked"] == ex["transcripts"] == tickets
+    checks["no 429s"] = ex["429s"] == 0
+    checks["no missing notices"] = ex["missing notices"] == 0
+    # Items in flight when the first executor stopped are applied again (at least once), so at most `concurrency` repeat their notice.
+    checks["duplicate notices bounded by in-flight items"] = ex["duplicate notices"] <= concurrency
+    checks["fewer write transactions than one by one"] = ex["write tx"] < results["one by one"]["write tx"]
+    print("; ".join(f"{name} {ok}" for name, ok in checks.items()))
+    return all(checks.values())
+
+# ---------- startup: restart-to-ready with hash-gated command sync ----------
+
+async def bench_startup(restarts: int, sync_ms: float, tickets: int) -> bool:
+    import bot
+    from fake_discord import FakeAPI
+
+    api = FakeAPI(sync_ms / 1000, seed=7)
+
+    async def fake_sync(*, guild=None):
+        await api.request("PUT commands" if guild is None else "PUT guild commands")
+        return []
+
+    bot.bot.tree.sync = fake_sync
+    results: Dict[str, List[Dict[str, float]]] = {"cold": [], "restart": [], "restart, always sync (old)": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "startup.db")
+        bot.DB_PATH = path
+        await db.open_db(path)
+        await db.ensure_schema(path)
+        for i in range(tickets):
+            await db.add_ticket(path, i, f"user{i}", "bench", 1, 10_000 + i)
+        await db.close_db(path)
+        # The first start migrates nothing (schema exists) but must sync, since no hash is stored yet.
+        runs = [("cold", False)] + [(kind, kind != "restart") for _ in range(restarts) for kind in ("restart", "restart, always sync (old)")]
+        for kind, force in runs:
+            bot.ticket_index = bot.TicketIndex(path)
+            bot.startup_timings.clear()
+            start = time.perf_counter()
+            timings = dict(await bot.startup(force_sync=force))
+            timings["total"] = (time.perf_counter() - start) * 1000
+            results[kind].append(timings)
+            await db.close_db(path)
+
+    print(f"startup: {tickets} active tickets, command sync ~{sync_ms:.0f} ms per call, {restarts} restarts each")
+    stages = list(results["cold"][0])
+    print(f"{'':28}" + "".join(f"{stage:>14}" for stage in stages))
+    for kind, runs_ms in results.items():
+        means = {stage: sum(r[stage] for r in runs_ms) / len(runs_ms) for stage in stages}
+        print(f"{kind:28}" + "".join(f"{means[stage]:11.1f} ms" for stage in stages))
+    syncs = api.routes.get("PUT commands", {}).get("calls", 0)
+    print(f"tree.sync calls: {syncs} (expected {1 + restarts})")
+    views = [item.custom_id for view in bot.bot.persistent_views for item in view.children]
+    print(f"persistent views: {views}")
+    return syncs == 1 + restarts and "open_ticket_btn" in views
+
+def main():
+    parser = argparse.ArgumentParser(description="Ticket bot benchmarks")
+    sub = parser.add_subparsers(dest="suite", required=True)
+    p_db = sub.add_parser("db", help="db.py API throughput, connect-per-call vs pooled")
+    p_db.add_argument("-n", type=int, default=2000)
+    p_db.add_argument("--concurrency", type=int, default=16)
+    p_outbox = sub.add_parser("outbox", help="outbox delivery engine against fake channels")
+    p_outbox.add_argument("-n", type=int, default=10000)
+    p_outbox.add_argument("--channels", type=int, default=100)
+    p_outbox.add_argument("--latency-ms", type=float, default=5.0)
+    p_outbox.add_argument("--batch-size", type=int, default=200)
+    p_outbox.add_argument("--concurrency", type=int, default=16)
+    p_enrich = sub.add_parser("enrich", help="profile enrichment against a local fake HTTP server")
+    p_enrich.add_argument("-n", type=int, default=50)
+    p_enrich.add_argument("--latency-ms", type=float, default=80.0)
+    p_enrich.add_argument("--slow-ms", type=float, default=3000.0)
+    p_enrich.add_argument("--timeout", type=float, default=0.5)
+    p_fts = sub.add_parser("fts", help="full-text search latency over a generated ticket volume")
+    p_fts.add_argument("--rows", type=int, default=1_000_000)
+    p_fts.add_argument("--messages", type=int, default=200_000)
+    p_fts.add_argument("--repeat", type=int, default=20)
+    p_plans = sub.add_parser("plans", help="fail if any db.py/dashboard query falls back to a full table scan")
+    p_plans.add_argument("--rows", type=int, default=2000)
+    p_metrics = sub.add_parser("metrics", help="overhead of the metrics instrumentation on hot paths")
+    p_metrics.add_argument("-n", type=int, default=200_000)
+    p_transcripts = sub.add_parser("transcripts", help="transcript archival throughput, memory and crash/resume")
+    p_transcripts.add_argument("-n", "--messages", type=int, default=20000)
+    p_transcripts.add_argument("--page-size", type=int, default=100)
+    p_transcripts.add_argument("--latency-ms", type=float, default=5.0)
+    p_bus = sub.add_parser("bus", help="dashboard-to-Discord latency through the command bus vs SQLite polling")
+    p_bus.add_argument("-n", type=int, default=50)
+    p_bus.add_argument("--latency-ms", type=float, default=20.0)
+    p_bus.add_argument("--batch", type=int, default=20)
+    p_timers = sub.add_parser("timers", help="SLA timer scheduler: tick cost, recovery and exact firing, vs scanning tickets")
+    p_timers.add_argument("--sizes", default="1000,10000,100000", help="comma-separated ticket counts")
+    p_timers.add_argument("--ticks", type=int, default=200)
+    p_admission = sub.add_parser("admission", help="admission control: duplicate submissions, per-user limits and the server-wide queue")
+    p_admission.add_argument("-n", type=int, default=100000, help="submissions for the common-path cost")
+    p_admission.add_argument("--spam", type=int, default=20, help="submissions from one user")
+    p_admission.add_argument("--users", type=int, default=100, help="users opening a ticket at once")
+    p_admission.add_argument("--creates-per-minute", type=float, default=1200.0)
+    p_admission.add_argument("--queue-size", type=int, default=60)
+    p_admission.add_argument("--latency-ms", type=float, default=20.0)
+    p_retention = sub.add_parser("retention", help="retention run: rows archived, space reclaimed, bot write latency meanwhile, crash recovery")
+    p_retention.add_argument("--tickets", type=int, default=30000)
+    p_retention.add_argument("--messages", type=int, default=150000)
+    p_retention.add_argument("--batch-size", type=int, default=500)
+    p_bulk = sub.add_parser("bulk", help="bulk close: by hand vs all at once vs the rate-limit-aware job executor, with a restart mid-job")
+    p_bulk.add_argument("-n", "--tickets", type=int, default=300)
+    p_bulk.add_argument("--latency-ms", type=float, default=50.0)
+    p_bulk.add_argument("--global-per-second", type=int, default=50, help="Discord's global limit in the fake API")
+    p_bulk.add_argument("--share", type=float, default=40.0, help="requests per second the executor allows itself")
+    p_bulk.add_argument("--concurrency", type=int, default=8)
+    p_startup = sub.add_parser("startup", help="one-time startup cost per restart, hash-gated vs always syncing commands")
+    p_startup.add_argument("--restarts", type=int, default=5)
+    p_startup.add_argument("--sync-ms", type=float, default=400.0, help="mean latency of one command sync call")
+    p_startup.add_argument("--tickets", type=int, default=5000, help="active tickets loaded into the in-memory index")
+    p_life = sub.add_parser("lifecycle", help="ticket open/claim/outbox/close through bot.py against a fake Discord; JSON report")
+    p_life.add_argument("-n", "--tickets", type=int, default=2000)
+    p_life.add_argument("--concurrency", type=int, default=500)
+    p_life.add_argument("--latency-ms", type=float, default=50.0, help="mean Discord API latency")
+    p_life.add_argument("--rate-limit", type=float, default=0.02, help="share of API calls answered with a 429")
+    p_life.add_argument("--retry-after-ms", type=float, default=500.0)
+    p_life.add_argument("--enrich-latency-ms", type=float, default=80.0)
+    p_life.add_argument("--thread-share", type=float, default=0.2, help="share of tickets that fall back to a thread")
+    p_life.add_argument("--messages", type=int, default=2, help="outbox messages per ticket")
+    p_life.add_argument("--archive-concurrency", type=int, default=4)
+    p_life.add_argument("--guilds", type=int, default=1, help="tickets are spread over this many guilds")
+    p_life.add_argument("--shards", type=int, default=1, help="outbox workers, one per shard")
+    p_life.add_argument("--warm-pool", type=int, default=0, help="pre-created channels per guild and category (0 = off)")
+    p_life.add_argument("--create-latency-ms", type=float, default=0.0, help="latency of channel creation (0 = --latency-ms)")
+    p_life.add_argument("--pool-creates-per-minute", type=float, default=10.0, help="warm pool refill budget per guild")
+    p_life.add_argument("--seed", type=int, default=7)
+    p_life.add_argument("--out", default="-", help="report path, or - for stdout")
+    args = parser.parse_args()
+
+    if args.suite == "db":
+        asyncio.run(bench_db(args.n, args.concurrency))
+    elif args.suite == "outbox":
+        asyncio.run(bench_outbox(args.n, args.channels, args.latency_ms / 1000, args.batch_size, args.concurrency))
+    elif args.suite == "enrich":
+        asyncio.run(bench_enrich(args.latency_ms, args.slow_ms, args.timeout, args.n))
+    elif args.suite == "fts":
+        asyncio.run(bench_fts(args.rows, args.messages, args.repeat))
+    elif args.suite == "plans":
+        sys.exit(1 if asyncio.run(bench_plans(args.rows)) else 0)
+    elif args.suite == "metrics":
+        asyncio.run(bench_metrics(args.n))
+    elif args.suite == "transcripts":
+        sys.exit(0 if asyncio.run(bench_transcripts(args.messages, args.page_size, args.latency_ms)) else 1)
+    elif args.suite == "bus":
+        with contextlib.redirect_stdout(sys.stderr):
+            ok = asyncio.run(bench_bus(args.n, args.latency_ms, args.batch))
+        sys.exit(0 if ok else 1)
+    elif args.suite == "timers":
+        sys.exit(0 if asyncio.run(bench_timers([int(n) for n in args.sizes.split(",")], args.ticks)) else 1)
+    elif args.suite == "admission":
+        with contextlib.redirect_stdout(sys.stderr):
+            ok = asyncio.run(bench_admission(args.n, args.spam, args.users, args.creates_per_minute, args.queue_size, args.latency_ms))
+        sys.exit(0 if ok else 1)
+    elif args.suite == "retention":
+        sys.exit(0 if asyncio.run(bench_retention(args.tickets, args.messages, args.batch_size)) else 1)
+    elif args.suite == "bulk":
+        with contextlib.redirect_stdout(sys.stderr):
+            ok = asyncio.run(bench_bulk(args.tickets, args.latency_ms, args.global_per_second, args.share, args.concurrency))
+        sys.exit(0 if ok else 1)
+    elif args.suite == "startup":
+        with contextlib.redirect_stdout(sys.stderr):
+            ok = asyncio.run(bench_startup(args.restarts, args.sync_ms, args.tickets))
+        sys.exit(0 if ok else 1)
+    elif args.suite == "lifecycle":
+        # bot.py logs every ticket; keep stdout for the report.
+        with contextlib.redirect_stdout(sys.stderr):
+            report = asyncio.run(bench_lifecycle(args.tickets, args.concurrency, args.latency_ms, args.rate_limit, args.retry_after_ms,
+                                                 args.enrich_latency_ms, args.thread_share, args.messages, args.archive_concurrency, args.guilds,
+                                                 args.shards, args.warm_pool, args.create_latency_ms, args.pool_creates_per_minute, args.seed))
+        if args.out == "-":
+            print(json.dumps(report, indent=2))
+        else:
+            with open(args.out, "w") as f:
+                json.dump(report, f, indent=2)
+            print(f"lifecycle report written to {args.out}")
+
+if __name__ == "__main__":
+    main()
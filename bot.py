@@ -1,15 +1,36 @@
-
 import os
+import math
+import time
+import json
+import hashlib
 import asyncio
+import logging
 import discord
 from discord import app_commands
 from discord.ext import commands, tasks
 from dotenv import load_dotenv
 import tomllib
-from typing import Optional, List, Dict
+from typing import Any, Optional, List, Dict, Awaitable, Callable, Tuple, TypeVar
 
-from db import ensure_schema, add_ticket_full, set_ticket_status, fetch_outbox, mark_outbox_delivered
+from db import (open_db, close_db, ensure_schema, add_ticket_full, finalize_ticket, fail_stale_pending_tickets, outbox_stats, get_kv, set_kv, queue_message,
+                create_bulk_job, ENQUEUE_TRANSCRIPT_SQL)
+from outbox import OutboxEngine, wait_delivered
+from command_bus import CommandBus
+from ticket_index import TicketIndex
+from guild_settings import GuildSettingsCache
+from transcripts import TranscriptArchiver, transcript_path
+from warm_pool import WarmPool
+from admission import AdmissionControl, ADMIT, DUPLICATE, RATE_LIMITED
+from timers import TimerScheduler, REMIND, ESCALATE, AUTO_CLOSE
+from analytics import apply_events
+from retention import Retention, format_report, retention_from_config
+from bulk import BulkAction, BulkExecutor, RouteLimiter, EDIT_CHANNEL, GET_CHANNEL, SEND_MESSAGE
+import integrations
 from integrations import enrich_context
+import metrics
+from metrics import counter, gauge, histogram, timed
+
+PROCESS_STARTED = time.perf_counter()
 
 load_dotenv()
 CONFIG_PATH = "config.toml" if os.path.exists("config.toml") else "config.example.toml"
@@ -17,68 +38,230 @@ with open(CONFIG_PATH, "rb") as f:
     cfg = tomllib.load(f)
 
 DISCORD_TOKEN = os.getenv("DISCORD_BOT_TOKEN") or cfg["discord"]["bot_token"]
-GUILD_ID = int(cfg["discord"]["guild_id"])
-SUPPORT_CHANNEL_ID = int(cfg["discord"]["support_channel_id"])
-STAFF_ROLE_ID = int(cfg["discord"]["staff_role_id"])
+# Optional: the guild configured in config.toml is seeded from it on first use; every guild can be (re)configured
+# with /ticket_setup and /ticket_category, which store its settings in SQLite.
+GUILD_ID = int(cfg["discord"].get("guild_id", 0) or 0)
+SHARD_COUNT = int(cfg["discord"].get("shard_count", 0) or 0)
 DB_PATH = cfg["app"]["db_path"]
 
-FORUM_CHANNEL_ID = int(cfg.get("forum_channel_id", 0) or 0)
-PING_ROLE_IDS: List[int] = list(cfg.get("ping_role_ids", []))
+def config_guild_settings() -> Dict[int, Dict[str, Any]]:
+    if not GUILD_ID:
+        return {}
+    return {GUILD_ID: {
+        "support_channel_id": int(cfg["discord"].get("support_channel_id", 0) or 0),
+        "staff_role_id": int(cfg["discord"].get("staff_role_id", 0) or 0),
+        "forum_channel_id": int(cfg.get("forum_channel_id", 0) or 0),
+        "ping_role_ids": [int(r) for r in cfg.get("ping_role_ids", [])],
+        "ticket_categories": {str(k): int(v or 0) for k, v in cfg.get("ticket_categories", {}).items()},
+    }}
 
-CATEGORY_MAP: Dict[str, int] = dict(cfg.get("ticket_categories", {}))
+PENDING_TICKET_TIMEOUT = 15 * 60
+OUTBOX_CFG: Dict[str, float] = dict(cfg.get("outbox", {}))
+METRICS_CFG: Dict[str, object] = dict(cfg.get("metrics", {}))
+TRANSCRIPTS_CFG: Dict[str, object] = dict(cfg.get("transcripts", {}))
+WARM_POOL_CFG: Dict[str, object] = dict(cfg.get("warm_pool", {}))
+COMMAND_BUS_CFG: Dict[str, object] = dict(cfg.get("command_bus", {}))
+SLA_CFG: Dict[str, object] = dict(cfg.get("sla", {}))
+ADMISSION_CFG: Dict[str, Any] = dict(cfg.get("admission", {}))
+RETENTION_CFG: Dict[str, Any] = dict(cfg.get("retention", {}))
+BULK_CFG: Dict[str, Any] = dict(cfg.get("bulk", {}))
 
 intents = discord.Intents.default()
 intents.guilds = True
 intents.members = True
-bot = commands.Bot(command_prefix="!", intents=intents)
+# One process serves every guild. discord.py picks the shard count unless [discord] shard_count is set, and member
+# lists aren't chunked at startup: interactions already carry the member and roles they need.
+class TicketBot(commands.AutoShardedBot):
+    # setup_hook runs once per process, after login and before the gateway connects; on_ready runs after every reconnect.
+    async def setup_hook(self):
+        await startup()
+        start_background_tasks()
+        await start_metrics()
+        await start_command_bus()
+
+bot = TicketBot(command_prefix="!", intents=intents, shard_count=SHARD_COUNT or None, chunk_guilds_at_startup=False)
+
+T = TypeVar("T")
+
+TICKET_STAGE_MS = histogram("ticket_open_stage_ms", "Latency of each ticket-open stage", ("stage",))
+TICKETS_OPENED = counter("tickets_opened_total", "Ticket opens by result (ok, failed)", ("result",))
+STARTUP_STAGE_MS = histogram("startup_stage_ms", "Latency of each one-time startup stage", ("stage",))
+COMMAND_MS = histogram("command_ms", "Slash command latency", ("command",))
+log = logging.getLogger("ticketbot")
+
+DISCORD_ERRORS = counter("discord_api_errors_total", "Failed Discord API calls by operation and HTTP status (or exception type)", ("op", "status"))
+OUTBOX_PENDING = gauge("outbox_pending", "Undelivered outbox messages")
+OUTBOX_OLDEST_AGE = gauge("outbox_oldest_pending_seconds", "Age of the oldest undelivered outbox message")
+OUTBOX_DEAD = gauge("outbox_dead_letters", "Outbox messages moved to dead letters")
+ACTIVE_TICKETS = gauge("tickets_active", "Active tickets held in the in-memory index")
+
+metrics.watch_discord_rate_limits()
+metrics_runner = None
+command_bus_runner = None
+metrics_log: Optional[metrics.JsonLog] = None
+
+# Called with the stage timings (ms) of every ticket that opens successfully, e.g. by the lifecycle benchmark.
+ticket_open_listeners: List[Callable[[Dict[str, float]], None]] = []
+
+async def timed_stage(timings: Dict[str, float], stage: str, awaitable: Awaitable[T], hist: metrics.Family = TICKET_STAGE_MS) -> T:
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        timings[stage] = (time.perf_counter() - start) * 1000
+        hist.labels(stage).observe(timings[stage])
+
+def profile_summary(profile: Any) -> str:
+    # Provider payloads are free-form JSON; show their scalar fields after the ID the user gave. A provider that
+    # timed out or failed is missing from the enrichment context and adds nothing.
+    if not isinstance(profile, dict):
+        return ""
+    fields = ", ".join(f"{k}: {v}" for k, v in profile.items() if k not in ("id", "handle") and isinstance(v, (str, int, float, bool)))
+    return f" ({discord.utils.escape_markdown(fields[:200])})" if fields else ""
+
+def count_api_error(op: str, e: Exception):
+    DISCORD_ERRORS.labels(op, getattr(e, "status", None) or type(e).__name__).inc()
+
+async def collect_gauges():
+    stats = await outbox_stats(DB_PATH)
+    OUTBOX_PENDING.set(stats["pending"])
+    OUTBOX_OLDEST_AGE.set(stats["oldest_pending_age"])
+    OUTBOX_DEAD.set(stats["dead"])
+    ACTIVE_TICKETS.set(len(ticket_index))
+
+async def start_metrics():
+    global metrics_runner, metrics_log
+    port = int(METRICS_CFG.get("port", 0) or 0)
+    if port and metrics_runner is None:
+        host = str(METRICS_CFG.get("host", "127.0.0.1"))
+        metrics_runner = await metrics.serve(host, port, collect=collect_gauges)
+        log.info("Metrics on http://%s:%s/metrics", host, port)
+    log_path = str(METRICS_CFG.get("log_path", "") or "")
+    if log_path and metrics_log is None:
+        metrics_log = metrics.JsonLog(log_path)
+        metrics_logger.change_interval(seconds=float(METRICS_CFG.get("log_interval_seconds", 60)))
+        metrics_logger.start()
 
 def allowed_mentions():
     return discord.AllowedMentions(everyone=False, users=True, roles=True, replied_user=False)
 
+# ---------- Startup ----------
+
+COMMAND_SYNC_KEY = "command_sync_hash"
+startup_timings: Dict[str, float] = {}
+
+def command_tree_hash() -> str:
+    # Everything Discord stores about our commands, plus the application and the legacy guild we clear.
+    payload = {
+        "application_id": bot.application_id,
+        "legacy_guild_id": GUILD_ID,
+        "commands": sorted((c.to_dict(bot.tree) for c in bot.tree.get_commands()), key=lambda c: c["name"]),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+async def sync_commands(force: bool = False) -> bool:
+    # tree.sync is slow and rate-limited, so it only runs when the command tree differs from the last successful sync.
+    tree_hash = command_tree_hash()
+    if not force and await get_kv(DB_PATH, COMMAND_SYNC_KEY) == tree_hash:
+        return False
+    try:
+        await bot.tree.sync()
+        if GUILD_ID:
+            # Commands used to be registered to this guild only; syncing it empty removes that duplicate copy.
+            await bot.tree.sync(guild=discord.Object(id=GUILD_ID))
+    except Exception:
+        log.exception("Command sync failed")
+        return False
+    await set_kv(DB_PATH, COMMAND_SYNC_KEY, tree_hash)
+    log.info("Slash commands synced.")
+    return True
+
+async def startup(force_sync: bool = False) -> Dict[str, float]:
+    # One-time work per process. Migrations are skipped by version (PRAGMA user_version) once the schema is current.
+    timings = startup_timings
+    await timed_stage(timings, "open_db", open_db(DB_PATH), STARTUP_STAGE_MS)
+    await timed_stage(timings, "schema", ensure_schema(DB_PATH), STARTUP_STAGE_MS)
+    integrations.configure(db_path=DB_PATH, **cfg.get("integrations", {}))
+    # Tickets left 'pending' by a crash mid-open never got a usable channel.
+    await timed_stage(timings, "stale_pending", fail_stale_pending_tickets(DB_PATH, PENDING_TICKET_TIMEOUT), STARTUP_STAGE_MS)
+    # Panels posted before this restart keep working: their button is routed by custom_id.
+    bot.add_view(TicketPanelView())
+    await timed_stage(timings, "command_sync", sync_commands(force_sync), STARTUP_STAGE_MS)
+    await timed_stage(timings, "ticket_index", ticket_index.warm(), STARTUP_STAGE_MS)
+    return timings
+
+def start_background_tasks():
+    if not ticket_index_refresher.is_running():
+        ticket_index_refresher.start()
+    if not transcript_worker.is_running():
+        transcript_worker.start()
+    if not analytics_rollup.is_running():
+        analytics_rollup.start()
+    if warm_pool is not None and not warm_pool_worker.is_running():
+        warm_pool_worker.start()
+    if sla_timers is not None and not sla_worker.is_running():
+        sla_worker.start()
+    if retention is not None and not retention_worker.is_running():
+        retention_worker.start()
+    if not bulk_worker.is_running():
+        bulk_worker.start()
+
 @bot.event
 async def on_ready():
-    print(f"Logged in as {bot.user} (ID: {bot.user.id})")
-    await ensure_schema(DB_PATH)
-    try:
-        await bot.tree.sync(guild=discord.Object(id=GUILD_ID))
-        print("Slash commands synced to guild.")
-    except Exception as e:
-        print("Command sync failed:", e)
-    outbox_worker.start()
+    # Fires after every gateway (re)connect, so only idempotent work belongs here. Outbox workers start now
+    # because the shard count is only known once connected.
+    start_outbox_workers()
+    if warm_pool is not None:
+        for guild in bot.guilds:
+            warm_pool.add_guild(guild.id)
+    if "ready" not in startup_timings:
+        startup_timings["ready"] = (time.perf_counter() - PROCESS_STARTED) * 1000
+        STARTUP_STAGE_MS.labels("ready").observe(startup_timings["ready"])
+        stages = ", ".join(f"{stage} {ms:.0f} ms" for stage, ms in startup_timings.items())
+        log.info("Logged in as %s (ID: %s); startup: %s", bot.user, bot.user.id, stages)
+    else:
+        log.info("Reconnected as %s", bot.user)
 
 # ---------- UI Components ----------
 
 class CategorySelect(discord.ui.Select):
     def __init__(self, categories: List[str]):
-        options = [discord.SelectOption(label=c, value=c) for c in categories]
+        # Discord allows at most 25 options per select.
+        options = [discord.SelectOption(label=c, value=c) for c in categories[:25]]
         super().__init__(placeholder="Choose a ticket category…", min_values=1, max_values=1, options=options)
 
     async def callback(self, interaction: discord.Interaction):
-        view: TicketPanelView = self.view  # type: ignore
-        view.selected_category = self.values[0]
+        # Point users who already have a ticket in this category to it before they fill in the form.
+        existing = admission.existing(interaction.guild_id, interaction.user.id, self.values[0]) if admission and interaction.guild_id else None
+        if existing is not None:
+            await interaction.response.send_message(duplicate_notice(self.values[0], existing), ephemeral=True)
+            return
         # Trigger modal to collect info
-        await interaction.response.send_modal(TicketInfoModal(view.selected_category))
+        await interaction.response.send_modal(TicketInfoModal(self.values[0]))
+
+class CategorySelectView(discord.ui.View):
+    def __init__(self, categories: List[str]):
+        super().__init__(timeout=300)
+        self.add_item(CategorySelect(categories))
 
 class OpenTicketButton(discord.ui.Button):
     def __init__(self):
         super().__init__(label="Open Ticket", style=discord.ButtonStyle.primary, custom_id="open_ticket_btn")
 
     async def callback(self, interaction: discord.Interaction):
-        view: TicketPanelView = self.view  # type: ignore
-        if not view.categories:
+        # Categories are read at click time, so one persistent view serves every guild's panels and picks up edits.
+        settings = await guild_settings.get(interaction.guild_id) if interaction.guild_id else None
+        categories = list(settings["ticket_categories"]) if settings else []
+        if not categories:
             await interaction.response.send_message("No categories configured.", ephemeral=True)
             return
-        # Replace the message with the select menu
-        select_view = TicketPanelView(view.categories)
-        await interaction.response.send_message("Select a category to begin:", view=select_view, ephemeral=True)
+        await interaction.response.send_message("Select a category to begin:", view=CategorySelectView(categories), ephemeral=True)
 
 class TicketPanelView(discord.ui.View):
-    def __init__(self, categories: List[str]):
+    # Persistent: no timeout and a fixed custom_id, registered with bot.add_view at startup.
+    def __init__(self):
         super().__init__(timeout=None)
-        self.categories = categories
-        self.selected_category: Optional[str] = None
         self.add_item(OpenTicketButton())
-        # We keep the select hidden until user presses the button (served ephemerally)
 
 class TicketInfoModal(discord.ui.Modal, title="Ticket Info"):
     category: Optional[str] = None
@@ -98,192 +281,805 @@ class TicketInfoModal(discord.ui.Modal, title="Ticket Info"):
         if not guild:
             await interaction.response.send_message("This must be used in a server.", ephemeral=True)
             return
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+        # Acknowledge inside Discord's 3s window; the result is reported through the followup.
+        await timed_stage(timings, "defer", interaction.response.defer(ephemeral=True, thinking=True))
         category_name = self.category or "Uncategorized"
-        parent_target_id = CATEGORY_MAP.get(category_name)
+        if admission is None:
+            await self.open_ticket(interaction, category_name, timings, started)
+            return
+        decision, detail = await timed_stage(timings, "admission", admission.admit(guild.id, user.id, category_name, queue_notifier(interaction)))
+        if decision == DUPLICATE:
+            await interaction.followup.send(duplicate_notice(category_name, detail), ephemeral=True)
+            return
+        if decision == RATE_LIMITED:
+            await interaction.followup.send(f"You're opening tickets too quickly. Please try again in {format_duration(60 * math.ceil(detail / 60))}.", ephemeral=True)
+            return
+        if decision != ADMIT:
+            await interaction.followup.send("We're receiving a lot of tickets right now. Please try again in a few minutes.", ephemeral=True)
+            return
+        row = None
+        try:
+            row = await self.open_ticket(interaction, category_name, timings, started)
+        finally:
+            admission.finish(guild.id, user.id, category_name, row)
+
+    async def open_ticket(self, interaction: discord.Interaction, category_name: str, timings: Dict[str, float], started: float) -> Optional[Dict[str, Any]]:
+        # Returns the new ticket's index row, or None if it could not be opened (the user has been told either way).
+        user = interaction.user
+        guild = interaction.guild
+        settings = await guild_settings.get(guild.id)
+
+        # Persist first so a crash or failure below always leaves a row to reconcile.
+        ticket_id = await timed_stage(timings, "db_pending", add_ticket_full(
+            DB_PATH,
+            user_id=user.id,
+            username=str(user),
+            reason=str(self.reason),
+            guild_id=guild.id,
+            thread_id=None,
+            channel_id=None,
+            forum_post_id=None,
+            category=category_name,
+            ko_fi=str(self.kofi) if self.kofi else None,
+            steam_id=str(self.steam_id) if self.steam_id else None,
+            cftools_id=str(self.cftools) if self.cftools else None,
+            status="pending",
+        ))
+
+        # Independent stages run together; the thread fallback only runs if the channel could not be created.
+        created_channel, forum_post, ctx = await asyncio.gather(
+            timed_stage(timings, "channel", self.create_ticket_channel(guild, user, category_name, settings)),
+            timed_stage(timings, "forum", self.create_forum_post(user, category_name, settings)),
+            timed_stage(timings, "enrich", enrich_context(str(self.kofi), str(self.steam_id), str(self.cftools))),
+        )
+        created_thread = None
+        if created_channel is None:
+            created_thread = await timed_stage(timings, "thread", self.create_ticket_thread(user, category_name, settings))
+        destination = created_channel or created_thread
+
+        try:
+            if destination is None:
+                raise RuntimeError("no ticket channel or thread could be created")
+            try:
+                await timed_stage(timings, "intro", destination.send(self.intro_message(user, category_name, settings, ctx), allowed_mentions=allowed_mentions()))
+            except Exception as e:
+                count_api_error("send_intro", e)
+                log.warning("Ticket intro message failed: %s", e)
+            ids = {
+                "thread_id": created_thread.id if created_thread else None,
+                "channel_id": created_channel.id if created_channel else None,
+                "forum_post_id": forum_post.id if forum_post else None,
+            }
+            await timed_stage(timings, "db_finalize", finalize_ticket(DB_PATH, ticket_id, status="open", **ids))
+            row = {"id": ticket_id, "guild_id": guild.id, "user_id": user.id, "status": "open", "claimed_by": None, "category": category_name, **ids}
+            ticket_index.put(row)
+        except Exception:
+            log.exception("Ticket open failed")
+            TICKETS_OPENED.labels("failed").inc()
+            # Don't leave Discord objects behind that no ticket row points to.
+            for obj in (created_channel, created_thread, forum_post):
+                if obj is not None:
+                    try:
+                        await obj.delete()
+                    except Exception:
+                        pass
+            try:
+                await finalize_ticket(DB_PATH, ticket_id, thread_id=None, channel_id=None, forum_post_id=None, status="failed")
+            except Exception:
+                log.exception("Failed to mark ticket %s failed", ticket_id)
+            await interaction.followup.send("Failed to create a ticket channel or thread. Please contact staff.", ephemeral=True)
+            return None
+
+        await timed_stage(timings, "ack", interaction.followup.send(f"Ticket created: {destination.mention}", ephemeral=True))
+        timings["total"] = (time.perf_counter() - started) * 1000
+        TICKET_STAGE_MS.labels("total").observe(timings["total"])
+        TICKETS_OPENED.labels("ok").inc()
+        if metrics_log is not None:
+            metrics_log.event("ticket_opened", ticket_id=ticket_id, category=category_name, stages_ms={k: round(v, 2) for k, v in timings.items()})
+        for listener in ticket_open_listeners:
+            listener(timings)
+        return row
+
+    async def on_error(self, interaction: discord.Interaction, error: Exception):
+        log.error("Ticket modal error", exc_info=error)
+        message = "Something went wrong opening your ticket. Please contact staff."
+        if interaction.response.is_done():
+            await interaction.followup.send(message, ephemeral=True)
+        else:
+            await interaction.response.send_message(message, ephemeral=True)
 
-        # Create private channel under mapped category (if provided)
+    async def create_ticket_channel(self, guild: discord.Guild, user: discord.abc.User, category_name: str, settings: Dict[str, Any]):
+        # Private channel under mapped category (if provided)
+        parent_target_id = settings["ticket_categories"].get(category_name)
+        if not parent_target_id:
+            return None
         overwrites = {
             guild.default_role: discord.PermissionOverwrite(view_channel=False),
             user: discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True),
         }
-        staff_role = guild.get_role(STAFF_ROLE_ID)
+        staff_role = guild.get_role(settings["staff_role_id"])
         if staff_role:
             overwrites[staff_role] = discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True, manage_channels=True)
+        parent = guild.get_channel(parent_target_id)
+        name = f"ticket-{user.display_name[:20]}"
+        if warm_pool is not None and isinstance(parent, discord.CategoryChannel):
+            channel = await warm_pool.take(guild, parent.id, name, overwrites, reason=f"Ticket by {user}")
+            if channel is not None:
+                return channel
+        try:
+            return await guild.create_text_channel(
+                name=name,
+                category=parent if isinstance(parent, discord.CategoryChannel) else None,
+                overwrites=overwrites
+            )
+        except Exception as e:
+            count_api_error("create_channel", e)
+            log.warning("Channel create failed: %s", e)
+            return None
 
-        created_channel = None
-        if parent_target_id:
-            parent = guild.get_channel(parent_target_id)
-            try:
-                created_channel = await guild.create_text_channel(
-                    name=f"ticket-{user.display_name[:20]}",
-                    category=parent if isinstance(parent, discord.CategoryChannel) else None,
-                    overwrites=overwrites
-                )
-            except Exception as e:
-                print("Channel create failed:", e)
-        
+    async def create_ticket_thread(self, user: discord.abc.User, category_name: str, settings: Dict[str, Any]):
         # Fallback: create a public thread in support channel
-        created_thread = None
-        support_channel = bot.get_channel(SUPPORT_CHANNEL_ID)
-        if created_channel is None and isinstance(support_channel, (discord.TextChannel,)):
-            try:
-                created_thread = await support_channel.create_thread(
-                    name=f"🎫 {user.display_name} • {category_name}",
-                    type=discord.ChannelType.public_thread,
-                    reason=f"Ticket by {user}"
-                )
-            except Exception as e:
-                print("Thread create failed:", e)
+        support_channel = bot.get_channel(settings["support_channel_id"])
+        if not isinstance(support_channel, (discord.TextChannel,)):
+            return None
+        try:
+            return await support_channel.create_thread(
+                name=f"🎫 {user.display_name} • {category_name}",
+                type=discord.ChannelType.public_thread,
+                reason=f"Ticket by {user}"
+            )
+        except Exception as e:
+            count_api_error("create_thread", e)
+            log.warning("Thread create failed: %s", e)
+            return None
 
+    async def create_forum_post(self, user: discord.abc.User, category_name: str, settings: Dict[str, Any]):
         # Optional forum post
-        forum_post = None
-        if FORUM_CHANNEL_ID:
-            forum = bot.get_channel(FORUM_CHANNEL_ID)
-            if isinstance(forum, discord.ForumChannel):
-                try:
-                    forum_post = await forum.create_thread(
-                        name=f"{user.display_name} • {category_name}",
-                        content=f"**Issue:** {self.reason}\n**Steam:** {self.steam_id}\n**Ko-fi:** {self.kofi}\n**CF-Tools:** {self.cftools}",
-                    )
-                except Exception as e:
-                    print("Forum post failed:", e)
-
-        # Enrich context (stubbed)
-        ctx = await enrich_context(str(self.kofi), str(self.steam_id), str(self.cftools))
-
-        # Compose intro
+        if not settings["forum_channel_id"]:
+            return None
+        forum = bot.get_channel(settings["forum_channel_id"])
+        if not isinstance(forum, discord.ForumChannel):
+            return None
+        try:
+            created = await forum.create_thread(
+                name=f"{user.display_name} • {category_name}",
+                content=f"**Issue:** {self.reason}\n**Steam:** {self.steam_id}\n**Ko-fi:** {self.kofi}\n**CF-Tools:** {self.cftools}",
+            )
+        except Exception as e:
+            count_api_error("create_forum_post", e)
+            log.warning("Forum post failed: %s", e)
+            return None
+        # create_thread returns (thread, starter message)
+        return getattr(created, "thread", created)
+
+    def intro_message(self, user: discord.abc.User, category_name: str, settings: Dict[str, Any], ctx: Dict[str, Any]) -> str:
         intro = (
             f"Hello {user.mention}, thanks for opening a ticket.\n"
             f"**Category:** {discord.utils.escape_markdown(category_name)}\n"
             f"**Issue:** {self.reason}\n"
         )
         if self.steam_id:
-            intro += f"**Steam:** {self.steam_id}\n"
+            intro += f"**Steam:** {self.steam_id}{profile_summary(ctx.get('steam'))}\n"
         if self.kofi:
-            intro += f"**Ko-fi:** {self.kofi}\n"
+            intro += f"**Ko-fi:** {self.kofi}{profile_summary(ctx.get('kofi'))}\n"
         if self.cftools:
-            intro += f"**CF-Tools:** {self.cftools}\n"
-
+            intro += f"**CF-Tools:** {self.cftools}{profile_summary(ctx.get('cftools'))}\n"
         # Ping roles
-        role_mentions = " ".join([f"<@&{rid}>" for rid in PING_ROLE_IDS]) if PING_ROLE_IDS else ""
-
-        # Send intro to the created destination
-        thread_id = 0
-        channel_id = 0
-        forum_id = 0
-
-        if created_channel:
-            try:
-                await created_channel.send(role_mentions + "\n" + intro, allowed_mentions=allowed_mentions())
-            except Exception:
-                pass
-            channel_id = created_channel.id
-        elif created_thread:
-            try:
-                await created_thread.send(role_mentions + "\n" + intro, allowed_mentions=allowed_mentions())
-            except Exception:
-                pass
-            thread_id = created_thread.id
-        else:
-            await interaction.response.send_message("Failed to create a ticket channel or thread. Please contact staff.", ephemeral=True)
-            return
-
-        if forum_post:
-            forum_id = forum_post.id if hasattr(forum_post, "id") else 0
-
-        # Save to DB
-        await add_ticket_full(
-            DB_PATH,
-            user_id=user.id,
-            username=str(user),
-            reason=str(self.reason),
-            guild_id=guild.id,
-            thread_id=thread_id or None,
-            channel_id=channel_id or None,
-            forum_post_id=forum_id or None,
-            category=category_name,
-            ko_fi=str(self.kofi) if self.kofi else None,
-            steam_id=str(self.steam_id) if self.steam_id else None,
-            cftools_id=str(self.cftools) if self.cftools else None,
-        )
-
-        # Acknowledge
-        if created_channel:
-            await interaction.response.send_message(f"Ticket created: {created_channel.mention}", ephemeral=True)
-        else:
-            await interaction.response.send_message(f"Ticket created: <#{thread_id}>", ephemeral=True)
+        role_mentions = " ".join([f"<@&{rid}>" for rid in settings["ping_role_ids"]])
+        return role_mentions + "\n" + intro
 
 # ---------- Commands ----------
 
-@bot.tree.command(name="ticket_panel", description="Post the ticket panel", guild=discord.Object(id=GUILD_ID))
+@bot.tree.command(name="ticket_panel", description="Post the ticket panel")
+@app_commands.guild_only()
+@timed(COMMAND_MS)
 async def ticket_panel(interaction: discord.Interaction):
-    categories = list(CATEGORY_MAP.keys())
+    settings = await guild_settings.get(interaction.guild_id)
+    categories = list(settings["ticket_categories"])
     if not categories:
-        await interaction.response.send_message("No categories configured in config.toml [ticket_categories].", ephemeral=True)
+        await interaction.response.send_message("No ticket categories configured. Add one with `/ticket_category`.", ephemeral=True)
         return
     embed = discord.Embed(title="Tactica DayZ • Support", description="Open a ticket to reach the staff team. Click the button below.", color=0x2b2d31)
-    view = TicketPanelView(categories)
-    await interaction.response.send_message(embed=embed, view=view)
+    await interaction.response.send_message(embed=embed, view=TicketPanelView())
     
-@bot.tree.command(name="ticket_claim", description="Claim the current ticket", guild=discord.Object(id=GUILD_ID))
+def is_staff(member: discord.abc.User, settings: Dict[str, Any]) -> bool:
+    return isinstance(member, discord.Member) and any(r.id == settings["staff_role_id"] for r in member.roles)
+
+@bot.tree.command(name="ticket_setup", description="Configure tickets for this server")
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.describe(support_channel="Channel where ticket threads are opened for categories without a parent",
+                       staff_role="Role that can claim and close tickets", forum_channel="Optional forum that gets a post per ticket",
+                       ping_role="Optional role pinged when a ticket opens")
+@timed(COMMAND_MS)
+async def ticket_setup(interaction: discord.Interaction, support_channel: discord.TextChannel, staff_role: discord.Role,
+                       forum_channel: Optional[discord.ForumChannel] = None, ping_role: Optional[discord.Role] = None):
+    await guild_settings.update(
+        interaction.guild_id,
+        name=interaction.guild.name if interaction.guild else None,
+        support_channel_id=support_channel.id,
+        staff_role_id=staff_role.id,
+        forum_channel_id=forum_channel.id if forum_channel else 0,
+        ping_role_ids=[ping_role.id] if ping_role else [],
+    )
+    await interaction.response.send_message(
+        f"Tickets configured: threads in {support_channel.mention}, staff role {staff_role.mention}. Add categories with `/ticket_category`.",
+        ephemeral=True, allowed_mentions=discord.AllowedMentions.none()
+    )
+
+@bot.tree.command(name="ticket_category", description="Add, move or remove a ticket category")
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.describe(name="Category name shown on the panel", parent="Discord category for private ticket channels (empty: threads in the support channel)",
+                       remove="Remove this category instead")
+@timed(COMMAND_MS)
+async def ticket_category(interaction: discord.Interaction, name: str, parent: Optional[discord.CategoryChannel] = None, remove: bool = False):
+    settings = await guild_settings.get(interaction.guild_id)
+    categories = dict(settings["ticket_categories"])
+    if remove:
+        if categories.pop(name, None) is None:
+            await interaction.response.send_message(f"There is no category called {discord.utils.escape_markdown(name)}.", ephemeral=True)
+            return
+    else:
+        categories[name] = parent.id if parent else 0
+    await guild_settings.update(interaction.guild_id, name=interaction.guild.name if interaction.guild else None, ticket_categories=categories)
+    listed = ", ".join(discord.utils.escape_markdown(c) for c in categories) or "none"
+    await interaction.response.send_message(f"Ticket categories: {listed}.", ephemeral=True)
+
+@bot.tree.command(name="ticket_claim", description="Claim the current ticket")
+@app_commands.guild_only()
+@timed(COMMAND_MS)
 async def ticket_claim(interaction: discord.Interaction):
     ch = interaction.channel
     if not isinstance(ch, (discord.TextChannel, discord.Thread)):
         await interaction.response.send_message("Use this inside the ticket channel/thread.", ephemeral=True)
         return
     member = interaction.user
+    settings = await guild_settings.get(interaction.guild_id)
     if isinstance(member, discord.Member):
-        if STAFF_ROLE_ID not in [r.id for r in member.roles]:
+        if not is_staff(member, settings):
             await interaction.response.send_message("You need the staff role to claim tickets.", ephemeral=True)
             return
-    target_id = ch.id if isinstance(ch, discord.TextChannel) else ch.id
-    await set_ticket_status(DB_PATH, target_id, "claimed", claimed_by=interaction.user.id)
-    await ch.send(f"{member.mention} has claimed this ticket.")
+    ticket = await ticket_index.resolve(ch.id, interaction.guild_id)
+    if ticket is None:
+        await interaction.response.send_message("This channel isn't a ticket.", ephemeral=True)
+        return
+    if ticket["status"] == "closed":
+        await interaction.response.send_message("This ticket is already closed.", ephemeral=True)
+        return
+    await claim_ticket(ticket, ch, member.id, f"{member.mention} has claimed this ticket.")
     await interaction.response.send_message("Ticket claimed.", ephemeral=True)
 
-@bot.tree.command(name="ticket_close", description="Close the current ticket", guild=discord.Object(id=GUILD_ID))
+@bot.tree.command(name="ticket_close", description="Close the current ticket")
+@app_commands.guild_only()
+@timed(COMMAND_MS)
 async def ticket_close(interaction: discord.Interaction):
     ch = interaction.channel
     if not isinstance(ch, (discord.TextChannel, discord.Thread)):
         await interaction.response.send_message("Use this inside the ticket channel/thread.", ephemeral=True)
         return
-    await set_ticket_status(DB_PATH, ch.id, "closed")
-    await ch.send("This ticket is now closed. If you need anything else, open a new one with `/ticket_panel`.")
+    ticket = await ticket_index.resolve(ch.id, interaction.guild_id)
+    if ticket is None:
+        await interaction.response.send_message("This channel isn't a ticket.", ephemeral=True)
+        return
+    if ticket["status"] == "closed":
+        await interaction.response.send_message("This ticket is already closed.", ephemeral=True)
+        return
     await interaction.response.send_message("Closed.", ephemeral=True)
+    await close_ticket(ticket, ch, "This ticket is now closed. If you need anything else, open a new one with `/ticket_panel`.")
+
+# Shared by the slash commands and the dashboard's command bus.
+async def claim_ticket(ticket: Dict[str, Any], ch: Any, staff_id: Optional[int], notice: str):
+    await ticket_index.set_status(ticket["id"], "claimed", claimed_by=staff_id)
+    await ch.send(notice)
+
+async def close_ticket(ticket: Dict[str, Any], ch: Any, notice: str):
+    # Closing again would repeat the notice and re-run the transcript job.
+    if ticket["status"] == "closed":
+        return
+    await ticket_index.set_status(ticket["id"], "closed")
+    await ch.send(notice)
+    await finish_close(ticket, ch)
+
+async def finish_close(ticket: Dict[str, Any], ch: Any):
+    # Archived by transcript_worker in the background; only the job row is written here.
+    await transcript_archiver.enqueue(ticket["id"], ch.id)
     try:
-        if isinstance(ch, discord.Thread):
+        await lock_ticket_channel(ticket, ch)
+    except Exception as e:
+        count_api_error("close_lock", e)
+
+async def lock_ticket_channel(ticket: Dict[str, Any], ch: Any, locked: bool = True):
+    # One API call either way. Threads are archived and locked. Private channels can't be archived, so the author's
+    # overwrite becomes read-only instead: the history stays readable for them, staff and the transcript job.
+    if isinstance(ch, discord.Thread):
+        if locked:
             await ch.archive(locked=True)
-        elif isinstance(ch, discord.TextChannel):
-            await ch.edit(archived=True)  # not valid; left as placeholder. You may delete channel instead.
+        else:
+            await ch.edit(archived=False, locked=False)
+    elif isinstance(ch, discord.TextChannel):
+        # No author to lock out: a bulk item whose ticket row was archived meanwhile (its user_id comes from a LEFT JOIN).
+        if not ticket.get("user_id"):
+            return
+        overwrites = dict(ch.overwrites)
+        author = next((target for target in overwrites if target.id == ticket["user_id"]), None) or discord.Object(id=ticket["user_id"])
+        overwrite = discord.PermissionOverwrite(**dict(overwrites.get(author, discord.PermissionOverwrite(view_channel=True, read_message_history=True))))
+        overwrite.update(send_messages=not locked, add_reactions=not locked)
+        overwrites[author] = overwrite
+        await ch.edit(overwrites=overwrites, reason="Ticket closed" if locked else "Ticket reopened")
+
+async def resolve_channel(channel_id: int):
+    # fetch_channel errors propagate so a deleted/forbidden target is dead-lettered (or its transcript job failed) instead of retried.
+    return bot.get_channel(channel_id) or await bot.fetch_channel(channel_id)
+
+def is_permanent_send_error(e: Exception) -> bool:
+    return isinstance(e, (discord.NotFound, discord.Forbidden))
+
+# ---------- Command bus (dashboard -> bot) ----------
+
+async def bus_ticket(command: Dict[str, Any]) -> Tuple[Dict[str, Any], Any]:
+    channel_id = int(command["channel_id"])
+    ticket = await ticket_index.resolve(channel_id, int(command["guild_id"]))
+    if ticket is None:
+        raise LookupError(f"{channel_id} isn't a ticket in this server")
+    return ticket, await resolve_channel(channel_id)
+
+async def bus_queue_message(command: Dict[str, Any]) -> Dict[str, Any]:
+    # Written to the outbox like before, so delivery keeps its retries; the engine is woken in-process and the
+    # reply waits (up to "wait" seconds) for the first delivery attempt.
+    outbox_id = await queue_message(DB_PATH, int(command["channel_id"]), str(command["message"]),
+                                    str(command.get("created_by") or "dashboard"), int(command["guild_id"]))
+    delivery = await wait_delivered(outbox_id, float(command.get("wait", 5.0)))
+    return {"outbox_id": outbox_id, "delivery": delivery}
+
+async def bus_claim(command: Dict[str, Any]) -> Dict[str, Any]:
+    ticket, ch = await bus_ticket(command)
+    if ticket["status"] == "closed":
+        raise ValueError("ticket is already closed")
+    staff_id = int(command["staff_id"]) if command.get("staff_id") else None
+    await claim_ticket(ticket, ch, staff_id, f"<@{staff_id}> has claimed this ticket." if staff_id else "Staff have claimed this ticket.")
+    return {"ticket_id": ticket["id"], "status": "claimed"}
+
+async def bus_close(command: Dict[str, Any]) -> Dict[str, Any]:
+    ticket, ch = await bus_ticket(command)
+    if ticket["status"] != "closed":
+        await close_ticket(ticket, ch, "This ticket was closed by staff. If you need anything else, open a new one with `/ticket_panel`.")
+    return {"ticket_id": ticket["id"], "status": "closed"}
+
+async def bus_set_status(command: Dict[str, Any]) -> Dict[str, Any]:
+    status = command["status"]
+    if status == "claimed":
+        return await bus_claim(command)
+    if status == "closed":
+        return await bus_close(command)
+    if status != "open":
+        raise ValueError(f"unknown status {status!r}")
+    ticket, ch = await bus_ticket(command)
+    if ticket["status"] != "open":
+        if ticket["status"] == "closed":
+            await lock_ticket_channel(ticket, ch, locked=False)
+        await ticket_index.set_status(ticket["id"], "open")
+        await ch.send("This ticket was reopened by staff.")
+    return {"ticket_id": ticket["id"], "status": "open"}
+
+async def bus_bulk_start(command: Dict[str, Any]) -> Dict[str, Any]:
+    # The dashboard wrote the job itself; this only wakes the executor instead of waiting for its next poll.
+    bulk_executor.notify()
+    return {"job_id": command.get("job_id")}
+
+command_bus = CommandBus(
+    {"queue_message": bus_queue_message, "claim": bus_claim, "close": bus_close, "set_status": bus_set_status, "bulk_start": bus_bulk_start},
+    token=str(COMMAND_BUS_CFG.get("token", "") or ""),
+)
+
+async def start_command_bus():
+    global command_bus_runner
+    port = int(COMMAND_BUS_CFG.get("port", 0) or 0)
+    if port and command_bus_runner is None:
+        host = str(COMMAND_BUS_CFG.get("host", "127.0.0.1"))
+        command_bus_runner = await command_bus.serve(host, port)
+        log.info("Command bus on http://%s:%s/commands", host, port)
+
+def make_outbox_engine(shard: Optional[Tuple[int, int]] = None) -> OutboxEngine:
+    return OutboxEngine(
+        DB_PATH,
+        resolve_channel,
+        max_attempts=int(OUTBOX_CFG.get("max_attempts", 8)),
+        base_delay=float(OUTBOX_CFG.get("retry_base_seconds", 5)),
+        max_delay=float(OUTBOX_CFG.get("retry_max_seconds", 3600)),
+        is_permanent=is_permanent_send_error,
+        shard=shard,
+    )
+
+# One engine per shard this process runs, each claiming only its shard's guilds, so a backlog in one
+# shard's guilds doesn't delay delivery to the others.
+outbox_engines: Dict[int, OutboxEngine] = {}
+outbox_tasks: Dict[int, asyncio.Task] = {}
+
+# Runs back-to-back; each iteration drains a batch or sleeps until new outbox rows arrive.
+async def outbox_worker(engine: OutboxEngine):
+    while True:
+        try:
+            await engine.step()
+        except Exception as e:
+            count_api_error("outbox_worker", e)
+            log.exception("Outbox worker error")
+            await asyncio.sleep(5)
+
+def start_outbox_workers():
+    # Called from on_ready, which fires again after reconnects; shards whose worker is still running are left alone.
+    shard_count = bot.shard_count or 1
+    for shard_id in bot.shard_ids or range(shard_count):
+        task = outbox_tasks.get(shard_id)
+        if task is not None and not task.done():
+            continue
+        if shard_id not in outbox_engines:
+            outbox_engines[shard_id] = make_outbox_engine((shard_id, shard_count))
+        outbox_tasks[shard_id] = asyncio.create_task(outbox_worker(outbox_engines[shard_id]))
+
+ticket_index = TicketIndex(DB_PATH)
+guild_settings = GuildSettingsCache(DB_PATH, config_guild_settings())
+
+# ---------- Admission control ----------
+
+admission: Optional[AdmissionControl] = None
+if ADMISSION_CFG.get("enabled", False):
+    admission = AdmissionControl(
+        lambda guild_id, user_id, category: ticket_index.owned(guild_id, user_id, category),
+        max_open_per_user=int(ADMISSION_CFG.get("max_open_per_user", 1)),
+        user_per_hour=float(ADMISSION_CFG.get("user_per_hour", 6)),
+        user_burst=float(ADMISSION_CFG.get("user_burst", 2)),
+        creates_per_minute=float(ADMISSION_CFG.get("creates_per_minute", 30)),
+        burst=float(ADMISSION_CFG.get("burst", 10)),
+        queue_size=int(ADMISSION_CFG.get("queue_size", 50)),
+        queue_timeout=float(ADMISSION_CFG.get("queue_timeout_seconds", 300)),
+        categories=dict(ADMISSION_CFG.get("categories", {})),
+    )
+
+def ticket_mention(ticket: Dict[str, Any]) -> str:
+    return f"<#{ticket.get('channel_id') or ticket.get('thread_id')}>"
+
+def duplicate_notice(category_name: str, ticket: Dict[str, Any]) -> str:
+    return f"You already have an open {discord.utils.escape_markdown(category_name)} ticket: {ticket_mention(ticket)}"
+
+def queue_notifier(interaction: discord.Interaction) -> Callable[[int], Awaitable[None]]:
+    # One ephemeral followup per queued submission, edited as its place in line changes.
+    message = None
+
+    async def notify(position: int):
+        nonlocal message
+        text = f"Lots of tickets are being opened right now. You're #{position} in line; your ticket will be created automatically."
+        if message is None:
+            message = await interaction.followup.send(text, ephemeral=True, wait=True)
+        else:
+            await message.edit(content=text)
+    return notify
+
+# Picks up status and settings changes committed by other processes (the dashboard) within a second.
+@tasks.loop(seconds=1)
+async def ticket_index_refresher():
+    try:
+        await ticket_index.refresh_if_changed()
+        await guild_settings.refresh_if_changed()
     except Exception:
-        pass
+        log.exception("Ticket index refresh error")
 
-@tasks.loop(seconds=5)
-async def outbox_worker():
+transcript_archiver = TranscriptArchiver(
+    DB_PATH,
+    str(TRANSCRIPTS_CFG.get("dir", "transcripts")),
+    resolve_channel,
+    concurrency=int(TRANSCRIPTS_CFG.get("concurrency", 2)),
+    page_size=int(TRANSCRIPTS_CFG.get("page_size", 100)),
+    page_delay=float(TRANSCRIPTS_CFG.get("page_delay_seconds", 0.25)),
+    is_permanent=is_permanent_send_error,
+    rate_limited=lambda: metrics.total(metrics.DISCORD_RATE_LIMITED),
+)
+
+@tasks.loop(seconds=0)
+async def transcript_worker():
     try:
-        pending = await fetch_outbox(DB_PATH)
-        for row in pending:
-            target_id = int(row["thread_id"]) if row["thread_id"] else None
-            channel = None
-            if target_id:
-                channel = bot.get_channel(target_id)
-                if channel is None:
-                    try:
-                        channel = await bot.fetch_channel(target_id)
-                    except Exception:
-                        channel = None
-            if channel is None and row.get("thread_id", 0) == 0 and row.get("channel_id", 0):
-                # Fallback if schema extends later
-                channel = bot.get_channel(int(row["channel_id"]))
+        await transcript_archiver.step()
+    except Exception:
+        log.exception("Transcript worker error")
+        await asyncio.sleep(5)
 
-            if channel is not None:
-                try:
-                    await channel.send(row["message"])
-                    await mark_outbox_delivered(DB_PATH, row["id"])
-                except Exception as e:
-                    print("Failed to deliver:", e)
+# Optional: hidden channels pre-created under each ticket category, so most opens are a rename instead of a create.
+warm_pool: Optional[WarmPool] = None
+if WARM_POOL_CFG.get("enabled"):
+    warm_pool = WarmPool(
+        DB_PATH,
+        bot.get_guild,
+        lambda guild_id: guild_settings.get(guild_id),
+        min_size=int(WARM_POOL_CFG.get("min_size", 1)),
+        max_size=int(WARM_POOL_CFG.get("max_size", 10)),
+        lead_seconds=float(WARM_POOL_CFG.get("lead_seconds", 300)),
+        window_seconds=float(WARM_POOL_CFG.get("window_seconds", 900)),
+        creates_per_minute=float(WARM_POOL_CFG.get("creates_per_minute", 10)),
+        rate_limited=lambda: metrics.total(metrics.DISCORD_RATE_LIMITED),
+    )
+
+@bot.listen("on_guild_available")
+@bot.listen("on_guild_join")
+async def warm_pool_add_guild(guild: discord.Guild):
+    if warm_pool is not None:
+        warm_pool.add_guild(guild.id)
+
+@bot.listen("on_guild_remove")
+async def warm_pool_remove_guild(guild: discord.Guild):
+    if warm_pool is not None:
+        warm_pool.remove_guild(guild.id)
+
+@tasks.loop(seconds=0)
+async def warm_pool_worker():
+    try:
+        await warm_pool.step()
+    except Exception:
+        log.exception("Warm pool error")
+        await asyncio.sleep(5)
+
+# ---------- SLA timers ----------
+
+# Last message from a person in each active ticket, seen since this process started (ticket id -> unix time).
+ticket_activity: Dict[int, float] = {}
+
+@bot.listen("on_message")
+async def track_ticket_activity(message: discord.Message):
+    if message.author.bot:
+        return
+    ticket = ticket_index.get(message.channel.id)
+    if ticket is not None:
+        ticket_activity[ticket["id"]] = message.created_at.timestamp()
+
+def format_duration(seconds: float) -> str:
+    minutes = int(seconds // 60)
+    if minutes < 120:
+        return f"{minutes} minute" if minutes == 1 else f"{minutes} minutes"
+    hours = minutes // 60
+    return f"{hours} hours" if hours < 48 else f"{hours // 24} days"
+
+async def last_activity(ticket: Dict[str, Any], ch: Any) -> float:
+    # Messages since startup are tracked in memory; before that, one history page is read when the timer fires.
+    if ticket["id"] in ticket_activity:
+        return ticket_activity[ticket["id"]]
+    async for message in ch.history(limit=50):
+        if not message.author.bot:
+            return message.created_at.timestamp()
+    return 0.0
+
+async def fire_sla_timer(ticket_id: int, kind: str, due_at: float) -> Optional[float]:
+    ticket = await ticket_index.resolve_id(ticket_id)
+    if ticket is None or ticket["status"] not in ("open", "claimed") or (kind != AUTO_CLOSE and ticket["status"] != "open"):
+        return None
+    ch = await resolve_channel(ticket["channel_id"] or ticket["thread_id"])
+    settings = await guild_settings.get(ticket["guild_id"])
+    staff = f"<@&{settings['staff_role_id']}>" if settings["staff_role_id"] else "Staff"
+    waited = format_duration(time.time() - due_at + sla_timers.delays[kind])
+    if kind == REMIND:
+        await ch.send(f"{staff}: this ticket has been waiting {waited} for someone to claim it.", allowed_mentions=allowed_mentions())
+    elif kind == ESCALATE:
+        roles = " ".join(f"<@&{r}>" for r in settings["ping_role_ids"]) or staff
+        await ch.send(f"{roles}: escalating, this ticket is still unclaimed after {waited}.", allowed_mentions=allowed_mentions())
+    elif kind == AUTO_CLOSE:
+        idle = sla_timers.delays[AUTO_CLOSE]
+        active_until = await last_activity(ticket, ch) + idle
+        if active_until > time.time():
+            return active_until
+        ticket_activity.pop(ticket_id, None)
+        await close_ticket(ticket, ch, f"This ticket was closed after {format_duration(idle)} without activity. "
+                                       "If you still need help, open a new one with `/ticket_panel`.")
+    return None
+
+sla_timers: Optional[TimerScheduler] = None
+if any(float(SLA_CFG.get(k, 0) or 0) for k in ("remind_minutes", "escalate_minutes", "auto_close_hours")):
+    sla_timers = TimerScheduler(
+        DB_PATH,
+        fire_sla_timer,
+        remind_after=float(SLA_CFG.get("remind_minutes", 0) or 0) * 60,
+        escalate_after=float(SLA_CFG.get("escalate_minutes", 0) or 0) * 60,
+        auto_close_after=float(SLA_CFG.get("auto_close_hours", 0) or 0) * 3600,
+    )
+
+@tasks.loop(seconds=0)
+async def sla_worker():
+    try:
+        await sla_timers.step()
+    except Exception:
+        log.exception("SLA timer error")
+        await asyncio.sleep(5)
+
+# Folds new ticket status events (from the bot and the dashboard) into the analytics rollups.
+@tasks.loop(seconds=15)
+async def analytics_rollup():
+    try:
+        await apply_events(DB_PATH)
+    except Exception:
+        log.exception("Analytics rollup error")
+
+# Archives old rows and compacts the database once per [retention] interval_hours; the last run time is kept in kv.
+retention: Optional[Retention] = retention_from_config(cfg, DB_PATH) if RETENTION_CFG.get("enabled", False) else None
+
+@tasks.loop(minutes=10)
+async def retention_worker():
+    try:
+        report = await retention.run_if_due()
+        if report is not None:
+            log.info("%s", format_report(report))
+    except Exception:
+        log.exception("Retention error")
+
+# ---------- Bulk staff operations ----------
+
+BULK_CLOSE_NOTICE = "This ticket was closed by staff. If you need anything else, open a new one with `/ticket_panel`."
+
+async def bulk_channel(item: Dict[str, Any], limiter: RouteLimiter):
+    channel_id = item["channel_id"]
+    return bot.get_channel(channel_id) or await limiter.call(GET_CHANNEL, channel_id, lambda: bot.fetch_channel(channel_id))
+
+class BulkClose(BulkAction):
+    # Notice, then lock; the transcript jobs are written with the chunk's results.
+    status = "closed"
+
+    async def apply(self, job: Dict[str, Any], item: Dict[str, Any], limiter: RouteLimiter):
+        ch = await bulk_channel(item, limiter)
+        await limiter.call(SEND_MESSAGE, ch.id, lambda: ch.send(job["params"].get("message") or BULK_CLOSE_NOTICE, allowed_mentions=allowed_mentions()))
+        await limiter.call(EDIT_CHANNEL, ch.id, lambda: lock_ticket_channel(item, ch))
+
+    def records(self, job: Dict[str, Any], done: List[Dict[str, Any]]) -> List[Tuple[str, List[tuple]]]:
+        return [(ENQUEUE_TRANSCRIPT_SQL, [(item["ticket_id"], item["channel_id"], transcript_path(item["ticket_id"])) for item in done])]
+
+    def after(self, job: Dict[str, Any], done: List[Dict[str, Any]]):
+        if done:
+            transcript_archiver.notify()
+
+class BulkReassign(BulkAction):
+    status = "claimed"
+
+    async def apply(self, job: Dict[str, Any], item: Dict[str, Any], limiter: RouteLimiter):
+        ch = await bulk_channel(item, limiter)
+        text = job["params"].get("message") or f"<@{job['params']['staff_id']}> has taken over this ticket."
+        await limiter.call(SEND_MESSAGE, ch.id, lambda: ch.send(text, allowed_mentions=allowed_mentions()))
+
+class BulkBroadcast(BulkAction):
+    # Recorded as delivered outbox rows, so broadcasts show up in the dashboard's message search like queued messages.
+    async def apply(self, job: Dict[str, Any], item: Dict[str, Any], limiter: RouteLimiter):
+        ch = await bulk_channel(item, limiter)
+        await limiter.call(SEND_MESSAGE, ch.id, lambda: ch.send(job["params"]["message"], allowed_mentions=allowed_mentions()))
+
+    def records(self, job: Dict[str, Any], done: List[Dict[str, Any]]) -> List[Tuple[str, List[tuple]]]:
+        return [(
+            "INSERT INTO outbox (thread_id, message, created_by, delivered, guild_id) VALUES (?, ?, ?, 1, ?)",
+            [(item["channel_id"], job["params"]["message"], job["created_by"], job["guild_id"]) for item in done],
+        )]
+
+bulk_executor = BulkExecutor(
+    DB_PATH,
+    {"close": BulkClose(), "reassign": BulkReassign(), "broadcast": BulkBroadcast()},
+    limiter=RouteLimiter(global_per_second=float(BULK_CFG.get("global_per_second", 20))),
+    concurrency=int(BULK_CFG.get("concurrency", 8)),
+    chunk_size=int(BULK_CFG.get("chunk_size", 50)),
+    lease_seconds=float(BULK_CFG.get("lease_seconds", 60)),
+    max_attempts=int(BULK_CFG.get("max_attempts", 3)),
+    is_permanent=is_permanent_send_error,
+    on_status=lambda ids, status, claimed_by: [ticket_index.mark(i, status, claimed_by) for i in ids],
+)
+
+# Runs back-to-back; each iteration runs one job to the end or sleeps until one is created.
+@tasks.loop(seconds=0)
+async def bulk_worker():
+    try:
+        await bulk_executor.step()
     except Exception as e:
-        print("Outbox worker error:", e)
+        count_api_error("bulk_worker", e)
+        log.exception("Bulk worker error")
+        await asyncio.sleep(5)
+
+def bulk_progress(job: Dict[str, Any]) -> str:
+    text = f"Bulk {job['action']} #{job['id']}: {job['done']}/{job['total']} done"
+    if job["failed"] or job["skipped"]:
+        text += f", {job['failed']} failed, {job['skipped']} skipped (already closed)"
+    if job["status"] not in ("pending", "running"):
+        text += f" ({job['status']})"
+    return text
+
+@bot.tree.command(name="ticket_bulk", description="Close, reassign or message many tickets at once")
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_channels=True)
+@app_commands.describe(action="What to do with every matching ticket", status="Only open or only claimed tickets (default: both)",
+                       category="Only tickets in this category", older_than_hours="Only tickets opened at least this many hours ago",
+                       claimed_by="Only tickets claimed by this staff member", staff="reassign: the staff member taking the tickets over",
+                       message="broadcast: the message to send; close and reassign: replaces the default notice")
+@app_commands.choices(
+    action=[app_commands.Choice(name=a, value=a) for a in ("close", "reassign", "broadcast")],
+    status=[app_commands.Choice(name=s, value=s) for s in ("open", "claimed")],
+)
+@timed(COMMAND_MS)
+async def ticket_bulk(interaction: discord.Interaction, action: str, status: Optional[str] = None, category: Optional[str] = None,
+                      older_than_hours: Optional[app_commands.Range[float, 0]] = None, claimed_by: Optional[discord.Member] = None,
+                      staff: Optional[discord.Member] = None, message: Optional[str] = None):
+    if not is_staff(interaction.user, await guild_settings.get(interaction.guild_id)):
+        await interaction.response.send_message("You need the staff role to run bulk actions.", ephemeral=True)
+        return
+    if action == "reassign" and staff is None:
+        await interaction.response.send_message("Pick the staff member to reassign the tickets to.", ephemeral=True)
+        return
+    if action == "broadcast" and not message:
+        await interaction.response.send_message("A broadcast needs a message.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    created_to = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - older_than_hours * 3600)) if older_than_hours else None
+    params = {"message": message, "staff_id": staff.id if staff else None}
+    job_id, total = await create_bulk_job(DB_PATH, interaction.guild_id, action, params, str(interaction.user), status=status, category=category,
+                                          created_to=created_to, claimed_by=claimed_by.id if claimed_by else None)
+    if total == 0:
+        await interaction.followup.send("No open or claimed tickets match.", ephemeral=True)
+        return
+    progress = await interaction.followup.send(f"Bulk {action} #{job_id}: 0/{total} queued", ephemeral=True, wait=True)
+    last_edit = 0.0
+
+    # Edited at most every 2 seconds (the final report always), well inside the webhook's rate limit.
+    async def report(job: Dict[str, Any]):
+        nonlocal last_edit
+        final = job["status"] not in ("pending", "running")
+        if final or time.monotonic() - last_edit >= 2:
+            last_edit = time.monotonic()
+            await progress.edit(content=bulk_progress(job))
+
+    bulk_executor.watch(job_id, report)
+    bulk_executor.notify()
+
+# Appends a metrics snapshot to the JSON log; the interval comes from [metrics] log_interval_seconds.
+@tasks.loop(seconds=60)
+async def metrics_logger():
+    try:
+        await collect_gauges()
+        metrics_log.write_snapshot()
+    except Exception:
+        log.exception("Metrics log error")
+
+# Replaces discord.py's default handler, so it has to answer the interaction itself: otherwise the user is left
+# with "The application did not respond", or a "thinking…" that never ends after a defer.
+@bot.tree.error
+async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
+    original = getattr(error, "original", error)
+    command = interaction.command.name if interaction.command else "unknown"
+    count_api_error(f"command:{command}", original)
+    if isinstance(error, app_commands.CheckFailure):
+        text = "You can't use this command here."
+    else:
+        text = "Something went wrong running this command. Please try again, or contact staff if it keeps happening."
+        log.error("Command %s failed", command, exc_info=original)
+        if metrics_log is not None:
+            metrics_log.event("command_error", command=command, error=f"{type(original).__name__}: {original}")
+    try:
+        if interaction.response.is_done():
+            await interaction.followup.send(text, ephemeral=True)
+        else:
+            await interaction.response.send_message(text, ephemeral=True)
+    except discord.HTTPException as e:
+        # The interaction token may have expired (15 minutes) or the channel is gone.
+        log.warning("Could not report the error for command %s: %s", command, e)
+
+async def main():
+    # bot.start() doesn't configure logging the way bot.run() does.
+    discord.utils.setup_logging()
+    try:
+        await bot.start(DISCORD_TOKEN)
+    finally:
+        for task in outbox_tasks.values():
+            task.cancel()
+        await asyncio.gather(*outbox_tasks.values(), return_exceptions=True)
+        bulk_worker.cancel()
+        await transcript_archiver.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        if command_bus_runner is not None:
+            await command_bus_runner.cleanup()
+        if metrics_log is not None:
+            metrics_log.close()
+        await integrations.close()
+        await close_db()
 
 if __name__ == "__main__":
-    asyncio.run(bot.start(DISCORD_TOKEN))
+    asyncio.run(main())
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+import socket
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from admission import TokenBuckets
+from db import claim_bulk_job, finish_bulk_items, finish_bulk_job, list_bulk_items, start_bulk_items
+from metrics import counter, gauge, histogram
+
+T = TypeVar("T")
+
+ACTIONS = ("close", "reassign", "broadcast")
+
+# Discord routes a bulk action calls, with the documented limit of each (requests, per seconds). Buckets are per
+# route and major parameter, here always the ticket's channel, so tickets never wait on each other's buckets.
+SEND_MESSAGE = "POST /channels/{channel_id}/messages"
+EDIT_CHANNEL = "PATCH /channels/{channel_id}"
+GET_CHANNEL = "GET /channels/{channel_id}"
+ROUTE_LIMITS: Dict[str, Tuple[float, float]] = {
+    SEND_MESSAGE: (5, 5.0),
+    EDIT_CHANNEL: (5, 5.0),
+    GET_CHANNEL: (5, 1.0),
+}
+
+ITEMS = counter("bulk_items_total", "Bulk job tickets by action and result (done, failed, skipped)", ("action", "result"))
+WAITED = counter("bulk_rate_limit_wait_seconds_total", "Seconds bulk calls waited for a rate-limit bucket, by scope (route, global, 429)", ("scope",))
+REMAINING = gauge("bulk_items_remaining", "Tickets left in the running bulk job")
+JOB_SECONDS = histogram("bulk_job_seconds", "Wall time of a bulk job run", buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800))
+
+# Called with the job row after every chunk, e.g. to edit the progress message of the slash command that started it.
+ProgressListener = Callable[[Dict[str, Any]], Awaitable[None]]
+
+
+def rate_limit_delay(e: Exception) -> Optional[float]:
+    # Seconds to back off for a 429 that reached us: discord.RateLimited carries retry_after; an HTTPException
+    # with status 429 (discord.py gave up retrying) does not.
+    retry_after = getattr(e, "retry_after", None)
+    if retry_after is not None:
+        return float(retry_after)
+    return 1.0 if getattr(e, "status", None) == 429 else None
+
+
+class RouteLimiter:
+    # Client-side model of Discord's rate limits, so a bulk job paces itself instead of leaning on 429s and
+    # starving interactive traffic: one token bucket per (route, major parameter), and one for the job's share
+    # of the bot-wide global limit. Discord counts in fixed windows, and a bucket's burst plus what it refills
+    # within one window is what can land in that window, so each bucket's burst and rate add up to the limit.
+    # A 429 that still gets through blocks its bucket for retry_after.
+    def __init__(self, routes: Optional[Dict[str, Tuple[float, float]]] = None, global_per_second: float = 20.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.routes = {**ROUTE_LIMITS, **(routes or {})}
+        self.global_per_second = global_per_second
+        self.clock = clock
+        self._buckets = TokenBuckets()
+        self._blocked: Dict[Tuple[str, int], float] = {}
+
+    async def acquire(self, route: str, major: int):
+        requests, per = self.routes.get(route, (5, 5.0))
+        burst = max(1.0, requests // 2)
+        rate = max(requests - burst, 1.0) / per
+        global_burst = max(1.0, self.global_per_second / 4)
+        key = (route, major)
+        while True:
+            now = self.clock()
+            blocked = self._blocked.get(key, 0.0) - now
+            if blocked > 0:
+                WAITED.labels("429").inc(blocked)
+                await asyncio.sleep(blocked)
+                continue
+            self._blocked.pop(key, None)
+            wait = self._buckets.take(key, rate, burst, now)
+            if wait > 0:
+                WAITED.labels("route").inc(wait)
+                await asyncio.sleep(wait)
+                continue
+            wait = self._buckets.take("global", self.global_per_second - global_burst, global_burst, now)
+            if wait <= 0:
+                return
+            # Not sent after all: the route token goes back, and both are taken again after the wait.
+            self._buckets.give_back(key, burst)
+            WAITED.labels("global").inc(wait)
+            await asyncio.sleep(wait)
+
+    def block(self, route: str, major: int, seconds: float):
+        key = (route, major)
+        self._blocked[key] = max(self._blocked.get(key, 0.0), self.clock() + seconds)
+
+    async def call(self, route: str, major: int, fn: Callable[[], Awaitable[T]], tries: int = 3) -> T:
+        for attempt in range(tries):
+            await self.acquire(route, major)
+            try:
+                return await fn()
+            except Exception as e:
+                delay = rate_limit_delay(e)
+                if delay is None or attempt == tries - 1:
+                    raise
+                self.block(route, major, delay)
+        raise AssertionError("unreachable")
+
+
+class BulkAction(ABC):
+    # One kind of bulk operation. apply() makes one ticket's Discord calls through the limiter; `status` is the ticket
+    # status set once they succeeded (None leaves tickets as they are), and records() returns SQL for the tickets
+    # done, e.g. transcript jobs. Both are written in the same transaction as the chunk's results.
+    status: Optional[str] = None
+
+    @abstractmethod
+    async def apply(self, job: Dict[str, Any], item: Dict[str, Any], limiter: RouteLimiter):
+        ...
+
+    def records(self, job: Dict[str, Any], done: List[Dict[str, Any]]) -> List[Tuple[str, List[tuple]]]:
+        return []
+
+    def after(self, job: Dict[str, Any], done: List[Dict[str, Any]]):
+        # Called once a chunk's results are committed.
+        pass
+
+
+class BulkExecutor:
+    # Runs bulk jobs one at a time, each in chunks of chunk_size tickets: one transaction marks the chunk's items as
+    # applying, its tickets' Discord calls run concurrently (up to `concurrency`, paced by the limiter), and one
+    # transaction records the results, the status change of the tickets done, and progress. Jobs hold a lease renewed every chunk, so after a crash the next
+    # start picks the job up again; items already in 'applying' have their Discord calls made again (at least once,
+    # like the outbox), pending ones continue as usual.
+    def __init__(self, db_path: str, actions: Dict[str, BulkAction], *, limiter: Optional[RouteLimiter] = None,
+                 concurrency: int = 8, chunk_size: int = 50, lease_seconds: float = 60.0, idle_interval: float = 5.0,
+                 max_attempts: int = 3, base_delay: float = 2.0, is_permanent: Callable[[Exception], bool] = lambda e: False,
+                 on_status: Callable[[List[int], str, Optional[int]], None] = lambda ids, status, claimed_by: None):
+        self.db_path = db_path
+        self.actions = actions
+        self.limiter = limiter or RouteLimiter()
+        self.chunk_size = chunk_size
+        self.lease_seconds = lease_seconds
+        self.idle_interval = idle_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.is_permanent = is_permanent
+        # Keeps in-memory state (the ticket index) in step with the chunk's committed status change.
+        self.on_status = on_status
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self._sem = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._listeners: Dict[int, List[ProgressListener]] = {}
+
+    def notify(self):
+        self._wakeup.set()
+
+    def watch(self, job_id: int, listener: ProgressListener):
+        self._listeners.setdefault(job_id, []).append(listener)
+
+    async def _report(self, job: Dict[str, Any], final: bool = False):
+        listeners = self._listeners.pop(job["id"], []) if final else self._listeners.get(job["id"], [])
+        for listener in listeners:
+            try:
+                await listener(job)
+            except Exception as e:
+                print("Bulk progress listener failed:", e)
+
+    async def _apply(self, action: BulkAction, job: Dict[str, Any], item: Dict[str, Any], results: List[Tuple[int, str, int, Optional[str]]]):
+        # Transient failures are retried here with backoff; rate limits never get this far (the limiter absorbs them).
+        attempts = int(item["attempts"])
+        async with self._sem:
+            while True:
+                attempts += 1
+                try:
+                    await action.apply(job, item, self.limiter)
+                except Exception as e:
+                    message = f"{type(e).__name__}: {e}"[:500]
+                    if self.is_permanent(e) or attempts >= self.max_attempts:
+                        results.append((item["ticket_id"], "failed", attempts, message))
+                        return
+                    await asyncio.sleep(self.base_delay * 2 ** (attempts - 1))
+                else:
+                    results.append((item["ticket_id"], "done", attempts, None))
+                    return
+
+    async def _flush(self, action: BulkAction, job: Dict[str, Any], items: Dict[int, Dict[str, Any]],
+                     results: List[Tuple[int, str, int, Optional[str]]], claimed_by: Optional[int]) -> Optional[Dict[str, Any]]:
+        done = [items[ticket_id] for ticket_id, status, _, _ in results if status == "done"]
+        row, changed = await finish_bulk_items(self.db_path, job["id"], results, time.time() + self.lease_seconds, action.status, claimed_by,
+                                               action.records(job, done))
+        if action.status is not None and changed:
+            self.on_status(changed, action.status, claimed_by)
+        action.after(job, done)
+        for result in ("done", "failed"):
+            ITEMS.labels(job["action"], result).inc(sum(1 for r in results if r[1] == result))
+        return row
+
+    async def run(self, job: Dict[str, Any]):
+        action = self.actions.get(job["action"])
+        if action is None:
+            await finish_bulk_job(self.db_path, job["id"], "failed", f"unknown action {job['action']!r}")
+            return
+        job = dict(job, params=json.loads(job["params"] or "{}"))
+        staff_id = job["params"].get("staff_id")
+        claimed_by = int(staff_id) if staff_id else None
+        start = time.perf_counter()
+        try:
+            while True:
+                chunk = await list_bulk_items(self.db_path, job["id"], self.chunk_size)
+                if not chunk:
+                    await finish_bulk_job(self.db_path, job["id"], "done")
+                    job = dict(job, status="done")
+                    break
+                pending = [item["ticket_id"] for item in chunk if item["status"] == "pending"]
+                if pending:
+                    eligible = set(await start_bulk_items(self.db_path, job["id"], pending, time.time() + self.lease_seconds))
+                    ITEMS.labels(job["action"], "skipped").inc(len(pending) - len(eligible))
+                    chunk = [item for item in chunk if item["status"] == "applying" or item["ticket_id"] in eligible]
+                items = {item["ticket_id"]: item for item in chunk}
+                results: List[Tuple[int, str, int, Optional[str]]] = []
+                try:
+                    await asyncio.gather(*(self._apply(action, job, item, results) for item in chunk))
+                except asyncio.CancelledError:
+                    # Shutting down: keep what finished, so only the tickets still in flight are redone on resume.
+                    await self._flush(action, job, items, results, claimed_by)
+                    raise
+                row = await self._flush(action, job, items, results, claimed_by)
+                if row is not None:
+                    job = dict(job, **{k: v for k, v in row.items() if k != "params"})
+                    REMAINING.set(job["total"] - job["done"] - job["failed"] - job["skipped"])
+                if job["status"] == "cancelled":
+                    break
+                await self._report(job)
+        except asyncio.CancelledError:
+            await finish_bulk_job(self.db_path, job["id"], "pending")
+            raise
+        finally:
+            JOB_SECONDS.observe(time.perf_counter() - start)
+            REMAINING.set(0)
+        await self._report(job, final=True)
+
+    async def step(self):
+        job = await claim_bulk_job(self.db_path, self.owner, self.lease_seconds)
+        if job is not None:
+            await self.run(job)
+            return
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.idle_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
@@ -0,0 +1,101 @@
+import asyncio
+import hmac
+import json
+import time
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiohttp import web
+
+from metrics import counter, histogram
+
+# Runs one command (a JSON object with an "op") and returns its JSON result; raising reports the error.
+Handler = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+
+COMMAND_MS = histogram("command_bus_ms", "Command bus latency per command, from receipt to result", ("op",))
+COMMANDS = counter("command_bus_commands_total", "Command bus commands by op and result (ok, error)", ("op", "result"))
+BATCH_SIZE = histogram("command_bus_batch_size", "Commands per command bus request", buckets=(1, 2, 5, 10, 25, 50, 100))
+
+
+class CommandBus:
+    # A localhost HTTP endpoint through which the dashboard asks the bot to act right away instead of waiting
+    # for it to notice a SQLite write. POST /commands takes {"commands": [...]}. Commands for the same channel
+    # run in order, different channels concurrently, and the reply has one result per command in request order.
+    # With a token set, requests must carry it as "Authorization: Bearer <token>".
+    def __init__(self, handlers: Dict[str, Handler], token: str = "", max_batch: int = 100):
+        self.handlers = handlers
+        self.token = token
+        self.max_batch = max_batch
+
+    async def _run(self, command: Dict[str, Any]) -> Dict[str, Any]:
+        op = str(command.get("op", ""))
+        handler = self.handlers.get(op)
+        if handler is None:
+            COMMANDS.labels(op or "unknown", "error").inc()
+            return {"ok": False, "error": f"unknown op {op!r}"}
+        start = time.perf_counter()
+        try:
+            result = {"ok": True, **await handler(command)}
+        except Exception as e:
+            result = {"ok": False, "error": f"{type(e).__name__}: {e}"[:500]}
+        COMMAND_MS.labels(op).observe((time.perf_counter() - start) * 1000)
+        COMMANDS.labels(op, "ok" if result.get("ok") else "error").inc()
+        return result
+
+    async def execute(self, commands: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        results: List[Optional[Dict[str, Any]]] = [None] * len(commands)
+        groups: Dict[Any, List[int]] = OrderedDict()
+        for i, command in enumerate(commands):
+            groups.setdefault(command.get("channel_id"), []).append(i)
+
+        async def run_group(indexes: List[int]):
+            for i in indexes:
+                results[i] = await self._run(commands[i])
+
+        await asyncio.gather(*(run_group(indexes) for indexes in groups.values()))
+        return results  # type: ignore[return-value]
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.token and not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {self.token}"):
+            return web.json_response({"error": "unauthorized"}, status=401)
+        try:
+            body = await request.json()
+            commands = body["commands"]
+            if not isinstance(commands, list) or not all(isinstance(c, dict) for c in commands):
+                raise ValueError("commands must be a list of objects")
+        except Exception as e:
+            return web.json_response({"error": f"bad request: {e}"}, status=400)
+        if len(commands) > self.max_batch:
+            return web.json_response({"error": f"at most {self.max_batch} commands per request"}, status=413)
+        BATCH_SIZE.observe(len(commands))
+        return web.json_response({"results": await self.execute(commands)})
+
+    async def serve(self, host: str, port: int) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_post("/commands", self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+
+def send_commands(url: str, commands: List[Dict[str, Any]], token: str = "", timeout: float = 10.0) -> Optional[List[Dict[str, Any]]]:
+    # Blocking client for the dashboard. Returns None when nothing is listening (the bot is down), so the caller
+    # can fall back to writing SQLite. Other failures raise: after a timeout the bot may already have acted.
+    request = urllib.request.Request(url, data=json.dumps({"commands": commands}).encode("utf-8"), method="POST",
+                                     headers={"Content-Type": "application/json"})
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read())["results"]
+    except urllib.error.HTTPError:
+        raise
+    except urllib.error.URLError as e:
+        if isinstance(e.reason, ConnectionRefusedError):
+            return None
+        raise
+    except ConnectionRefusedError:
+        return None
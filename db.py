@@ -1,14 +1,15 @@
+import asyncio
+import json
+import re
+import sqlite3
+import time
 import aiosqlite
-from typing import Optional, List, Dict, Any
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Any, AsyncIterator, Awaitable, Callable, Iterable, Tuple, Union
 
-SCHEMA = """
-ALTER TABLE tickets ADD COLUMN category TEXT;
-ALTER TABLE tickets ADD COLUMN ko_fi TEXT;
-ALTER TABLE tickets ADD COLUMN steam_id TEXT;
-ALTER TABLE tickets ADD COLUMN cftools_id TEXT;
-ALTER TABLE tickets ADD COLUMN channel_id INTEGER;
-ALTER TABLE tickets ADD COLUMN forum_post_id INTEGER;
+from metrics import histogram, timed
 
+SCHEMA = """
 CREATE TABLE IF NOT EXISTS tickets (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     user_id INTEGER NOT NULL,
@@ -22,99 +23,1392 @@ CREATE TABLE IF NOT EXISTS tickets (
     ko_fi TEXT,
     steam_id TEXT,
     cftools_id TEXT,
-    status TEXT NOT NULL DEFAULT 'open', -- open | claimed | closed
+    status TEXT NOT NULL DEFAULT 'open', -- pending | open | claimed | closed | failed
     claimed_by INTEGER,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS outbox (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
+    thread_id INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    created_by TEXT NOT NULL, -- who queued it (staff name or dashboard)
+    delivered INTEGER NOT NULL DEFAULT 0, -- 0 pending | 1 delivered | 2 dead letter
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS enrichment_cache (
+    provider TEXT NOT NULL,
+    lookup_key TEXT NOT NULL, -- normalized Steam ID / Ko-fi handle / CF-Tools ID
+    payload TEXT NOT NULL, -- JSON
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (provider, lookup_key)
+);
+"""
+
+# Columns added to tables created by earlier releases; the baseline migration adds whichever are missing.
+ADDED_COLUMNS: Dict[str, List[tuple]] = {
+    "tickets": [
+        ("category", "TEXT"),
+        ("ko_fi", "TEXT"),
+        ("steam_id", "TEXT"),
+        ("cftools_id", "TEXT"),
+        ("channel_id", "INTEGER"),
+        ("forum_post_id", "INTEGER"),
+    ],
+    "outbox": [
+        ("lease_owner", "TEXT"),   # delivery worker currently holding the row
+        ("lease_until", "REAL"),   # unix time the claim expires
+        ("attempts", "INTEGER NOT NULL DEFAULT 0"),
+        ("next_attempt_at", "REAL"),  # unix time of the next retry after a failed send
+        ("last_error", "TEXT"),
+    ],
+}
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_tickets_thread ON tickets(thread_id);
+CREATE INDEX IF NOT EXISTS idx_tickets_created ON tickets(created_at);
+CREATE INDEX IF NOT EXISTS idx_tickets_status_created ON tickets(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_tickets_category_created ON tickets(category, created_at);
+CREATE INDEX IF NOT EXISTS idx_tickets_claimed_created ON tickets(claimed_by, created_at);
+CREATE INDEX IF NOT EXISTS idx_outbox_thread_delivered ON outbox(thread_id, delivered);
+CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox(delivered, id);
+"""
+
+# One index per hot access path; `python bench.py plans` fails if a hot query stops using one.
+HOT_PATH_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_tickets_channel ON tickets(channel_id);
+CREATE INDEX IF NOT EXISTS idx_outbox_delivered_created ON outbox(delivered, created_at);
+"""
+
+# Full-text indexes are external-content FTS5 tables kept in sync by triggers. Status/claim updates
+# don't touch indexed columns, so the update triggers only fire when searchable text changes.
+FTS_TABLES = {
+    "tickets_fts": """
+CREATE VIRTUAL TABLE tickets_fts USING fts5(reason, username, steam_id, category, content='tickets', content_rowid='id', tokenize='unicode61 remove_diacritics 2');
+CREATE TRIGGER IF NOT EXISTS tickets_fts_ai AFTER INSERT ON tickets BEGIN
+    INSERT INTO tickets_fts(rowid, reason, username, steam_id, category) VALUES (new.id, new.reason, new.username, new.steam_id, new.category);
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_fts_ad AFTER DELETE ON tickets BEGIN
+    INSERT INTO tickets_fts(tickets_fts, rowid, reason, username, steam_id, category) VALUES ('delete', old.id, old.reason, old.username, old.steam_id, old.category);
+END;
+CREATE TRIGGER IF NOT EXISTS tickets_fts_au AFTER UPDATE OF reason, username, steam_id, category ON tickets BEGIN
+    INSERT INTO tickets_fts(tickets_fts, rowid, reason, username, steam_id, category) VALUES ('delete', old.id, old.reason, old.username, old.steam_id, old.category);
+    INSERT INTO tickets_fts(rowid, reason, username, steam_id, category) VALUES (new.id, new.reason, new.username, new.steam_id, new.category);
+END;
+INSERT INTO tickets_fts(tickets_fts) VALUES ('rebuild');
+""",
+    "outbox_fts": """
+CREATE VIRTUAL TABLE outbox_fts USING fts5(message, content='outbox', content_rowid='id', tokenize='unicode61 remove_diacritics 2');
+CREATE TRIGGER IF NOT EXISTS outbox_fts_ai AFTER INSERT ON outbox BEGIN
+    INSERT INTO outbox_fts(rowid, message) VALUES (new.id, new.message);
+END;
+CREATE TRIGGER IF NOT EXISTS outbox_fts_ad AFTER DELETE ON outbox BEGIN
+    INSERT INTO outbox_fts(outbox_fts, rowid, message) VALUES ('delete', old.id, old.message);
+END;
+CREATE TRIGGER IF NOT EXISTS outbox_fts_au AFTER UPDATE OF message ON outbox BEGIN
+    INSERT INTO outbox_fts(outbox_fts, rowid, message) VALUES ('delete', old.id, old.message);
+    INSERT INTO outbox_fts(rowid, message) VALUES (new.id, new.message);
+END;
+INSERT INTO outbox_fts(outbox_fts) VALUES ('rebuild');
+""",
+}
+
+# Closed tickets are archived as gzipped JSONL: one gzip member per page of messages, so any page can be read
+# back on its own from (byte_offset, byte_length). A job's `bytes` is the committed length of its file; anything
+# past it was written by a run that crashed before recording the page, and is truncated on resume.
+TRANSCRIPT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS transcript_jobs (
+    ticket_id INTEGER PRIMARY KEY,
+    channel_id INTEGER NOT NULL,
+    path TEXT NOT NULL, -- archive file, relative to the transcripts directory
+    status TEXT NOT NULL DEFAULT 'pending', -- pending | running | done | failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_message_id INTEGER, -- resume point: history after this message
+    pages INTEGER NOT NULL DEFAULT 0,
+    messages INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_until REAL,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_transcript_jobs_status ON transcript_jobs(status, lease_until);
+CREATE TABLE IF NOT EXISTS transcript_pages (
+    ticket_id INTEGER NOT NULL,
+    page INTEGER NOT NULL,
+    byte_offset INTEGER NOT NULL,
+    byte_length INTEGER NOT NULL,
+    first_message_id INTEGER,
+    last_message_id INTEGER,
+    message_count INTEGER NOT NULL,
+    PRIMARY KEY (ticket_id, page)
+) WITHOUT ROWID;
+"""
+
+# Every status change is logged by trigger, so writes from the dashboard are captured too. analytics.py folds
+# new events into hour/day rollups per category and per staff member (staff_id 0 = everyone); the dashboard's
+# analytics view reads only the rollups. kv holds small bits of state such as the rollup cursor.
+ANALYTICS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ticket_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    actor_id INTEGER, -- author for the first event, claimer for 'claimed'
+    at REAL NOT NULL, -- unix time
+    backfilled INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_ticket_events_ticket ON ticket_events(ticket_id, status, id);
+CREATE TRIGGER IF NOT EXISTS ticket_events_ai AFTER INSERT ON tickets BEGIN
+    INSERT INTO ticket_events (ticket_id, status, actor_id, at) VALUES (new.id, new.status, new.user_id, (julianday('now') - 2440587.5) * 86400.0);
+END;
+CREATE TRIGGER IF NOT EXISTS ticket_events_au AFTER UPDATE OF status ON tickets WHEN new.status IS NOT old.status BEGIN
+    INSERT INTO ticket_events (ticket_id, status, actor_id, at)
+    VALUES (new.id, new.status, CASE WHEN new.status = 'claimed' THEN new.claimed_by END, (julianday('now') - 2440587.5) * 86400.0);
+END;
+CREATE TABLE IF NOT EXISTS ticket_rollups (
+    granularity TEXT NOT NULL, -- hour | day
+    bucket_start INTEGER NOT NULL, -- unix time, UTC
+    category TEXT NOT NULL,
+    staff_id INTEGER NOT NULL,
+    opened INTEGER NOT NULL DEFAULT 0,
+    claimed INTEGER NOT NULL DEFAULT 0,
+    closed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    claim_sketch TEXT, -- analytics.LatencySketch JSON, seconds from open to claim
+    close_sketch TEXT, -- seconds from open to close
+    PRIMARY KEY (granularity, bucket_start, category, staff_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS kv (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Multi-guild: per-guild settings (read lazily by guild_settings.py), outbox rows tagged with their guild so each
+# shard's worker claims only its own guilds, and guild-first composite indexes for everything the dashboard scopes
+# by guild. Rollups gain guild_id in their key; they are derived data, so the table is rebuilt and re-folded.
+GUILD_SCHEMA = """
+CREATE TABLE IF NOT EXISTS guild_settings (
+    guild_id INTEGER PRIMARY KEY,
+    name TEXT,
+    support_channel_id INTEGER NOT NULL DEFAULT 0, -- thread fallback for categories without a parent
+    staff_role_id INTEGER NOT NULL DEFAULT 0,
+    forum_channel_id INTEGER NOT NULL DEFAULT 0,
+    ping_role_ids TEXT NOT NULL DEFAULT '[]', -- JSON list of role IDs
+    ticket_categories TEXT NOT NULL DEFAULT '{}', -- JSON {category name: parent category ID}
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+ALTER TABLE outbox ADD COLUMN guild_id INTEGER NOT NULL DEFAULT 0;
+UPDATE outbox SET guild_id = COALESCE((SELECT t.guild_id FROM tickets t WHERE t.thread_id = outbox.thread_id OR t.channel_id = outbox.thread_id ORDER BY t.id DESC LIMIT 1), 0);
+CREATE INDEX IF NOT EXISTS idx_outbox_guild_delivered ON outbox(guild_id, delivered, id);
+CREATE INDEX IF NOT EXISTS idx_tickets_guild_created ON tickets(guild_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_tickets_guild_status_created ON tickets(guild_id, status, created_at);
+CREATE INDEX IF NOT EXISTS idx_tickets_guild_category_created ON tickets(guild_id, category, created_at);
+CREATE INDEX IF NOT EXISTS idx_tickets_guild_claimed_created ON tickets(guild_id, claimed_by, created_at);
+DROP TABLE IF EXISTS ticket_rollups;
+CREATE TABLE ticket_rollups (
+    granularity TEXT NOT NULL, -- hour | day
+    bucket_start INTEGER NOT NULL, -- unix time, UTC
+    guild_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    staff_id INTEGER NOT NULL,
+    opened INTEGER NOT NULL DEFAULT 0,
+    claimed INTEGER NOT NULL DEFAULT 0,
+    closed INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    claim_sketch TEXT,
+    close_sketch TEXT,
+    PRIMARY KEY (guild_id, granularity, bucket_start, category, staff_id)
+) WITHOUT ROWID;
+DELETE FROM kv WHERE key = 'analytics_cursor';
+"""
+
+# Warm pool: hidden channels pre-created under a ticket parent category, handed out by warm_pool.py. A row is
+# deleted when its channel becomes a ticket, so whatever is left after a restart is still idle and reusable.
+WARM_POOL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS warm_channels (
+    channel_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
+    parent_id INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_warm_channels_pool ON warm_channels(guild_id, parent_id, created_at);
+"""
+
+# SLA deadlines, one row per (ticket, kind). timers.py keeps them in a min-heap and derives them from
+# ticket_events, so dashboard status changes reschedule them too.
+TIMERS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ticket_timers (
+    ticket_id INTEGER NOT NULL,
+    kind TEXT NOT NULL, -- remind | escalate | auto_close
+    due_at REAL NOT NULL, -- unix time
+    PRIMARY KEY (ticket_id, kind)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_ticket_timers_due ON ticket_timers(due_at);
+"""
+
+# Bulk staff operations (bulk.py): a job is one action applied to every ticket that matched a filter when it was
+# created, one item row per ticket. Items go pending -> applying (its Discord calls are under way) -> done | failed
+# | skipped, so a job interrupted by a restart resumes where it stopped. A ticket's status changes only once its
+# calls succeeded, in the transaction that records the item as done. The counters on the job row are the progress the dashboard and the slash command show.
+BULK_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bulk_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guild_id INTEGER NOT NULL,
+    action TEXT NOT NULL, -- close | reassign | broadcast
+    params TEXT NOT NULL DEFAULT '{}', -- JSON: message, staff_id
+    created_by TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending', -- pending | running | done | cancelled | failed
+    total INTEGER NOT NULL DEFAULT 0,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_until REAL,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_bulk_jobs_status ON bulk_jobs(status, lease_until);
+CREATE INDEX IF NOT EXISTS idx_bulk_jobs_guild ON bulk_jobs(guild_id, id);
+CREATE TABLE IF NOT EXISTS bulk_job_items (
+    job_id INTEGER NOT NULL,
+    ticket_id INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL, -- the ticket's private channel or thread
+    status TEXT NOT NULL DEFAULT 'pending', -- pending | applying | done | failed | skipped
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    PRIMARY KEY (job_id, ticket_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_bulk_job_items_status ON bulk_job_items(job_id, status);
+"""
+
+# Retention (retention.py) moves closed tickets, their transcript index and old outbox rows into a separate archive
+# file, attached to the writer as "archive". It has the same column names and FTS5 tables, so the search queries
+# below run against it unchanged. Rows are copied with their original IDs; archived_at is unix time.
+ARCHIVE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY,
     user_id INTEGER NOT NULL,
     username TEXT NOT NULL,
     reason TEXT NOT NULL,
     guild_id INTEGER NOT NULL,
-    thread_id INTEGER NOT NULL,
-    status TEXT NOT NULL DEFAULT 'open', -- open | claimed | closed
+    thread_id INTEGER,
+    channel_id INTEGER,
+    forum_post_id INTEGER,
+    category TEXT,
+    ko_fi TEXT,
+    steam_id TEXT,
+    cftools_id TEXT,
+    status TEXT NOT NULL,
     claimed_by INTEGER,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP,
+    updated_at TIMESTAMP,
+    archived_at REAL NOT NULL
 );
+CREATE INDEX IF NOT EXISTS idx_tickets_guild_created ON tickets(guild_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_tickets_thread ON tickets(thread_id);
+CREATE INDEX IF NOT EXISTS idx_tickets_channel ON tickets(channel_id);
 CREATE TABLE IF NOT EXISTS outbox (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL,
     thread_id INTEGER NOT NULL,
     message TEXT NOT NULL,
-    created_by TEXT NOT NULL, -- who queued it (staff name or dashboard)
-    delivered INTEGER NOT NULL DEFAULT 0,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_by TEXT NOT NULL,
+    delivered INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    created_at TIMESTAMP,
+    archived_at REAL NOT NULL
 );
-CREATE INDEX IF NOT EXISTS idx_tickets_thread ON tickets(thread_id);
-CREATE INDEX IF NOT EXISTS idx_outbox_thread_delivered ON outbox(thread_id, delivered);
+CREATE INDEX IF NOT EXISTS idx_outbox_guild_thread ON outbox(guild_id, thread_id);
+"""
+ARCHIVE_TICKET_COLUMNS = "id, user_id, username, reason, guild_id, thread_id, channel_id, forum_post_id, category, ko_fi, steam_id, cftools_id, status, claimed_by, created_at, updated_at"
+ARCHIVE_OUTBOX_COLUMNS = "id, guild_id, thread_id, message, created_by, delivered, attempts, last_error, created_at"
+ARCHIVE_JOB_COLUMNS = "ticket_id, channel_id, path, status, attempts, last_message_id, pages, messages, bytes, last_error, created_at, updated_at"
+ARCHIVE_PAGE_COLUMNS = "ticket_id, page, byte_offset, byte_length, first_message_id, last_message_id, message_count"
+
+# Search queries, shared with the dashboard. bm25 ranking is applied to the most recent :candidates matches
+# of each source, which bounds the cost of very common terms; a NULL :guild_id searches every guild. Snippets are
+# cut in Python for the final page only; snippet() would re-run the MATCH once per returned row. {schema} is
+# "main", or "archive" for the attached archive.
+SEARCH_CANDIDATES = 1000
+SEARCH_TICKETS_TEMPLATE = """
+WITH top AS (
+    SELECT rowid, rank FROM (
+        SELECT tickets_fts.rowid, bm25(tickets_fts) AS rank FROM {schema}.tickets_fts JOIN {schema}.tickets ON tickets.id = tickets_fts.rowid
+        WHERE tickets_fts MATCH :q AND (:guild_id IS NULL OR tickets.guild_id = :guild_id) ORDER BY tickets_fts.rowid DESC LIMIT :candidates
+    ) ORDER BY rank LIMIT :limit
+)
+SELECT 'ticket' AS kind, t.id AS id, t.id AS ticket_id, t.thread_id, t.channel_id, t.status, t.category, t.username, t.steam_id,
+       t.created_at, t.reason AS text, top.rank AS rank
+FROM top JOIN {schema}.tickets t ON t.id = top.rowid ORDER BY top.rank
 """
+SEARCH_MESSAGES_TEMPLATE = """
+WITH top AS (
+    SELECT rowid, rank FROM (
+        SELECT outbox_fts.rowid, bm25(outbox_fts) AS rank FROM {schema}.outbox_fts JOIN {schema}.outbox ON outbox.id = outbox_fts.rowid
+        WHERE outbox_fts MATCH :q AND (:guild_id IS NULL OR outbox.guild_id = :guild_id) ORDER BY outbox_fts.rowid DESC LIMIT :candidates
+    ) ORDER BY rank LIMIT :limit
+)
+SELECT 'message' AS kind, o.id AS id, NULL AS ticket_id, o.thread_id, NULL AS channel_id, NULL AS status, NULL AS category,
+       o.created_by AS username, NULL AS steam_id, o.created_at, o.message AS text, top.rank AS rank
+FROM top JOIN {schema}.outbox o ON o.id = top.rowid ORDER BY top.rank
+"""
+SEARCH_TICKETS_SQL = SEARCH_TICKETS_TEMPLATE.format(schema="main")
+SEARCH_MESSAGES_SQL = SEARCH_MESSAGES_TEMPLATE.format(schema="main")
+ARCHIVE_SEARCH_TICKETS_SQL = SEARCH_TICKETS_TEMPLATE.format(schema="archive")
+ARCHIVE_SEARCH_MESSAGES_SQL = SEARCH_MESSAGES_TEMPLATE.format(schema="archive")
+def ticket_filter(guild_id: Optional[int] = None, status: Optional[str] = None, category: Optional[str] = None,
+                  created_from: Optional[str] = None, created_to: Optional[str] = None, claimed_by: Optional[int] = None) -> Tuple[List[str], List[Any]]:
+    # The dashboard's ticket filters, as WHERE conditions and their parameters.
+    where: List[str] = []
+    params: List[Any] = []
+    if guild_id is not None:
+        where.append("guild_id = ?")
+        params.append(guild_id)
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if category:
+        where.append("category = ?")
+        params.append(category)
+    if created_from:
+        where.append("created_at >= ?")
+        params.append(created_from)
+    if created_to:
+        where.append("created_at < ?")
+        params.append(created_to)
+    if claimed_by is not None:
+        where.append("claimed_by = ?")
+        params.append(claimed_by)
+    return where, params
+
+# Dashboard ticket list: keyset pagination on (created_at, id), so every page is an index range scan.
+def ticket_page_query(columns: str, guild_id: Optional[int] = None, status: Optional[str] = None, category: Optional[str] = None,
+                      created_from: Optional[str] = None, created_to: Optional[str] = None, claimed_by: Optional[int] = None,
+                      cursor: Optional[tuple] = None, page_size: int = 50) -> Tuple[str, tuple]:
+    where, params = ticket_filter(guild_id, status, category, created_from, created_to, claimed_by)
+    if cursor:
+        where.append("(created_at, id) < (?, ?)")
+        params.extend(cursor)
+    clause = f"WHERE {' AND '.join(where)}" if where else ""
+    return f"SELECT {columns} FROM tickets {clause} ORDER BY created_at DESC, id DESC LIMIT ?", (*params, page_size)
+
+# A guild's distinct categories via an index skip-scan: one seek per category instead of reading every ticket.
+CATEGORIES_SQL = """
+WITH RECURSIVE c(category) AS (
+    SELECT MIN(category) FROM tickets WHERE guild_id = :guild_id
+    UNION ALL
+    SELECT (SELECT MIN(category) FROM tickets WHERE guild_id = :guild_id AND category > c.category) FROM c WHERE c.category IS NOT NULL
+)
+SELECT category FROM c WHERE category IS NOT NULL
+"""
+
+# Every configured guild plus any guild with tickets, found with the same skip-scan (one seek per guild).
+GUILDS_SQL = """
+WITH RECURSIVE g(guild_id) AS (
+    SELECT MIN(guild_id) FROM tickets
+    UNION ALL
+    SELECT (SELECT MIN(guild_id) FROM tickets WHERE guild_id > g.guild_id) FROM g WHERE g.guild_id IS NOT NULL
+)
+SELECT g.guild_id, s.name FROM g LEFT JOIN guild_settings s ON s.guild_id = g.guild_id WHERE g.guild_id IS NOT NULL
+UNION
+SELECT guild_id, name FROM guild_settings
+ORDER BY 1
+"""
+
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+WORD_RE = re.compile(r"\w+")
+
+def search_terms(text: str) -> List[tuple]:
+    # (term, is_prefix) pairs; user input is treated as plain terms, a trailing * keeps prefix search.
+    terms = []
+    for word in text.split():
+        prefix = word.endswith("*")
+        for token in WORD_RE.findall(word.rstrip("*")):
+            terms.append((token.casefold(), prefix))
+    return terms
+
+def fts_query(text: str) -> str:
+    return " ".join(f'"{term}"' + ("*" if prefix else "") for term, prefix in search_terms(text))
+
+def make_snippet(text: str, terms: List[tuple], width: int = 16) -> str:
+    # Up to `width` words around the first match, with matches wrapped in HIGHLIGHT_START/END.
+    words = list(WORD_RE.finditer(text or ""))
+
+    def hit(word: str) -> bool:
+        word = word.casefold()
+        return any(word.startswith(t) if prefix else word == t for t, prefix in terms)
+
+    first = next((i for i, m in enumerate(words) if hit(m.group())), 0)
+    lo = max(0, first - width // 2)
+    hi = min(len(words), lo + width)
+    if not words:
+        return ""
+    out = ["…" if lo > 0 else ""]
+    pos = words[lo].start()
+    for m in words[lo:hi]:
+        out.append(text[pos:m.start()])
+        out.append(f"{HIGHLIGHT_START}{m.group()}{HIGHLIGHT_END}" if hit(m.group()) else m.group())
+        pos = m.end()
+    out.append("…" if hi < len(words) else text[pos:])
+    return "".join(out)
+
+def with_snippets(rows: List[Dict[str, Any]], text: str) -> List[Dict[str, Any]]:
+    terms = search_terms(text)
+    for row in rows:
+        # A ticket may match on username/steam_id/category rather than its reason
+        source = row.pop("text")
+        if row["kind"] == "ticket" and not any(t for t in terms if t[0] in (source or "").casefold()):
+            source = " · ".join(str(row[k]) for k in ("username", "steam_id", "category") if row.get(k)) or source
+        row["snippet"] = make_snippet(source, terms)
+    return rows
+
+def merge_search_results(ticket_rows: List[Dict[str, Any]], message_rows: List[Dict[str, Any]], limit: int, offset: int) -> List[Dict[str, Any]]:
+    # bm25 is lower-is-better in both tables
+    return sorted(ticket_rows + message_rows, key=lambda r: r["rank"])[offset:offset + limit]
+
+# Applied to every pooled connection. WAL lets the reader pool run alongside the single writer.
+DB_CALL_MS = histogram("db_call_ms", "Latency of db.py calls, including waits for the writer lock and reader pool", ("call",))
+
+PRAGMAS = (
+    # Only takes effect on a new file (so it comes before journal_mode, which writes the header) or after a full
+    # VACUUM; see retention.py.
+    "PRAGMA auto_vacuum=INCREMENTAL",
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+)
+READER_POOL_SIZE = 4
+STATEMENT_CACHE_SIZE = 256
+
+
+class Database:
+    def __init__(self, db_path: str, readers: int = READER_POOL_SIZE):
+        self.db_path = db_path
+        self.readers = readers
+        self._writer: Optional[aiosqlite.Connection] = None
+        # Polled for PRAGMA data_version so change detection never queues behind writes; see data_version().
+        self._watcher: Optional[aiosqlite.Connection] = None
+        self._watch_lock = asyncio.Lock()
+        self._watch_seen: Tuple[int, int] = (0, 0)
+        self._writer_version = 0
+        self._external_version = 0
+        self.commits = 0
+        self._reader_pool: asyncio.Queue = asyncio.Queue()
+        self._reader_conns: List[aiosqlite.Connection] = []
+        self._write_lock = asyncio.Lock()
+        self._open_lock = asyncio.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self._writer is not None
+
+    async def _connect(self) -> aiosqlite.Connection:
+        conn = await aiosqlite.connect(self.db_path, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = aiosqlite.Row
+        for pragma in PRAGMAS:
+            await conn.execute(pragma)
+        return conn
+
+    async def open(self):
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+            # Writer first so WAL mode is set before the readers attach.
+            writer = await self._connect()
+            for _ in range(self.readers):
+                conn = await self._connect()
+                self._reader_conns.append(conn)
+                self._reader_pool.put_nowait(conn)
+            self._watcher = await self._connect()
+            self._writer_version = (await writer.execute_fetchall("PRAGMA data_version"))[0][0]
+            self._watch_seen = ((await self._watcher.execute_fetchall("PRAGMA data_version"))[0][0], self.commits)
+            self._writer = writer
+
+    async def close(self):
+        async with self._open_lock:
+            if self._writer is None:
+                return
+            async with self._write_lock:
+                await self._writer.close()
+                self._writer = None
+            for conn in self._reader_conns:
+                await conn.close()
+            self._reader_conns.clear()
+            async with self._watch_lock:
+                await self._watcher.close()
+                self._watcher = None
+            self._reader_pool = asyncio.Queue()
+
+    @asynccontextmanager
+    async def write(self) -> AsyncIterator[aiosqlite.Connection]:
+        async with self._write_lock:
+            conn = self._writer
+            try:
+                yield conn
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+            self.commits += 1
+
+    async def data_version(self) -> int:
+        # Counts commits made by other connections (e.g. the dashboard). PRAGMA data_version is per connection and
+        # the watcher also sees this process's own commits, so a change there is only trusted when the writer
+        # committed nothing since the last poll. Otherwise the writer, which never sees its own commits, decides;
+        # an idle bot therefore never touches the writer, and a busy one does at most once per poll.
+        async with self._watch_lock:
+            version = (await self._watcher.execute_fetchall("PRAGMA data_version"))[0][0]
+            seen_version, seen_commits = self._watch_seen
+            self._watch_seen = (version, self.commits)
+            if version == seen_version:
+                return self._external_version
+            if self.commits != seen_commits:
+                async with self._write_lock:
+                    writer_version = (await self._writer.execute_fetchall("PRAGMA data_version"))[0][0]
+                if writer_version == self._writer_version:
+                    return self._external_version
+                self._writer_version = writer_version
+            self._external_version += 1
+            return self._external_version
+
+    @asynccontextmanager
+    async def read(self) -> AsyncIterator[aiosqlite.Connection]:
+        conn = await self._reader_pool.get()
+        try:
+            yield conn
+        finally:
+            self._reader_pool.put_nowait(conn)
+
+
+_databases: Dict[str, Database] = {}
+
+
+async def get_db(db_path: str) -> Database:
+    db = _databases.get(db_path)
+    if db is None:
+        db = _databases[db_path] = Database(db_path)
+    if not db.is_open:
+        await db.open()
+    return db
+
+
+async def open_db(db_path: str, readers: int = READER_POOL_SIZE) -> Database:
+    if db_path not in _databases:
+        _databases[db_path] = Database(db_path, readers=readers)
+    return await get_db(db_path)
+
+
+@timed(DB_CALL_MS)
+async def data_version(db_path: str) -> int:
+    # Only moves when another connection (e.g. the dashboard) commits.
+    db = await get_db(db_path)
+    return await db.data_version()
+
+
+async def close_db(db_path: Optional[str] = None):
+    paths = [db_path] if db_path else list(_databases)
+    for path in paths:
+        db = _databases.pop(path, None)
+        if db is not None:
+            await db.close()
+
+
+def split_sql(script: str) -> List[str]:
+    # executescript() commits on its own, so migrations run scripts statement by statement instead.
+    statements, current = [], ""
+    for line in script.splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    if current.strip():
+        statements.append(current.strip())
+    return statements
+
+async def _add_missing_columns(conn: aiosqlite.Connection):
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {row["name"] for row in await conn.execute_fetchall(f"PRAGMA table_info({table})")}
+        for name, decl in columns:
+            if name not in existing:
+                await conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+async def _create_fts_tables(conn: aiosqlite.Connection):
+    existing = {row["name"] for row in await conn.execute_fetchall("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    for table, script in FTS_TABLES.items():
+        if table not in existing:
+            for statement in split_sql(script):
+                await conn.execute(statement)
+
+Step = Union[str, Callable[[aiosqlite.Connection], Awaitable[None]]]
+
+# Applied in order, each exactly once, tracked by PRAGMA user_version. Never edit a shipped migration;
+# append a new one. Migration 1 is idempotent so databases from before versioning upgrade cleanly.
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, "baseline schema", [SCHEMA, _add_missing_columns, INDEXES, _create_fts_tables]),
+    (2, "hot path indexes", [HOT_PATH_INDEXES]),
+    (3, "forum post lookup index", ["CREATE INDEX IF NOT EXISTS idx_tickets_forum_post ON tickets(forum_post_id);"]),
+    (4, "transcript archive", [TRANSCRIPT_SCHEMA]),
+    (5, "ticket events and rollups", [ANALYTICS_SCHEMA]),
+    (6, "multi-guild", [GUILD_SCHEMA]),
+    (7, "warm channel pool", [WARM_POOL_SCHEMA]),
+    (8, "sla timers", [TIMERS_SCHEMA]),
+    (9, "bulk jobs", [BULK_SCHEMA]),
+    (10, "bulk item ticket index", ["CREATE INDEX IF NOT EXISTS idx_bulk_job_items_ticket ON bulk_job_items(ticket_id, status);"]),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+async def schema_version(db_path: str) -> int:
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        rows = await conn.execute_fetchall("PRAGMA user_version")
+        return rows[0][0]
+
+# The archive file (retention.py) is versioned separately, by its own user_version.
+ARCHIVE_MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, "archive baseline", [ARCHIVE_SCHEMA, TRANSCRIPT_SCHEMA, _create_fts_tables]),
+]
+
+async def _apply_steps(conn: aiosqlite.Connection, steps: List[Step]):
+    for step in steps:
+        if isinstance(step, str):
+            for statement in split_sql(step):
+                await conn.execute(statement)
+        else:
+            await step(conn)
+
+async def migrate(db_path: str) -> List[int]:
+    if await schema_version(db_path) >= SCHEMA_VERSION:
+        return []
+    db = await get_db(db_path)
+    applied = []
+    for version, name, steps in MIGRATIONS:
+        async with db.write() as conn:
+            # BEGIN IMMEDIATE takes the write lock before re-checking, so concurrent migrators can't both apply a step.
+            await conn.execute("BEGIN IMMEDIATE")
+            current = (await conn.execute_fetchall("PRAGMA user_version"))[0][0]
+            if current >= version:
+                continue
+            await _apply_steps(conn, steps)
+            await conn.execute(f"PRAGMA user_version = {version}")
+        applied.append(version)
+        print(f"Applied migration {version}: {name}")
+    return applied
+
+async def ensure_archive_schema(archive_path: str):
+    # Creates or upgrades the archive on a connection of its own, before it is attached anywhere.
+    conn = await aiosqlite.connect(archive_path)
+    conn.row_factory = aiosqlite.Row
+    try:
+        await conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        await conn.execute("PRAGMA journal_mode=WAL")
+        await conn.execute("PRAGMA busy_timeout=5000")
+        for version, name, steps in ARCHIVE_MIGRATIONS:
+            await conn.execute("BEGIN IMMEDIATE")
+            if (await conn.execute_fetchall("PRAGMA user_version"))[0][0] >= version:
+                await conn.rollback()
+                continue
+            await _apply_steps(conn, steps)
+            await conn.execute(f"PRAGMA user_version = {version}")
+            await conn.commit()
+            print(f"Applied archive migration {version}: {name}")
+    finally:
+        await conn.close()
 
 async def ensure_schema(db_path: str):
-    async with aiosqlite.connect(db_path) as db:
-        await db.executescript(SCHEMA)
-        await db.commit()
+    await migrate(db_path)
 
+@timed(DB_CALL_MS)
 async def add_ticket(db_path: str, user_id: int, username: str, reason: str, guild_id: int, thread_id: int):
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute(
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.execute(
             "INSERT INTO tickets (user_id, username, reason, guild_id, thread_id, status) VALUES (?, ?, ?, ?, ?, 'open')",
             (user_id, username, reason, guild_id, thread_id)
         )
-        await db.commit()
 
+@timed(DB_CALL_MS)
 async def set_ticket_status(db_path: str, thread_id: int, status: str, claimed_by: Optional[int] = None):
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute(
-            "UPDATE tickets SET status = ?, claimed_by = COALESCE(?, claimed_by), updated_at = CURRENT_TIMESTAMP WHERE thread_id = ?",
-            (status, claimed_by, thread_id)
+    # Accepts the ticket's thread or private channel ID (channel tickets are stored with thread_id = 0).
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.execute(
+            "UPDATE tickets SET status = ?, claimed_by = COALESCE(?, claimed_by), updated_at = CURRENT_TIMESTAMP WHERE thread_id = ? OR channel_id = ?",
+            (status, claimed_by, thread_id, thread_id)
+        )
+
+@timed(DB_CALL_MS)
+async def set_ticket_status_by_id(db_path: str, ticket_id: int, status: str, claimed_by: Optional[int] = None):
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.execute(
+            "UPDATE tickets SET status = ?, claimed_by = COALESCE(?, claimed_by), updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (status, claimed_by, ticket_id)
         )
-        await db.commit()
 
+@timed(DB_CALL_MS)
 async def get_ticket_by_thread(db_path: str, thread_id: int) -> Optional[Dict[str, Any]]:
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT * FROM tickets WHERE thread_id = ?", (thread_id,)) as cur:
-            row = await cur.fetchone()
-            return dict(row) if row else None
-
-async def list_tickets(db_path: str, status: Optional[str] = None) -> List[Dict[str, Any]]:
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
-        if status:
-            query = "SELECT * FROM tickets WHERE status = ? ORDER BY created_at DESC"
-            params = (status,)
-        else:
-            query = "SELECT * FROM tickets ORDER BY created_at DESC"
-            params = ()
-        async with db.execute(query, params) as cur:
-            rows = await cur.fetchall()
-            return [dict(r) for r in rows]
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall("SELECT * FROM tickets WHERE thread_id = ?", (thread_id,))
+        return dict(rows[0]) if rows else None
+
+TICKET_INDEX_COLUMNS = "id, guild_id, user_id, status, claimed_by, category, thread_id, channel_id, forum_post_id"
+
+@timed(DB_CALL_MS)
+async def get_ticket_by_channel(db_path: str, discord_id: int, guild_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    # Any Discord ID a ticket owns: its thread, private channel or forum post.
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall(
+            f"SELECT {TICKET_INDEX_COLUMNS} FROM tickets WHERE (thread_id = ? OR channel_id = ? OR forum_post_id = ?) "
+            "AND (? IS NULL OR guild_id = ?) ORDER BY id DESC LIMIT 1",
+            (discord_id, discord_id, discord_id, guild_id, guild_id)
+        )
+        return dict(rows[0]) if rows else None
+
+@timed(DB_CALL_MS)
+async def get_ticket_by_id(db_path: str, ticket_id: int) -> Optional[Dict[str, Any]]:
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall(f"SELECT {TICKET_INDEX_COLUMNS} FROM tickets WHERE id = ?", (ticket_id,))
+        return dict(rows[0]) if rows else None
+
+@timed(DB_CALL_MS)
+async def list_active_tickets(db_path: str) -> List[Dict[str, Any]]:
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall(f"SELECT {TICKET_INDEX_COLUMNS} FROM tickets WHERE status IN ('pending', 'open', 'claimed')")
+        return [dict(r) for r in rows]
+
+@timed(DB_CALL_MS)
+async def list_tickets(db_path: str, status: Optional[str] = None, guild_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    query, params = ticket_page_query("*", guild_id, status, page_size=-1)
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall(query, params)
+        return [dict(r) for r in rows]
+
+OUTBOX_PENDING = 0
+OUTBOX_DELIVERED = 1
+OUTBOX_DEAD = 2
+
+_outbox_listeners: List[Callable[[], None]] = []
+
+def on_outbox_queued(callback: Callable[[], None]):
+    _outbox_listeners.append(callback)
 
-async def queue_message(db_path: str, thread_id: int, message: str, created_by: str = "dashboard"):
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute(
-            "INSERT INTO outbox (thread_id, message, created_by, delivered) VALUES (?, ?, ?, 0)",
-            (thread_id, message, created_by)
+@timed(DB_CALL_MS)
+async def queue_message(db_path: str, thread_id: int, message: str, created_by: str = "dashboard", guild_id: int = 0) -> int:
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        cursor = await conn.execute(
+            "INSERT INTO outbox (thread_id, message, created_by, delivered, guild_id) VALUES (?, ?, ?, 0, ?)",
+            (thread_id, message, created_by, guild_id)
         )
-        await db.commit()
+        outbox_id = cursor.lastrowid
+    for callback in _outbox_listeners:
+        callback()
+    return outbox_id
 
+@timed(DB_CALL_MS)
 async def fetch_outbox(db_path: str):
-    async with aiosqlite.connect(db_path) as db:
-        db.row_factory = aiosqlite.Row
-        async with db.execute("SELECT * FROM outbox WHERE delivered = 0 ORDER BY created_at ASC") as cur:
-            rows = await cur.fetchall()
-            return [dict(r) for r in rows]
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall("SELECT * FROM outbox WHERE delivered = 0 ORDER BY created_at ASC")
+        return [dict(r) for r in rows]
 
+@timed(DB_CALL_MS)
 async def mark_outbox_delivered(db_path: str, outbox_id: int):
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute("UPDATE outbox SET delivered = 1 WHERE id = ?", (outbox_id,))
-        await db.commit()
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.execute("UPDATE outbox SET delivered = 1 WHERE id = ?", (outbox_id,))
+
+@timed(DB_CALL_MS)
+async def claim_outbox(db_path: str, owner: str, limit: int = 100, lease_seconds: float = 30.0,
+                       shard: Optional[Tuple[int, int]] = None) -> List[Dict[str, Any]]:
+    # Leases up to `limit` due rows; rows whose lease expired (crashed worker) are claimable again.
+    # shard=(shard_id, shard_count) only claims guilds on that gateway shard, using Discord's
+    # (guild_id >> 22) % shard_count; rows with no guild (0) fall to shard 0.
+    now = time.time()
+    shard_clause, shard_params = "", ()
+    if shard is not None:
+        shard_clause = "AND (guild_id >> 22) % ? = ? "
+        shard_params = (shard[1], shard[0])
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        rows = await conn.execute_fetchall(
+            "UPDATE outbox SET lease_owner = ?, lease_until = ? WHERE id IN ("
+            "SELECT id FROM outbox WHERE delivered = 0 AND (lease_until IS NULL OR lease_until < ?) "
+            f"AND (next_attempt_at IS NULL OR next_attempt_at <= ?) {shard_clause}ORDER BY id LIMIT ?"
+            ") RETURNING *",
+            (owner, now + lease_seconds, now, now, *shard_params, limit)
+        )
+    return sorted((dict(r) for r in rows), key=lambda r: r["id"])
+
+@timed(DB_CALL_MS)
+async def mark_outbox_delivered_many(db_path: str, outbox_ids: Iterable[int]):
+    ids = [(i,) for i in outbox_ids]
+    if not ids:
+        return
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.executemany("UPDATE outbox SET delivered = 1, lease_owner = NULL, lease_until = NULL WHERE id = ?", ids)
+
+@timed(DB_CALL_MS)
+async def record_outbox_failures(db_path: str, failures: Iterable[tuple]):
+    # failures: (outbox_id, attempts, next_attempt_at, error). A next_attempt_at of None dead-letters the row.
+    params = [(attempts, error, next_at, next_at, outbox_id) for outbox_id, attempts, next_at, error in failures]
+    if not params:
+        return
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.executemany(
+            "UPDATE outbox SET attempts = ?, last_error = ?, next_attempt_at = ?, "
+            "delivered = CASE WHEN ? IS NULL THEN 2 ELSE 0 END, lease_owner = NULL, lease_until = NULL WHERE id = ?",
+            params
+        )
+
+@timed(DB_CALL_MS)
+async def outbox_stats(db_path: str) -> Dict[str, float]:
+    # Pending depth, age in seconds of the oldest pending message, and dead-letter count; served from
+    # idx_outbox_delivered_created without touching the table.
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall(
+            "SELECT delivered, COUNT(*) AS n, CAST(strftime('%s', 'now') AS INTEGER) - CAST(strftime('%s', MIN(created_at)) AS INTEGER) AS oldest_age "
+            "FROM outbox WHERE delivered IN (0, 2) GROUP BY delivered"
+        )
+    stats = {"pending": 0, "oldest_pending_age": 0, "dead": 0}
+    for r in rows:
+        if r["delivered"] == OUTBOX_PENDING:
+            stats["pending"] = r["n"]
+            stats["oldest_pending_age"] = r["oldest_age"] or 0
+        else:
+            stats["dead"] = r["n"]
+    return stats
+
+@timed(DB_CALL_MS)
+async def list_dead_letters(db_path: str, limit: int = 100) -> List[Dict[str, Any]]:
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall("SELECT * FROM outbox WHERE delivered = 2 ORDER BY id DESC LIMIT ?", (limit,))
+        return [dict(r) for r in rows]
+
+@timed(DB_CALL_MS)
+async def requeue_outbox(db_path: str, outbox_ids: Iterable[int]):
+    ids = [(i,) for i in outbox_ids]
+    if not ids:
+        return
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.executemany(
+            "UPDATE outbox SET delivered = 0, attempts = 0, next_attempt_at = NULL, lease_owner = NULL, lease_until = NULL WHERE id = ? AND delivered = 2",
+            ids
+        )
+    for callback in _outbox_listeners:
+        callback()
+
+
+@timed(DB_CALL_MS)
+async def search(db_path: str, text: str, *, limit: int = 20, offset: int = 0, guild_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    # Ranked across ticket fields and outbox messages; each side only needs its top offset+limit hits.
+    query = fts_query(text)
+    if not query:
+        return []
+    params = {"q": query, "candidates": SEARCH_CANDIDATES, "limit": offset + limit, "guild_id": guild_id}
+    db = await get_db(db_path)
+
+    async def run(sql: str):
+        async with db.read() as conn:
+            return await conn.execute_fetchall(sql, params)
+
+    tickets, messages = await asyncio.gather(run(SEARCH_TICKETS_SQL), run(SEARCH_MESSAGES_SQL))
+    return with_snippets(merge_search_results([dict(r) for r in tickets], [dict(r) for r in messages], limit, offset), text)
+
+
+@timed(DB_CALL_MS)
+async def get_cached_enrichment(db_path: str, provider: str, lookup_key: str, min_fetched_at: float) -> Optional[Dict[str, Any]]:
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall(
+            "SELECT payload, fetched_at FROM enrichment_cache WHERE provider = ? AND lookup_key = ? AND fetched_at >= ?",
+            (provider, lookup_key, min_fetched_at)
+        )
+        return dict(rows[0]) if rows else None
+
+@timed(DB_CALL_MS)
+async def put_cached_enrichment(db_path: str, provider: str, lookup_key: str, payload: str, fetched_at: float):
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.execute(
+            "INSERT OR REPLACE INTO enrichment_cache (provider, lookup_key, payload, fetched_at) VALUES (?, ?, ?, ?)",
+            (provider, lookup_key, payload, fetched_at)
+        )
+
+
+@timed(DB_CALL_MS)
+async def add_ticket_full(db_path: str, *, user_id: int, username: str, reason: str, guild_id: int, thread_id: int | None, channel_id: int | None, forum_post_id: int | None, category: str | None, ko_fi: str | None, steam_id: str | None, cftools_id: str | None, status: str = "open") -> int:
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        cur = await conn.execute(
+            "INSERT INTO tickets (user_id, username, reason, guild_id, thread_id, channel_id, forum_post_id, category, ko_fi, steam_id, cftools_id, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (user_id, username, reason, guild_id, thread_id or 0, channel_id or 0, forum_post_id or 0, category, ko_fi, steam_id, cftools_id, status)
+        )
+        return cur.lastrowid
+
+@timed(DB_CALL_MS)
+async def finalize_ticket(db_path: str, ticket_id: int, *, thread_id: int | None, channel_id: int | None, forum_post_id: int | None, status: str = "open"):
+    # Completes a ticket inserted as 'pending' once its Discord objects exist (or marks it 'failed').
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.execute(
+            "UPDATE tickets SET thread_id = ?, channel_id = ?, forum_post_id = ?, status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'pending'",
+            (thread_id or 0, channel_id or 0, forum_post_id or 0, status, ticket_id)
+        )
+
+@timed(DB_CALL_MS)
+async def fail_stale_pending_tickets(db_path: str, older_than_seconds: int) -> int:
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        cur = await conn.execute(
+            "UPDATE tickets SET status = 'failed', updated_at = CURRENT_TIMESTAMP WHERE status = 'pending' AND created_at < datetime('now', ?)",
+            (f"-{int(older_than_seconds)} seconds",)
+        )
+        return cur.rowcount
+
+# ---------- Transcripts ----------
+
+# Shared with the dashboard, which enqueues the job itself when it closes a ticket while the bot is down.
+ENQUEUE_TRANSCRIPT_SQL = (
+    "INSERT INTO transcript_jobs (ticket_id, channel_id, path) VALUES (?, ?, ?) "
+    "ON CONFLICT(ticket_id) DO UPDATE SET status = 'pending', attempts = 0, lease_until = NULL, updated_at = CURRENT_TIMESTAMP "
+    "WHERE status IN ('done', 'failed')"
+)
+
+@timed(DB_CALL_MS)
+async def enqueue_transcript_job(db_path: str, ticket_id: int, channel_id: int, path: str):
+    # Closing a ticket again (after a reopen) re-runs a finished job; it resumes after the last archived message.
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.execute(ENQUEUE_TRANSCRIPT_SQL, (ticket_id, channel_id, path))
+
+@timed(DB_CALL_MS)
+async def claim_transcript_jobs(db_path: str, owner: str, limit: int, lease_seconds: float) -> List[Dict[str, Any]]:
+    # 'running' jobs whose lease expired belong to a crashed or stalled worker and are picked up again.
+    now = time.time()
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        rows = await conn.execute_fetchall(
+            "UPDATE transcript_jobs SET status = 'running', lease_owner = ?, lease_until = ?, updated_at = CURRENT_TIMESTAMP "
+            "WHERE ticket_id IN (SELECT ticket_id FROM transcript_jobs WHERE status IN ('pending', 'running') "
+            "AND (lease_until IS NULL OR lease_until < ?) ORDER BY ticket_id LIMIT ?) RETURNING *",
+            (owner, now + lease_seconds, now, limit)
+        )
+    return [dict(r) for r in rows]
 
+@timed(DB_CALL_MS)
+async def record_transcript_page(db_path: str, ticket_id: int, page: int, byte_offset: int, byte_length: int,
+                                 first_message_id: int, last_message_id: int, message_count: int, lease_until: float):
+    # The page index row and the job's resume point move together, in one transaction.
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.execute(
+            "INSERT OR REPLACE INTO transcript_pages (ticket_id, page, byte_offset, byte_length, first_message_id, last_message_id, message_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (ticket_id, page, byte_offset, byte_length, first_message_id, last_message_id, message_count)
+        )
+        await conn.execute(
+            "UPDATE transcript_jobs SET last_message_id = ?, pages = ?, messages = messages + ?, bytes = ?, lease_until = ?, "
+            "updated_at = CURRENT_TIMESTAMP WHERE ticket_id = ?",
+            (last_message_id, page + 1, message_count, byte_offset + byte_length, lease_until, ticket_id)
+        )
+
+@timed(DB_CALL_MS)
+async def finish_transcript_job(db_path: str, ticket_id: int, status: str, error: Optional[str] = None,
+                                retry_at: Optional[float] = None, attempts: Optional[int] = None):
+    # status 'done' or 'failed' is final; 'pending' with retry_at schedules another attempt.
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.execute(
+            "UPDATE transcript_jobs SET status = ?, last_error = ?, lease_owner = NULL, lease_until = ?, "
+            "attempts = COALESCE(?, attempts), updated_at = CURRENT_TIMESTAMP WHERE ticket_id = ?",
+            (status, error, retry_at, attempts, ticket_id)
+        )
+
+@timed(DB_CALL_MS)
+async def get_transcript_job(db_path: str, ticket_id: int) -> Optional[Dict[str, Any]]:
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall("SELECT * FROM transcript_jobs WHERE ticket_id = ?", (ticket_id,))
+        return dict(rows[0]) if rows else None
+
+@timed(DB_CALL_MS)
+async def list_transcript_pages(db_path: str, ticket_id: int) -> List[Dict[str, Any]]:
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall("SELECT * FROM transcript_pages WHERE ticket_id = ? ORDER BY page", (ticket_id,))
+        return [dict(r) for r in rows]
+
+# ---------- Guild settings ----------
+
+@timed(DB_CALL_MS)
+async def get_guild_settings(db_path: str, guild_id: int) -> Optional[Dict[str, Any]]:
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall("SELECT * FROM guild_settings WHERE guild_id = ?", (guild_id,))
+        return dict(rows[0]) if rows else None
+
+@timed(DB_CALL_MS)
+async def put_guild_settings(db_path: str, guild_id: int, *, name: Optional[str], support_channel_id: int, staff_role_id: int,
+                             forum_channel_id: int, ping_role_ids: str, ticket_categories: str):
+    # ping_role_ids and ticket_categories are JSON, encoded by guild_settings.py.
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.execute(
+            "INSERT OR REPLACE INTO guild_settings (guild_id, name, support_channel_id, staff_role_id, forum_channel_id, ping_role_ids, ticket_categories, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)",
+            (guild_id, name, support_channel_id, staff_role_id, forum_channel_id, ping_role_ids, ticket_categories)
+        )
+
+# ---------- Warm channel pool ----------
+
+@timed(DB_CALL_MS)
+async def add_warm_channel(db_path: str, channel_id: int, guild_id: int, parent_id: int):
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.execute(
+            "INSERT OR REPLACE INTO warm_channels (channel_id, guild_id, parent_id, created_at) VALUES (?, ?, ?, ?)",
+            (channel_id, guild_id, parent_id, time.time())
+        )
+
+@timed(DB_CALL_MS)
+async def take_warm_channel(db_path: str, guild_id: int, parent_id: int) -> Optional[int]:
+    # Oldest idle channel first; deleting the row hands it out exactly once.
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        rows = await conn.execute_fetchall(
+            "DELETE FROM warm_channels WHERE channel_id = (SELECT channel_id FROM warm_channels WHERE guild_id = ? AND parent_id = ? "
+            "ORDER BY created_at LIMIT 1) RETURNING channel_id",
+            (guild_id, parent_id)
+        )
+    return rows[0][0] if rows else None
+
+@timed(DB_CALL_MS)
+async def warm_pool_counts(db_path: str) -> Dict[Tuple[int, int], int]:
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall("SELECT guild_id, parent_id, COUNT(*) FROM warm_channels GROUP BY guild_id, parent_id")
+    return {(r[0], r[1]): r[2] for r in rows}
+
+# ---------- Key/value state ----------
+
+@timed(DB_CALL_MS)
+async def get_kv(db_path: str, key: str) -> Optional[str]:
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall("SELECT value FROM kv WHERE key = ?", (key,))
+        return rows[0][0] if rows else None
+
+@timed(DB_CALL_MS)
+async def set_kv(db_path: str, key: str, value: str):
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", (key, value))
+
+# ---------- SLA timers ----------
+
+@timed(DB_CALL_MS)
+async def load_ticket_timers(db_path: str) -> List[Tuple[float, int, str]]:
+    # Sorted by due time, which is already a valid heap.
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall("SELECT due_at, ticket_id, kind FROM ticket_timers ORDER BY due_at")
+        return [(r[0], r[1], r[2]) for r in rows]
+
+@timed(DB_CALL_MS)
+async def ticket_events_since(db_path: str, after_id: int, limit: int) -> List[Dict[str, Any]]:
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall("SELECT id, ticket_id, status, at FROM ticket_events WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit))
+        return [dict(r) for r in rows]
+
+@timed(DB_CALL_MS)
+async def save_ticket_timers(db_path: str, upserts: Iterable[Tuple[int, str, float]], deletes: Iterable[Tuple[int, str]],
+                             cursor: Optional[Tuple[str, str]] = None):
+    # Timer changes and the event cursor they were derived from commit together.
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.executemany("DELETE FROM ticket_timers WHERE ticket_id = ? AND kind = ?", list(deletes))
+        await conn.executemany("INSERT OR REPLACE INTO ticket_timers (ticket_id, kind, due_at) VALUES (?, ?, ?)", list(upserts))
+        if cursor is not None:
+            await conn.execute("INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)", cursor)
+
+# ---------- Bulk jobs ----------
+
+# Shared with the dashboard, which creates jobs on its own connection. Only open and claimed tickets are bulk targets.
+BULK_TARGET_STATUSES = ("open", "claimed")
+CREATE_BULK_JOB_SQL = "INSERT INTO bulk_jobs (guild_id, action, params, created_by) VALUES (?, ?, ?, ?) RETURNING id"
+# Sets the job's total; a job that matched nothing is done straight away.
+FINALIZE_BULK_JOB_SQL = (
+    "UPDATE bulk_jobs SET total = (SELECT COUNT(*) FROM bulk_job_items WHERE job_id = :id), "
+    "status = CASE WHEN EXISTS (SELECT 1 FROM bulk_job_items WHERE job_id = :id) THEN 'pending' ELSE 'done' END WHERE id = :id RETURNING total"
+)
+CANCEL_BULK_JOB_SQL = "UPDATE bulk_jobs SET status = 'cancelled', lease_owner = NULL, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND guild_id = ? AND status IN ('pending', 'running')"
+BULK_JOBS_SQL = "SELECT id, action, created_by, status, total, done, failed, skipped, last_error, created_at, updated_at FROM bulk_jobs WHERE guild_id = ? ORDER BY id DESC LIMIT ?"
+
+def bulk_target_query(columns: str, guild_id: int, status: Optional[str] = None, category: Optional[str] = None, created_from: Optional[str] = None,
+                      created_to: Optional[str] = None, claimed_by: Optional[int] = None) -> Tuple[str, tuple]:
+    # The open and claimed tickets matching the dashboard's filters; a status filter outside those matches nothing.
+    # Rows without an author (user_id 0) are left out: there is nobody to notify or lock out.
+    where, params = ticket_filter(guild_id, status, category, created_from, created_to, claimed_by)
+    where.append("user_id > 0")
+    if not status:
+        where.append(f"status IN ({', '.join('?' for _ in BULK_TARGET_STATUSES)})")
+        params.extend(BULK_TARGET_STATUSES)
+    elif status not in BULK_TARGET_STATUSES:
+        where.append("0")
+    return f"SELECT {columns} FROM tickets WHERE {' AND '.join(where)}", tuple(params)
 
-async def add_ticket_full(db_path: str, *, user_id: int, username: str, reason: str, guild_id: int, thread_id: int | None, channel_id: int | None, forum_post_id: int | None, category: str | None, ko_fi: str | None, steam_id: str | None, cftools_id: str | None):
-    async with aiosqlite.connect(db_path) as db:
-        await db.execute(
-            "INSERT INTO tickets (user_id, username, reason, guild_id, thread_id, channel_id, forum_post_id, category, ko_fi, steam_id, cftools_id, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'open')",
-            (user_id, username, reason, guild_id, thread_id or 0, channel_id or 0, forum_post_id or 0, category, ko_fi, steam_id, cftools_id)
+def bulk_items_query(job_id: int, guild_id: int, **filters: Any) -> Tuple[str, tuple]:
+    query, params = bulk_target_query("?, id, COALESCE(NULLIF(channel_id, 0), thread_id)", guild_id, **filters)
+    return f"INSERT INTO bulk_job_items (job_id, ticket_id, channel_id) {query} AND COALESCE(NULLIF(channel_id, 0), thread_id) > 0", (job_id, *params)
+
+@timed(DB_CALL_MS)
+async def count_bulk_targets(db_path: str, guild_id: int, **filters: Any) -> int:
+    query, params = bulk_target_query("COUNT(*)", guild_id, **filters)
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        return (await conn.execute_fetchall(query, params))[0][0]
+
+@timed(DB_CALL_MS)
+async def create_bulk_job(db_path: str, guild_id: int, action: str, params: Dict[str, Any], created_by: str, **filters: Any) -> Tuple[int, int]:
+    # Snapshots the matching tickets into items, in one transaction. Returns (job id, number of tickets).
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        job_id = (await conn.execute_fetchall(CREATE_BULK_JOB_SQL, (guild_id, action, json.dumps(params), created_by)))[0][0]
+        await conn.execute(*bulk_items_query(job_id, guild_id, **filters))
+        total = (await conn.execute_fetchall(FINALIZE_BULK_JOB_SQL, {"id": job_id}))[0][0]
+    return job_id, total
+
+@timed(DB_CALL_MS)
+async def claim_bulk_job(db_path: str, owner: str, lease_seconds: float) -> Optional[Dict[str, Any]]:
+    # The oldest unfinished job; a 'running' job whose lease expired belongs to a bot that stopped mid-run.
+    now = time.time()
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        rows = await conn.execute_fetchall(
+            "UPDATE bulk_jobs SET status = 'running', lease_owner = ?, lease_until = ?, updated_at = CURRENT_TIMESTAMP "
+            "WHERE id = (SELECT id FROM bulk_jobs WHERE status IN ('pending', 'running') AND (lease_until IS NULL OR lease_until < ?) "
+            "ORDER BY id LIMIT 1) RETURNING *",
+            (owner, now + lease_seconds, now)
+        )
+    return dict(rows[0]) if rows else None
+
+@timed(DB_CALL_MS)
+async def get_bulk_job(db_path: str, job_id: int) -> Optional[Dict[str, Any]]:
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall("SELECT * FROM bulk_jobs WHERE id = ?", (job_id,))
+        return dict(rows[0]) if rows else None
+
+@timed(DB_CALL_MS)
+async def list_bulk_items(db_path: str, job_id: int, limit: int) -> List[Dict[str, Any]]:
+    # Unfinished items, with the ticket's author (NULL once the ticket has been archived by retention).
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        rows = await conn.execute_fetchall(
+            "SELECT i.*, t.user_id FROM bulk_job_items i LEFT JOIN tickets t ON t.id = i.ticket_id "
+            "WHERE i.job_id = ? AND i.status IN ('pending', 'applying') LIMIT ?",
+            (job_id, limit)
+        )
+        return [dict(r) for r in rows]
+
+@timed(DB_CALL_MS)
+async def start_bulk_items(db_path: str, job_id: int, ticket_ids: List[int], lease_until: float) -> List[int]:
+    # Moves a chunk's items to 'applying' in one transaction. Tickets no longer open or claimed (closed meanwhile,
+    # or archived) are skipped. Returns the ticket IDs to apply.
+    ids = json.dumps(ticket_ids)
+    targets = ", ".join(f"'{s}'" for s in BULK_TARGET_STATUSES)
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        rows = await conn.execute_fetchall(f"SELECT id FROM tickets WHERE id IN (SELECT value FROM json_each(?)) AND status IN ({targets})", (ids,))
+        eligible = [r[0] for r in rows]
+        await conn.execute(
+            "UPDATE bulk_job_items SET status = CASE WHEN ticket_id IN (SELECT value FROM json_each(?)) THEN 'applying' ELSE 'skipped' END "
+            "WHERE job_id = ? AND ticket_id IN (SELECT value FROM json_each(?)) AND status = 'pending'",
+            (json.dumps(eligible), job_id, ids)
+        )
+        await conn.execute(
+            "UPDATE bulk_jobs SET skipped = skipped + ?, lease_until = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+            (len(ticket_ids) - len(eligible), lease_until, job_id)
+        )
+    return eligible
+
+@timed(DB_CALL_MS)
+async def finish_bulk_items(db_path: str, job_id: int, results: List[Tuple[int, str, int, Optional[str]]], lease_until: float,
+                            status: Optional[str] = None, claimed_by: Optional[int] = None,
+                            statements: Iterable[Tuple[str, List[tuple]]] = ()) -> Tuple[Optional[Dict[str, Any]], List[int]]:
+    # Records a chunk's results, (ticket_id, 'done' | 'failed', attempts, error), the job's status change for the done
+    # tickets still open or claimed, the action's own rows (`statements`) and the job's progress in one transaction,
+    # and renews the lease. A failed ticket keeps its status. Returns the job row, so a cancel is noticed, and the IDs
+    # of the tickets whose status changed.
+    done = json.dumps([ticket_id for ticket_id, result, _, _ in results if result == "done"])
+    targets = ", ".join(f"'{s}'" for s in BULK_TARGET_STATUSES)
+    changed: List[int] = []
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        if status is not None:
+            rows = await conn.execute_fetchall(
+                "UPDATE tickets SET status = ?, claimed_by = COALESCE(?, claimed_by), updated_at = CURRENT_TIMESTAMP "
+                f"WHERE id IN (SELECT value FROM json_each(?)) AND status IN ({targets}) RETURNING id",
+                (status, claimed_by, done)
+            )
+            changed = [r[0] for r in rows]
+        await conn.executemany(
+            "UPDATE bulk_job_items SET status = ?, attempts = ?, error = ? WHERE job_id = ? AND ticket_id = ?",
+            [(status, attempts, error, job_id, ticket_id) for ticket_id, status, attempts, error in results]
+        )
+        for query, params_seq in statements:
+            await conn.executemany(query, params_seq)
+        rows = await conn.execute_fetchall(
+            "UPDATE bulk_jobs SET done = done + ?, failed = failed + ?, lease_until = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? RETURNING *",
+            (sum(1 for r in results if r[1] == "done"), sum(1 for r in results if r[1] == "failed"), lease_until, job_id)
+        )
+    return (dict(rows[0]) if rows else None), changed
+
+@timed(DB_CALL_MS)
+async def finish_bulk_job(db_path: str, job_id: int, status: str, error: Optional[str] = None):
+    # 'done' or 'failed' is final; 'pending' hands the job back (shutdown) so the next start resumes it at once.
+    # A job cancelled meanwhile stays cancelled.
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.execute(
+            "UPDATE bulk_jobs SET status = ?, last_error = COALESCE(?, last_error), lease_owner = NULL, lease_until = NULL, "
+            "updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'running'",
+            (status, error, job_id)
         )
-        await db.commit()
+
+# ---------- Retention ----------
+
+# Closed or failed tickets whose last change is older than the cutoff, unless their transcript is still being archived.
+# created_at <= updated_at, so the created_at bound lets idx_tickets_status_created narrow the range.
+ARCHIVABLE_TICKETS_SQL = """
+SELECT id FROM tickets WHERE status IN ('closed', 'failed') AND created_at < :cutoff AND updated_at < :cutoff
+AND NOT EXISTS (SELECT 1 FROM transcript_jobs j WHERE j.ticket_id = tickets.id AND j.status IN ('pending', 'running'))
+AND NOT EXISTS (SELECT 1 FROM bulk_job_items b WHERE b.ticket_id = tickets.id AND b.status IN ('pending', 'applying'))
+AND NOT EXISTS (SELECT 1 FROM ticket_events e WHERE e.ticket_id = tickets.id
+                AND e.id > COALESCE((SELECT CAST(value AS INTEGER) FROM kv WHERE key = 'analytics_cursor'), 0))
+LIMIT :limit
+"""
+
+@timed(DB_CALL_MS)
+async def attach_archive(db_path: str, archive_path: str):
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        attached = {r["name"] for r in await conn.execute_fetchall("PRAGMA database_list")}
+        if "archive" not in attached:
+            await conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+
+@timed(DB_CALL_MS)
+async def detach_archive(db_path: str):
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        attached = {r["name"] for r in await conn.execute_fetchall("PRAGMA database_list")}
+        if "archive" in attached:
+            await conn.execute("DETACH DATABASE archive")
+
+async def _move_to_archive(db_path: str, ids_sql: str, params: Dict[str, Any], copies: List[Tuple[str, str, str]],
+                           drops: Iterable[Tuple[str, str]] = ()) -> int:
+    # Two short transactions on the writer, each touching one file: copy into the archive, then delete from main only
+    # what the archive now holds. A transaction spanning attached WAL databases is atomic per file, not across them;
+    # this way a crash in between leaves rows in both, and the next run finishes the move. copies: (table, key
+    # column, columns), the first being the table the IDs come from. drops: (table, key column) rows deleted from main
+    # along with the moved ones, in the same transaction, without an archive copy.
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        ids = [r[0] for r in await conn.execute_fetchall(ids_sql, params)]
+        if not ids:
+            return 0
+        batch = json.dumps(ids)
+        for i, (table, key, columns) in enumerate(copies):
+            extra, value = (", archived_at", ", ?") if i == 0 else ("", "")
+            await conn.execute(
+                f"INSERT OR IGNORE INTO archive.{table} ({columns}{extra}) SELECT {columns}{value} FROM main.{table} "
+                f"WHERE {key} IN (SELECT value FROM json_each(?))",
+                (time.time(), batch) if i == 0 else (batch,)
+            )
+    table, key, _ = copies[0]
+    async with db.write() as conn:
+        rows = await conn.execute_fetchall(f"SELECT {key} FROM archive.{table} WHERE {key} IN (SELECT value FROM json_each(?))", (batch,))
+        moved = json.dumps([r[0] for r in rows])
+        for table, key in drops:
+            await conn.execute(f"DELETE FROM main.{table} WHERE {key} IN (SELECT value FROM json_each(?))", (moved,))
+        for table, key, _ in reversed(copies):
+            await conn.execute(f"DELETE FROM main.{table} WHERE {key} IN (SELECT value FROM json_each(?))", (moved,))
+    return len(rows)
+
+@timed(DB_CALL_MS)
+async def archive_tickets(db_path: str, cutoff: str, limit: int) -> int:
+    # Needs attach_archive(). Moves up to `limit` tickets with their transcript index; returns how many moved.
+    # Their SLA timers, finished bulk job items and status events are deleted rather than archived: a closed ticket
+    # has no timers left to fire, a job keeps its counts on the bulk_jobs row, and events only feed the rollups
+    # and timers. ARCHIVABLE_TICKETS_SQL skips tickets with a bulk item still in flight or an event not yet folded
+    # into the rollups.
+    return await _move_to_archive(db_path, ARCHIVABLE_TICKETS_SQL, {"cutoff": cutoff, "limit": limit}, [
+        ("tickets", "id", ARCHIVE_TICKET_COLUMNS),
+        ("transcript_jobs", "ticket_id", ARCHIVE_JOB_COLUMNS),
+        ("transcript_pages", "ticket_id", ARCHIVE_PAGE_COLUMNS),
+    ], drops=[("ticket_timers", "ticket_id"), ("bulk_job_items", "ticket_id"), ("ticket_events", "ticket_id")])
+
+@timed(DB_CALL_MS)
+async def archive_outbox(db_path: str, delivered: int, cutoff: str, limit: int) -> int:
+    # Needs attach_archive(). Moves up to `limit` outbox rows in one delivery state (delivered or dead) created before cutoff.
+    return await _move_to_archive(
+        db_path, "SELECT id FROM outbox WHERE delivered = :delivered AND created_at < :cutoff LIMIT :limit",
+        {"delivered": delivered, "cutoff": cutoff, "limit": limit}, [("outbox", "id", ARCHIVE_OUTBOX_COLUMNS)]
+    )
+
+@timed(DB_CALL_MS)
+async def storage_stats(db_path: str) -> Dict[str, int]:
+    db = await get_db(db_path)
+    async with db.read() as conn:
+        stats = {}
+        for pragma in ("page_size", "page_count", "freelist_count", "auto_vacuum"):
+            stats[pragma] = (await conn.execute_fetchall(f"PRAGMA {pragma}"))[0][0]
+        return stats
+
+@timed(DB_CALL_MS)
+async def incremental_vacuum(db_path: str, pages: int) -> int:
+    # Returns up to `pages` free pages to the filesystem (auto_vacuum=INCREMENTAL only); returns how many were freed.
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        before = (await conn.execute_fetchall("PRAGMA freelist_count"))[0][0]
+        # The pragma frees one page per step and the sqlite3 module stops stepping after the first, as it returns
+        # no rows; executescript runs it to completion. The transaction is empty here, so its implicit COMMIT is harmless.
+        await conn.executescript(f"PRAGMA incremental_vacuum({int(pages)})")
+        after = (await conn.execute_fetchall("PRAGMA freelist_count"))[0][0]
+    return before - after
+
+@timed(DB_CALL_MS)
+async def wal_checkpoint(db_path: str, mode: str = "PASSIVE") -> Dict[str, int]:
+    if mode.upper() not in ("PASSIVE", "FULL", "RESTART", "TRUNCATE"):
+        raise ValueError(f"unknown checkpoint mode {mode!r}")
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        busy, log, checkpointed = (await conn.execute_fetchall(f"PRAGMA wal_checkpoint({mode.upper()})"))[0]
+    return {"busy": busy, "log_frames": log, "checkpointed_frames": checkpointed}
+
+async def vacuum_full(db_path: str):
+    # One-off: rewrites the whole file, which also switches an existing database to auto_vacuum=INCREMENTAL.
+    # Blocks every writer for its duration, so it is a CLI command (`python retention.py vacuum`), never scheduled.
+    db = await get_db(db_path)
+    async with db.write() as conn:
+        await conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        await conn.execute("VACUUM")
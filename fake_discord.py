@@ -0,0 +1,333 @@
+import asyncio
+import datetime
+import itertools
+import random
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import discord
+from discord.channel import ThreadWithMessage
+
+# Local stand-ins for the Discord objects bot.py touches, so the ticket lifecycle can be load tested
+# without a gateway connection. The channel and member fakes subclass the real discord.py classes so
+# the isinstance checks in bot.py take the same branches they do in production.
+
+_snowflakes = itertools.count(1_100_000_000_000_000_000)
+
+
+def snowflake() -> int:
+    return next(_snowflakes)
+
+
+class FakeAPI:
+    # Every REST call sleeps for a jittered latency (per route where `route_latency` has one). A
+    # configurable share of calls is answered with a 429; like discord.py's HTTP client, the call then
+    # sleeps retry_after and retries, giving up after five tries. With `buckets` (route -> (requests, per
+    # seconds)) and `global_per_second`, calls beyond Discord's fixed-window limits per (route, major
+    # parameter) and per second overall get a 429 too, with retry_after set to when the window resets.
+    def __init__(self, latency: float = 0.05, rate_limit: float = 0.0, retry_after: float = 0.5,
+                 max_tries: int = 5, seed: Optional[int] = None, route_latency: Optional[Dict[str, float]] = None,
+                 buckets: Optional[Dict[str, Tuple[int, float]]] = None, global_per_second: Optional[int] = None):
+        self.latency = latency
+        self.route_latency = dict(route_latency or {})
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.max_tries = max_tries
+        self.random = random.Random(seed)
+        self.buckets = dict(buckets or {})
+        self.global_per_second = global_per_second
+        self._windows: Dict[Any, List[float]] = {}
+        self.routes: Dict[str, Dict[str, Any]] = {}
+
+    def _window(self, key: Any, requests: int, per: float, now: float) -> Optional[float]:
+        # [window start, calls in it]; returns the seconds until the window resets when it is full.
+        window = self._windows.setdefault(key, [now, 0])
+        if now - window[0] >= per:
+            window[0], window[1] = now, 0
+        if window[1] >= requests:
+            return window[0] + per - now
+        window[1] += 1
+        return None
+
+    def _limited(self, route: str, major: Optional[int]) -> Optional[float]:
+        now = time.monotonic()
+        if self.global_per_second:
+            wait = self._window("global", self.global_per_second, 1.0, now)
+            if wait is not None:
+                return wait
+        if route in self.buckets:
+            return self._window((route, major), *self.buckets[route], now)
+        return None
+
+    async def request(self, route: str, major: Optional[int] = None):
+        stats = self.routes.setdefault(route, {"calls": 0, "rate_limited": 0, "failed": 0, "latencies": []})
+        stats["calls"] += 1
+        start = time.perf_counter()
+        latency = self.route_latency.get(route, self.latency)
+        for _ in range(self.max_tries):
+            await asyncio.sleep(latency * self.random.uniform(0.5, 1.5))
+            retry_after = self._limited(route, major)
+            if retry_after is None and self.random.random() >= self.rate_limit:
+                stats["latencies"].append((time.perf_counter() - start) * 1000)
+                return
+            stats["rate_limited"] += 1
+            await asyncio.sleep(retry_after or self.retry_after)
+        stats["failed"] += 1
+        raise discord.HTTPException(SimpleNamespace(status=429, reason="Too Many Requests"), "rate limited")
+
+
+def not_found(what: str) -> discord.NotFound:
+    return discord.NotFound(SimpleNamespace(status=404, reason="Not Found"), f"Unknown {what}")
+
+
+class FakeMessage:
+    def __init__(self, channel_id: int, author: Any, content: str, attachments: Optional[List[Any]] = None):
+        self.id = snowflake()
+        self.channel_id = channel_id
+        self.author = author
+        self.content = content
+        self.created_at = datetime.datetime.now(datetime.timezone.utc)
+        self.edited_at = None
+        self.attachments = attachments or []
+        self.embeds: List[Any] = []
+        self.reference = None
+
+
+class FakeGateway:
+    # Plays the part of the bot's connection cache: every fake channel is registered here.
+    def __init__(self, api: FakeAPI):
+        self.api = api
+        self.channels: Dict[int, Any] = {}
+        self.sent: List[tuple] = []
+        self.user = FakeMember("TicketBot")
+
+    def add(self, channel):
+        self.channels[channel.id] = channel
+        return channel
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+    async def fetch_channel(self, channel_id: int):
+        await self.api.request("GET /channels/{channel_id}", channel_id)
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            raise not_found("Channel")
+        return channel
+
+    def remove(self, channel_id: int):
+        self.channels.pop(channel_id, None)
+
+
+class _Messageable:
+    gateway: FakeGateway
+    messages: List[FakeMessage]
+
+    async def send(self, content: Optional[str] = None, **kwargs):
+        if self.id not in self.gateway.channels:
+            raise not_found("Channel")
+        await self.gateway.api.request("POST /channels/{channel_id}/messages", self.id)
+        self.messages.append(FakeMessage(self.id, self.gateway.user, content or ""))
+        self.gateway.sent.append((self.id, content, time.perf_counter()))
+
+    async def history(self, *, limit: Optional[int] = 100, after=None, oldest_first: Optional[bool] = None, **kwargs):
+        # Pages of 100 per request, like the real endpoint; only oldest-first iteration is modelled.
+        if self.id not in self.gateway.channels:
+            raise not_found("Channel")
+        after_id = getattr(after, "id", 0) or 0
+        remaining = limit
+        while remaining is None or remaining > 0:
+            await self.gateway.api.request("GET /channels/{channel_id}/messages", self.id)
+            batch = [m for m in self.messages if m.id > after_id][:min(100, remaining or 100)]
+            for message in batch:
+                yield message
+            if len(batch) < 100:
+                return
+            after_id = batch[-1].id
+            if remaining is not None:
+                remaining -= len(batch)
+
+    async def delete(self, **kwargs):
+        await self.gateway.api.request("DELETE /channels/{channel_id}", self.id)
+        self.gateway.remove(self.id)
+
+
+class FakeThread(_Messageable, discord.Thread):
+    def __init__(self, gateway: FakeGateway, name: str, parent_id: int):
+        self.gateway = gateway
+        self.id = snowflake()
+        self.name = name
+        self.parent_id = parent_id
+        self.archived = False
+        self.locked = False
+        self.messages = []
+
+    async def archive(self, *, locked: bool = False, **kwargs):
+        await self.edit(archived=True, locked=locked)
+
+    async def edit(self, *, archived: Optional[bool] = None, locked: Optional[bool] = None, **kwargs):
+        if self.id not in self.gateway.channels:
+            raise not_found("Channel")
+        await self.gateway.api.request("PATCH /channels/{channel_id}", self.id)
+        self.archived = self.archived if archived is None else archived
+        self.locked = self.locked if locked is None else locked
+        self.name = kwargs.get("name", self.name)
+        return self
+
+
+class FakeTextChannel(_Messageable, discord.TextChannel):
+    # Shadows the property that reads discord.py's internal overwrite list (see FakeMember).
+    overwrites = None
+
+    def __init__(self, gateway: FakeGateway, name: str, category_id: Optional[int] = None, overwrites: Optional[Dict[Any, Any]] = None):
+        self.gateway = gateway
+        self.id = snowflake()
+        self.name = name
+        self.category_id = category_id
+        self.overwrites = dict(overwrites or {})
+        self.messages = []
+
+    async def create_thread(self, *, name: str, **kwargs):
+        await self.gateway.api.request("POST /channels/{channel_id}/threads", self.id)
+        return self.gateway.add(FakeThread(self.gateway, name, self.id))
+
+    async def edit(self, **kwargs):
+        if self.id not in self.gateway.channels:
+            raise not_found("Channel")
+        await self.gateway.api.request("PATCH /channels/{channel_id}", self.id)
+        # Text channels have no archived flag; the real API rejects it.
+        if "archived" in kwargs:
+            raise discord.HTTPException(SimpleNamespace(status=400, reason="Bad Request"), "Invalid Form Body")
+        self.name = kwargs.get("name", self.name)
+        if "overwrites" in kwargs:
+            self.overwrites = dict(kwargs["overwrites"])
+        return self
+
+
+class FakeCategory(discord.CategoryChannel):
+    def __init__(self, name: str):
+        self.id = snowflake()
+        self.name = name
+
+
+class FakeForum(discord.ForumChannel):
+    def __init__(self, gateway: FakeGateway, name: str):
+        self.gateway = gateway
+        self.id = snowflake()
+        self.name = name
+
+    async def create_thread(self, *, name: str, content: Optional[str] = None, **kwargs):
+        await self.gateway.api.request("POST /channels/{channel_id}/threads", self.id)
+        thread = self.gateway.add(FakeThread(self.gateway, name, self.id))
+        return ThreadWithMessage(thread=thread, message=None)
+
+
+class FakeMember(discord.Member):
+    # discord.Member reads these through properties backed by state we don't have; plain class
+    # attributes shadow them so instances can carry their own values.
+    id = None
+    name = None
+    display_name = None
+    mention = None
+    roles = None
+
+    def __init__(self, name: str, role_ids: Optional[List[int]] = None):
+        self.id = snowflake()
+        self.name = name
+        self.display_name = name
+        self.mention = f"<@{self.id}>"
+        self.roles = [discord.Object(id=r) for r in role_ids or []]
+
+    def __str__(self) -> str:
+        return self.name
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, FakeMember) and other.id == self.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+
+class FakeGuild:
+    def __init__(self, gateway: FakeGateway, guild_id: int, role_ids: List[int], name: str = "guild"):
+        self.gateway = gateway
+        self.id = guild_id
+        self.name = name
+        self.default_role = discord.Object(id=guild_id)
+        self.me = gateway.user
+        self._roles = {r: discord.Object(id=r) for r in role_ids}
+
+    def get_role(self, role_id: int):
+        return self._roles.get(role_id)
+
+    def get_channel(self, channel_id: int):
+        return self.gateway.get_channel(channel_id)
+
+    async def create_text_channel(self, name: str, *, category=None, overwrites=None, **kwargs):
+        await self.gateway.api.request("POST /guilds/{guild_id}/channels")
+        return self.gateway.add(FakeTextChannel(self.gateway, name, category.id if category else None, overwrites))
+
+
+class FakeResponse:
+    def __init__(self, api: FakeAPI):
+        self.api = api
+        self._done = False
+        self.messages: List[str] = []
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _callback(self):
+        if self._done:
+            raise discord.InteractionResponded(None)
+        await self.api.request("POST /interactions/{interaction_id}/{token}/callback")
+        self._done = True
+
+    async def defer(self, **kwargs):
+        await self._callback()
+
+    async def send_message(self, content: Optional[str] = None, **kwargs):
+        await self._callback()
+        self.messages.append(content or "")
+
+    async def send_modal(self, modal):
+        await self._callback()
+
+
+class FakeFollowup:
+    def __init__(self, api: FakeAPI, response: FakeResponse):
+        self.api = api
+        self.response = response
+
+    async def send(self, content: Optional[str] = None, *, wait: bool = False, **kwargs):
+        await self.api.request("POST /webhooks/{application_id}/{token}")
+        self.response.messages.append(content or "")
+        return FakeWebhookMessage(self, len(self.response.messages) - 1) if wait else None
+
+
+class FakeWebhookMessage:
+    # A followup sent with wait=True; edits replace its entry in the interaction's message log.
+    def __init__(self, followup: FakeFollowup, index: int):
+        self.id = snowflake()
+        self.followup = followup
+        self.index = index
+
+    async def edit(self, *, content: Optional[str] = None, **kwargs):
+        await self.followup.api.request("PATCH /webhooks/{application_id}/{token}/messages/{message_id}")
+        self.followup.response.messages[self.index] = content or ""
+
+
+class FakeInteraction:
+    def __init__(self, api: FakeAPI, user: FakeMember, guild: Optional[FakeGuild], channel=None):
+        self.id = snowflake()
+        self.user = user
+        self.guild = guild
+        self.guild_id = guild.id if guild else None
+        self.channel = channel
+        self.response = FakeResponse(api)
+        self.followup = FakeFollowup(api, self.response)
+
+    @property
+    def messages(self) -> List[str]:
+        return self.response.messages
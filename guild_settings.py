@@ -0,0 +1,82 @@
+import json
+from typing import Any, Dict, Optional
+
+from db import data_version, get_guild_settings, put_guild_settings
+
+SETTING_FIELDS = ("name", "support_channel_id", "staff_role_id", "forum_channel_id", "ping_role_ids", "ticket_categories")
+
+
+def empty_settings(guild_id: int) -> Dict[str, Any]:
+    return {"guild_id": guild_id, "name": None, "support_channel_id": 0, "staff_role_id": 0, "forum_channel_id": 0,
+            "ping_role_ids": [], "ticket_categories": {}}
+
+
+def decode(row: Dict[str, Any]) -> Dict[str, Any]:
+    settings = empty_settings(row["guild_id"])
+    settings.update({k: row[k] for k in SETTING_FIELDS if k in row})
+    settings["ping_role_ids"] = [int(r) for r in json.loads(row.get("ping_role_ids") or "[]")]
+    settings["ticket_categories"] = {str(k): int(v) for k, v in json.loads(row.get("ticket_categories") or "{}").items()}
+    return settings
+
+
+class GuildSettingsCache:
+    # Per-guild configuration, read from SQLite the first time a guild is used and then served from memory,
+    # so startup costs nothing however many guilds the bot is in. `seed` holds settings from config.toml:
+    # the first time such a guild is used without a stored row, the seed is written as its row. Edits
+    # committed by other processes (the dashboard) drop the cache via PRAGMA data_version.
+    def __init__(self, db_path: str, seed: Optional[Dict[int, Dict[str, Any]]] = None):
+        self.db_path = db_path
+        self.seed = dict(seed or {})
+        self._cache: Dict[int, Dict[str, Any]] = {}
+        self._data_version: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    async def get(self, guild_id: int) -> Dict[str, Any]:
+        settings = self._cache.get(guild_id)
+        if settings is not None:
+            return settings
+        row = await get_guild_settings(self.db_path, guild_id)
+        if row is not None:
+            settings = decode(row)
+        elif guild_id in self.seed:
+            settings = await self.update(guild_id, **self.seed[guild_id])
+        else:
+            settings = empty_settings(guild_id)
+        self._cache[guild_id] = settings
+        return settings
+
+    async def update(self, guild_id: int, **changes: Any) -> Dict[str, Any]:
+        current = self._cache.get(guild_id)
+        if current is None:
+            row = await get_guild_settings(self.db_path, guild_id)
+            if row is not None:
+                current = decode(row)
+            else:
+                # No row yet: start from the config.toml seed so a partial update keeps it.
+                current = empty_settings(guild_id)
+                current.update((k, v) for k, v in self.seed.get(guild_id, {}).items() if k in SETTING_FIELDS)
+        settings = dict(current)
+        settings.update((k, v) for k, v in changes.items() if k in SETTING_FIELDS)
+        await put_guild_settings(
+            self.db_path, guild_id,
+            name=settings["name"],
+            support_channel_id=int(settings["support_channel_id"] or 0),
+            staff_role_id=int(settings["staff_role_id"] or 0),
+            forum_channel_id=int(settings["forum_channel_id"] or 0),
+            ping_role_ids=json.dumps([int(r) for r in settings["ping_role_ids"]]),
+            ticket_categories=json.dumps({str(k): int(v) for k, v in settings["ticket_categories"].items()}),
+        )
+        self._cache[guild_id] = settings
+        return settings
+
+    async def refresh_if_changed(self) -> bool:
+        version = await data_version(self.db_path)
+        if version == self._data_version:
+            return False
+        changed = self._data_version is not None
+        self._data_version = version
+        if changed:
+            self._cache.clear()
+        return changed
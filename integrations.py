@@ -1,25 +1,205 @@
-from typing import Optional, Dict, Any
+import asyncio
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Awaitable, Callable, Tuple
+
+import aiohttp
+
+from db import get_cached_enrichment, put_cached_enrichment
+from metrics import counter, histogram
+
+log = logging.getLogger("ticketbot.integrations")
+
+# Configured from [integrations] in config.toml via configure(). Without a URL a provider stays stubbed.
+SETTINGS: Dict[str, Any] = {
+    "db_path": None,
+    "kofi_url": "",
+    "steam_url": "",
+    "cftools_url": "",
+    "timeout_seconds": 1.5,
+    "cache_ttl_seconds": 6 * 3600,
+    "cache_size": 2048,
+    "max_connections": 20,
+}
+
+PROVIDER_MS = histogram("enrich_provider_ms", "Latency of upstream profile requests, by provider", ("provider",))
+LOOKUPS = counter("enrich_lookups_total", "Enrichment lookups by provider and outcome (hit, miss, timeout, error)", ("provider", "outcome"))
+
+_session: Optional[aiohttp.ClientSession] = None
+_inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+
+class TTLCache:
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Tuple[str, str], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def set(self, key: Tuple[str, str], value: Dict[str, Any], fetched_at: Optional[float] = None):
+        self._data[key] = ((fetched_at or time.time()) + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+
+_cache = TTLCache(SETTINGS["cache_size"], SETTINGS["cache_ttl_seconds"])
+
+
+def configure(**settings: Any):
+    global _cache
+    SETTINGS.update({k: v for k, v in settings.items() if v is not None})
+    _cache = TTLCache(int(SETTINGS["cache_size"]), float(SETTINGS["cache_ttl_seconds"]))
+
+
+async def get_session() -> aiohttp.ClientSession:
+    # One pooled session for all providers, so repeated lookups reuse keep-alive connections.
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=int(SETTINGS["max_connections"]), ttl_dns_cache=300))
+    return _session
+
+
+async def close():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+
+# ---------- Key normalization ----------
+
+STEAM_ID64_RE = re.compile(r"\b(7656119\d{10})\b")
+
+def normalize_steam_id(value: Optional[str]) -> str:
+    value = (value or "").strip()
+    match = STEAM_ID64_RE.search(value)
+    if match:
+        return match.group(1)
+    # Vanity URL (steamcommunity.com/id/<name>) or bare vanity name
+    return value.rstrip("/").rsplit("/", 1)[-1].lower()
+
+def normalize_kofi(value: Optional[str]) -> str:
+    value = (value or "").strip().rstrip("/")
+    return value.rsplit("/", 1)[-1].lstrip("@").lower()
+
+def normalize_cftools(value: Optional[str]) -> str:
+    value = (value or "").strip().rstrip("/")
+    return value.rsplit("/", 1)[-1].lower()
+
+
+# ---------- Providers ----------
+
+async def _http_json(base_url: str, key: str) -> Dict[str, Any]:
+    session = await get_session()
+    async with session.get(f"{base_url.rstrip('/')}/{key}") as resp:
+        resp.raise_for_status()
+        return await resp.json(content_type=None)
 
-# Placeholder enrichment functions. Replace internals with real API calls later.
 async def fetch_kofi_profile(handle_or_link: Optional[str]) -> Dict[str, Any]:
     if not handle_or_link:
         return {}
+    if SETTINGS["kofi_url"]:
+        return {"kofi": await _http_json(SETTINGS["kofi_url"], normalize_kofi(handle_or_link))}
     return {"kofi": {"handle": handle_or_link, "supporter": False, "notes": "Stubbed"}}
 
 async def fetch_steam_profile(steam_id: Optional[str]) -> Dict[str, Any]:
     if not steam_id:
         return {}
+    if SETTINGS["steam_url"]:
+        return {"steam": await _http_json(SETTINGS["steam_url"], normalize_steam_id(steam_id))}
     return {"steam": {"id": steam_id, "bans": 0, "hours": "N/A (stub)" }}
 
 async def fetch_cftools_profile(identifier: Optional[str]) -> Dict[str, Any]:
     if not identifier:
         return {}
+    if SETTINGS["cftools_url"]:
+        return {"cftools": await _http_json(SETTINGS["cftools_url"], normalize_cftools(identifier))}
     return {"cftools": {"id": identifier, "recent_connections": "N/A (stub)"}}
 
+PROVIDERS: Dict[str, Tuple[Callable[[Optional[str]], str], Callable[[Optional[str]], Awaitable[Dict[str, Any]]]]] = {
+    "kofi": (normalize_kofi, fetch_kofi_profile),
+    "steam": (normalize_steam_id, fetch_steam_profile),
+    "cftools": (normalize_cftools, fetch_cftools_profile),
+}
+
+
+# ---------- Cached lookups ----------
+
+async def _load(provider: str, key: str, raw: str) -> Dict[str, Any]:
+    db_path = SETTINGS["db_path"]
+    if db_path:
+        row = await get_cached_enrichment(db_path, provider, key, time.time() - float(SETTINGS["cache_ttl_seconds"]))
+        if row is not None:
+            payload = json.loads(row["payload"])
+            _cache.set((provider, key), payload, row["fetched_at"])
+            return payload
+    start = time.perf_counter()
+    try:
+        payload = await PROVIDERS[provider][1](raw)
+    finally:
+        PROVIDER_MS.labels(provider).observe((time.perf_counter() - start) * 1000)
+    fetched_at = time.time()
+    _cache.set((provider, key), payload, fetched_at)
+    if db_path:
+        await put_cached_enrichment(db_path, provider, key, json.dumps(payload), fetched_at)
+    return payload
+
+def _finished(key: Tuple[str, str], task: asyncio.Task):
+    _inflight.pop(key, None)
+    if not task.cancelled():
+        task.exception()  # callers still waiting already saw it; retrieving it keeps asyncio quiet
+
+async def lookup(provider: str, raw: Optional[str], timeout: Optional[float] = None) -> Dict[str, Any]:
+    if not raw:
+        return {}
+    key = PROVIDERS[provider][0](raw)
+    if not key:
+        return {}
+    cached = _cache.get((provider, key))
+    if cached is not None:
+        LOOKUPS.labels(provider, "hit").inc()
+        return cached
+    # Concurrent lookups for the same key share one request. The shared task is shielded so a caller
+    # timing out doesn't cancel it; it finishes in the background and warms the cache.
+    task = _inflight.get((provider, key))
+    if task is None:
+        task = asyncio.ensure_future(_load(provider, key, raw))
+        _inflight[(provider, key)] = task
+        task.add_done_callback(lambda t, k=(provider, key): _finished(k, t))
+    timeout = float(SETTINGS["timeout_seconds"]) if timeout is None else timeout
+    try:
+        result = await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        LOOKUPS.labels(provider, "timeout").inc()
+        log.warning("Enrichment %s timed out after %ss", provider, timeout)
+    except Exception as e:
+        LOOKUPS.labels(provider, "error").inc()
+        log.warning("Enrichment %s failed: %s", provider, e)
+    else:
+        LOOKUPS.labels(provider, "miss").inc()
+        return result
+    return {}
+
 async def enrich_context(ko_fi: Optional[str], steam_id: Optional[str], cftools_id: Optional[str]) -> Dict[str, Any]:
-    # Merge all lookups into a single dict
-    ctx = {}
-    ctx.update(await fetch_kofi_profile(ko_fi))
-    ctx.update(await fetch_steam_profile(steam_id))
-    ctx.update(await fetch_cftools_profile(cftools_id))
+    # All providers run concurrently; a slow or failing one is left out instead of holding up the rest.
+    results = await asyncio.gather(lookup("kofi", ko_fi), lookup("steam", steam_id), lookup("cftools", cftools_id))
+    ctx: Dict[str, Any] = {}
+    for result in results:
+        ctx.update(result)
     return ctx
@@ -0,0 +1,285 @@
+import asyncio
+import functools
+import json
+import logging
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from aiohttp import web
+
+# In-process metrics with no dependencies. Observing a value is a bisect plus a few integer adds on a
+# pre-resolved child, so it can sit on every db.py call; rendering (Prometheus text or a JSON snapshot)
+# only happens when someone scrapes or the log interval fires.
+
+LATENCY_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+F = TypeVar("F", bound=Callable[..., Awaitable[Any]])
+
+
+class _Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+
+class _Gauge:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+
+class _Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        # Buckets are "less than or equal", matching Prometheus' le label.
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        # Linear interpolation inside the bucket holding the q-th observation.
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.bounds[i - 1] if i > 0 else 0.0
+                upper = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.bounds[-1]
+
+
+class Family:
+    def __init__(self, kind: str, name: str, help: str, labelnames: Tuple[str, ...], factory: Callable[[], Any]):
+        self.kind = kind
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._factory = factory
+        self._children: Dict[Tuple[str, ...], Any] = {}
+
+    def labels(self, *values: Any):
+        child = self._children.get(values)
+        if child is not None:
+            return child
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            child = self._children[key] = self._factory()
+        return child
+
+    # Unlabelled families act as their only child.
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def children(self) -> List[Tuple[Tuple[str, ...], Any]]:
+        return sorted(self._children.items())
+
+
+REGISTRY: Dict[str, Family] = {}
+
+
+def _register(kind: str, name: str, help: str, labelnames: Tuple[str, ...], factory: Callable[[], Any]) -> Family:
+    family = REGISTRY.get(name)
+    if family is None:
+        family = REGISTRY[name] = Family(kind, name, help, labelnames, factory)
+    elif family.kind != kind or family.labelnames != labelnames:
+        raise ValueError(f"metric {name} already registered as {family.kind}{family.labelnames}")
+    return family
+
+
+def counter(name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Family:
+    return _register("counter", name, help, labelnames, _Counter)
+
+
+def gauge(name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Family:
+    return _register("gauge", name, help, labelnames, _Gauge)
+
+
+def histogram(name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS_MS) -> Family:
+    return _register("histogram", name, help, labelnames, lambda: _Histogram(buckets))
+
+
+def total(family: Family) -> float:
+    return sum(child.value for _, child in family.children())
+
+
+def timed(family: Family, *labels: str) -> Callable[[F], F]:
+    # Records the wall time (ms) of an async function. Without explicit labels the function name is used.
+    def decorator(func: F) -> F:
+        observe = family.labels(*(labels or (func.__name__,))).observe
+        clock = time.perf_counter
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                observe((clock() - start) * 1000)
+        return wrapper  # type: ignore[return-value]
+    return decorator
+
+
+# ---------- Exposition ----------
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for family in REGISTRY.values():
+        lines.append(f"# HELP {family.name} {family.help}")
+        lines.append(f"# TYPE {family.name} {family.kind}")
+        for values, child in family.children():
+            if family.kind == "histogram":
+                cumulative = 0
+                for bound, n in zip(child.bounds + (float("inf"),), child.counts):
+                    cumulative += n
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{_number(bound)}"'
+                    lines.append(f"{family.name}_bucket{_labels_text(family.labelnames, values, le)} {cumulative}")
+                lines.append(f"{family.name}_sum{_labels_text(family.labelnames, values)} {_number(child.sum)}")
+                lines.append(f"{family.name}_count{_labels_text(family.labelnames, values)} {child.count}")
+            else:
+                lines.append(f"{family.name}{_labels_text(family.labelnames, values)} {_number(child.value)}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for family in REGISTRY.values():
+        series = []
+        for values, child in family.children():
+            entry: Dict[str, Any] = {"labels": dict(zip(family.labelnames, values))}
+            if family.kind == "histogram":
+                entry.update(count=child.count, sum=round(child.sum, 3),
+                             p50=round(child.quantile(0.5), 3), p95=round(child.quantile(0.95), 3), p99=round(child.quantile(0.99), 3))
+            else:
+                entry["value"] = child.value
+            series.append(entry)
+        if series:
+            out[family.name] = series
+    return out
+
+
+async def serve(host: str, port: int, collect: Optional[Callable[[], Awaitable[None]]] = None) -> web.AppRunner:
+    # `collect` refreshes gauges that are read from elsewhere (e.g. outbox depth) right before each scrape.
+    async def handle_metrics(request: web.Request) -> web.Response:
+        if collect is not None:
+            try:
+                await collect()
+            except Exception as e:
+                print("Metrics collect failed:", e)
+        return web.Response(body=render().encode("utf-8"), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+class JsonLog:
+    # Appends one JSON object per line: periodic metric snapshots and individual events (traces).
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", buffering=1, encoding="utf-8")
+
+    def write(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record, default=str) + "\n")
+
+    def event(self, event: str, **fields: Any):
+        self.write({"ts": time.time(), "event": event, **fields})
+
+    def write_snapshot(self):
+        self.write({"ts": time.time(), "event": "metrics", "metrics": snapshot()})
+
+    def close(self):
+        self._file.close()
+
+
+# ---------- discord.py rate limits ----------
+
+DISCORD_RATE_LIMITED = counter("discord_rate_limited_total", "429 responses from the Discord API, by HTTP method and scope", ("method", "scope"))
+
+
+class RateLimitCounter(logging.Filter):
+    # discord.py retries 429s internally and only reports them through its logger, so count those records.
+    # A filter (rather than a handler) leaves the logger's output exactly as it was.
+    # A global 429 logs "We are being rate limited" and then "Global rate limit has been hit" in the same
+    # synchronous step, so route hits are held until that step ends and each 429 is counted once. The
+    # "erroring instead" variant (over max_ratelimit_timeout) is not retried; it surfaces as discord.RateLimited.
+    def __init__(self):
+        super().__init__()
+        self._pending: List[str] = []
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        message = record.msg if isinstance(record.msg, str) else ""
+        if message.startswith("We are being rate limited") and "Retrying in" in message:
+            self._pending.append(record.args[0] if record.args else "")
+            if len(self._pending) == 1:
+                try:
+                    loop = asyncio.get_running_loop()
+                except RuntimeError:
+                    self._flush()
+                else:
+                    loop.call_soon(self._flush)
+        elif message.startswith("Global rate limit has been hit"):
+            DISCORD_RATE_LIMITED.labels(self._pending.pop() if self._pending else "", "global").inc()
+        return True
+
+    def _flush(self):
+        for method in self._pending:
+            DISCORD_RATE_LIMITED.labels(method, "route").inc()
+        self._pending.clear()
+
+
+def watch_discord_rate_limits(logger_name: str = "discord.http"):
+    logger = logging.getLogger(logger_name)
+    if not any(isinstance(f, RateLimitCounter) for f in logger.filters):
+        logger.addFilter(RateLimitCounter())
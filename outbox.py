@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from db import claim_outbox, mark_outbox_delivered_many, record_outbox_failures, data_version, on_outbox_queued
+from metrics import counter, histogram
+
+log = logging.getLogger("ticketbot.outbox")
+
+# Resolves a Discord channel/thread ID to something with an async `send`, or None.
+Resolver = Callable[[int], Awaitable[Optional[Any]]]
+
+SEND_MS = histogram("outbox_send_ms", "Latency of a single outbox message send")
+SENT = counter("outbox_messages_total", "Outbox messages by result (delivered, retry, dead)", ("result",))
+SEND_ERRORS = counter("outbox_send_errors_total", "Outbox send/resolve failures by exception type", ("error",))
+
+
+def outbox_target(row: Dict[str, Any]) -> int:
+    return int(row.get("thread_id") or row.get("channel_id") or 0)
+
+
+# Outbox id -> futures of callers waiting to hear how its delivery went (the command bus).
+_waiters: Dict[int, List[asyncio.Future]] = {}
+
+
+async def wait_delivered(outbox_id: int, timeout: float) -> str:
+    # "delivered", "retry" (failed once, rescheduled), "dead", or "pending" if no attempt finished within timeout.
+    # Register right after queue_message returns, before awaiting anything else, so the first attempt can't be missed.
+    future = asyncio.get_running_loop().create_future()
+    _waiters.setdefault(outbox_id, []).append(future)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        return "pending"
+    finally:
+        waiting = _waiters.get(outbox_id)
+        if waiting is not None and future in waiting:
+            waiting.remove(future)
+            if not waiting:
+                del _waiters[outbox_id]
+
+
+def _settle(outbox_id: int, outcome: str):
+    for future in _waiters.pop(outbox_id, ()):
+        if not future.done():
+            future.set_result(outcome)
+
+
+class OutboxEngine:
+    def __init__(self, db_path: str, resolve: Resolver, *, batch_size: int = 200, concurrency: int = 16,
+                 lease_seconds: float = 30.0, watch_interval: float = 0.25, idle_interval: float = 5.0,
+                 max_attempts: int = 8, base_delay: float = 5.0, max_delay: float = 3600.0,
+                 is_permanent: Callable[[Exception], bool] = lambda e: False, shard: Optional[Tuple[int, int]] = None):
+        self.db_path = db_path
+        self.resolve = resolve
+        self.batch_size = batch_size
+        self.lease_seconds = lease_seconds
+        self.watch_interval = watch_interval
+        self.idle_interval = idle_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.is_permanent = is_permanent
+        # (shard_id, shard_count): only this shard's guilds are claimed, so each gateway shard drains its own queue.
+        self.shard = shard
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self._sem = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._data_version: Optional[int] = None
+        on_outbox_queued(self.notify)
+
+    def notify(self):
+        self._wakeup.set()
+
+    def backoff(self, attempts: int) -> float:
+        # Exponential backoff with equal jitter: half the delay is fixed, half is random.
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def run_cycle(self) -> int:
+        rows = await claim_outbox(self.db_path, self.owner, self.batch_size, self.lease_seconds, self.shard)
+        if not rows:
+            return 0
+        # Messages for one channel go out in order; different channels are sent concurrently.
+        groups: Dict[int, List[Dict[str, Any]]] = OrderedDict()
+        for row in rows:
+            groups.setdefault(outbox_target(row), []).append(row)
+        results = await asyncio.gather(*(self._deliver_group(target, group) for target, group in groups.items()))
+
+        delivered: List[int] = []
+        failures: List[tuple] = []
+        for ok, failed in results:
+            delivered.extend(ok)
+            failures.extend(failed)
+        await mark_outbox_delivered_many(self.db_path, delivered)
+        await record_outbox_failures(self.db_path, failures)
+        SENT.labels("delivered").inc(len(delivered))
+        for failure in failures:
+            SENT.labels("retry" if failure[2] is not None else "dead").inc()
+        if _waiters:
+            for outbox_id in delivered:
+                _settle(outbox_id, "delivered")
+            for outbox_id, _, retry_at, _ in failures:
+                _settle(outbox_id, "retry" if retry_at is not None else "dead")
+        return len(rows)
+
+    async def _deliver_group(self, target_id: int, rows: List[Dict[str, Any]]):
+        delivered: List[int] = []
+        async with self._sem:
+            try:
+                channel = await self.resolve(target_id) if target_id else None
+                if channel is None:
+                    raise LookupError(f"Unknown channel {target_id}")
+            except Exception as e:
+                SEND_ERRORS.labels(type(e).__name__).inc()
+                return delivered, self._failures(rows, e)
+            for i, row in enumerate(rows):
+                start = time.perf_counter()
+                try:
+                    await channel.send(row["message"])
+                except Exception as e:
+                    SEND_ERRORS.labels(type(e).__name__).inc()
+                    log.warning("Failed to deliver outbox message %s: %s", row["id"], e)
+                    return delivered, self._failures(rows[i:], e)
+                SEND_MS.observe((time.perf_counter() - start) * 1000)
+                delivered.append(row["id"])
+        return delivered, []
+
+    def _failures(self, rows: List[Dict[str, Any]], error: Exception) -> List[tuple]:
+        # The head row is charged an attempt. A permanent error dead-letters the whole group, since every
+        # row targets the same channel; otherwise the rest wait behind the head so per-channel order holds.
+        message = f"{type(error).__name__}: {error}"[:500]
+        head = rows[0]
+        attempts = int(head.get("attempts") or 0) + 1
+        if self.is_permanent(error):
+            return [(r["id"], int(r.get("attempts") or 0) + 1, None, message) for r in rows]
+        if attempts >= self.max_attempts:
+            retry_at = time.time()
+            failures = [(head["id"], attempts, None, message)]
+        else:
+            retry_at = time.time() + self.backoff(attempts)
+            failures = [(head["id"], attempts, retry_at, message)]
+        return failures + [(r["id"], int(r.get("attempts") or 0), retry_at, r.get("last_error")) for r in rows[1:]]
+
+    async def wait_for_work(self):
+        # Woken immediately by in-process queue_message; writes from other processes (the dashboard)
+        # are noticed through PRAGMA data_version, with a periodic full check to pick up expired leases.
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.idle_interval
+        while loop.time() < deadline:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.watch_interval)
+                break
+            except asyncio.TimeoutError:
+                version = await data_version(self.db_path)
+                changed = self._data_version is not None and version != self._data_version
+                self._data_version = version
+                if changed:
+                    break
+        self._wakeup.clear()
+
+    async def step(self):
+        claimed = await self.run_cycle()
+        if claimed < self.batch_size:
+            await self.wait_for_work()
+
+    async def run_forever(self):
+        while True:
+            await self.step()
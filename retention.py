@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+import tomllib
+from typing import Any, Dict, Optional
+
+from analytics import apply_event_batch
+from db import (OUTBOX_DEAD, OUTBOX_DELIVERED, archive_outbox, archive_tickets, attach_archive, close_db, detach_archive, ensure_archive_schema,
+                ensure_schema, get_kv, incremental_vacuum, set_kv, storage_stats, vacuum_full, wal_checkpoint)
+from metrics import counter, gauge
+
+LAST_RUN_KEY = "retention_last_run"
+REPORT_KEY = "retention_report"
+
+ARCHIVED = counter("retention_rows_archived_total", "Rows moved to the archive database, by policy", ("policy",))
+RECLAIMED = counter("retention_bytes_reclaimed_total", "Bytes returned to the filesystem by incremental vacuum")
+FILE_BYTES = gauge("db_file_bytes", "Size of the database files, by file (main, wal, archive)", ("file",))
+
+# tickets: closed or failed tickets, with their transcript index; outbox: delivered messages; dead_letters: messages
+# that could not be delivered. Each has a maximum age in days ([retention] <policy>_days); 0 keeps the rows forever.
+POLICIES = ("tickets", "outbox", "dead_letters")
+
+
+def file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def utc_cutoff(days: float, now: float) -> str:
+    # Same format as CURRENT_TIMESTAMP, so it compares correctly with created_at / updated_at.
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(now - days * 86400))
+
+
+class Retention:
+    # Keeps the live tables small. Once per interval: moves closed tickets (with their transcript index), delivered
+    # outbox rows and, optionally, dead letters older than their policy's age into a separate archive database, in
+    # batches of batch_size with a pause between them so the bot's writes interleave. Then it returns free pages
+    # to the filesystem with incremental vacuum (a few thousand pages per step) and checkpoints the WAL. Each run's
+    # space report is kept in kv for the dashboard and `python retention.py report`.
+    def __init__(self, db_path: str, archive_path: str, *, days: Optional[Dict[str, float]] = None, batch_size: int = 500,
+                 pause: float = 0.05, interval: float = 86400.0, vacuum_pages: int = 2000, checkpoint: str = "TRUNCATE"):
+        self.db_path = db_path
+        self.archive_path = archive_path
+        self.days = {"tickets": 90.0, "outbox": 30.0, "dead_letters": 0.0, **(days or {})}
+        self.batch_size = batch_size
+        self.pause = pause
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+        self.checkpoint = checkpoint
+
+    async def _archive(self, policy: str, cutoff: str) -> int:
+        if policy == "tickets":
+            return await archive_tickets(self.db_path, cutoff, self.batch_size)
+        delivered = OUTBOX_DELIVERED if policy == "outbox" else OUTBOX_DEAD
+        return await archive_outbox(self.db_path, delivered, cutoff, self.batch_size)
+
+    async def run(self, now: Optional[float] = None) -> Dict[str, Any]:
+        now = time.time() if now is None else now
+        started = time.perf_counter()
+        before = await storage_stats(self.db_path)
+        sizes_before = self.sizes()
+        moved = {policy: 0 for policy in POLICIES}
+        active = [p for p in POLICIES if self.days.get(p, 0) > 0]
+        if "tickets" in active:
+            # Archiving a ticket deletes its events, so fold any the rollup loop hasn't reached yet, in the same
+            # paced batches as the archiving.
+            while await apply_event_batch(self.db_path, self.batch_size) == self.batch_size:
+                await asyncio.sleep(self.pause)
+        if active:
+            await ensure_archive_schema(self.archive_path)
+            await attach_archive(self.db_path, self.archive_path)
+            try:
+                for policy in active:
+                    cutoff = utc_cutoff(self.days[policy], now)
+                    while True:
+                        n = await self._archive(policy, cutoff)
+                        moved[policy] += n
+                        ARCHIVED.labels(policy).inc(n)
+                        if n < self.batch_size:
+                            break
+                        await asyncio.sleep(self.pause)
+            finally:
+                await detach_archive(self.db_path)
+
+        freed_pages = 0
+        if before["auto_vacuum"] == 2:
+            # A short step means the freelist is empty; the bot's own writes keep freeing a few pages, which are left for next time.
+            while True:
+                n = await incremental_vacuum(self.db_path, self.vacuum_pages)
+                freed_pages += n
+                if n < self.vacuum_pages:
+                    break
+                await asyncio.sleep(self.pause)
+        RECLAIMED.inc(freed_pages * before["page_size"])
+        checkpoint = await wal_checkpoint(self.db_path, self.checkpoint) if self.checkpoint else None
+        after = await storage_stats(self.db_path)
+        sizes = self.sizes()
+        for name, size in sizes.items():
+            FILE_BYTES.labels(name).set(size)
+        report = {
+            "at": now,
+            "seconds": round(time.perf_counter() - started, 3),
+            "archived": moved,
+            "freed_bytes": freed_pages * before["page_size"],
+            "free_bytes": after["freelist_count"] * after["page_size"],
+            "bytes_before": sizes_before,
+            "bytes_after": sizes,
+            "checkpoint": checkpoint,
+            "incremental_vacuum": before["auto_vacuum"] == 2,
+        }
+        await set_kv(self.db_path, REPORT_KEY, json.dumps(report))
+        await set_kv(self.db_path, LAST_RUN_KEY, str(now))
+        return report
+
+    def sizes(self) -> Dict[str, int]:
+        return {"main": file_size(self.db_path), "wal": file_size(self.db_path + "-wal"), "archive": file_size(self.archive_path)}
+
+    async def run_if_due(self) -> Optional[Dict[str, Any]]:
+        # The last run time is stored, so restarts don't trigger extra runs.
+        last = float(await get_kv(self.db_path, LAST_RUN_KEY) or 0)
+        if time.time() - last < self.interval:
+            return None
+        return await self.run()
+
+
+async def last_report(db_path: str) -> Optional[Dict[str, Any]]:
+    value = await get_kv(db_path, REPORT_KEY)
+    return json.loads(value) if value else None
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    mb = lambda n: f"{n / 1e6:.1f} MB"
+    archived = ", ".join(f"{n} {policy}" for policy, n in report["archived"].items())
+    before, after = report["bytes_before"], report["bytes_after"]
+    lines = [
+        f"Retention run at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(report['at']))} took {report['seconds']} s",
+        f"  archived: {archived}",
+        f"  main: {mb(before['main'])} -> {mb(after['main'])} (freed {mb(report['freed_bytes'])}, {mb(report['free_bytes'])} still free inside the file)",
+        f"  wal: {mb(before['wal'])} -> {mb(after['wal'])}; archive: {mb(before['archive'])} -> {mb(after['archive'])}",
+    ]
+    if not report["incremental_vacuum"]:
+        lines.append("  auto_vacuum is off for this database, so deleted pages are reused but never returned; run `python retention.py vacuum` once.")
+    return "\n".join(lines)
+
+
+def archive_path_from_config(cfg: Dict[str, Any], db_path: str) -> str:
+    return str(cfg.get("retention", {}).get("archive_path", os.path.splitext(db_path)[0] + "-archive.db"))
+
+
+def retention_from_config(cfg: Dict[str, Any], db_path: str) -> Retention:
+    section = dict(cfg.get("retention", {}))
+    return Retention(
+        db_path,
+        archive_path_from_config(cfg, db_path),
+        days={policy: float(section.get(f"{policy}_days", default)) for policy, default in (("tickets", 90), ("outbox", 30), ("dead_letters", 0))},
+        batch_size=int(section.get("batch_size", 500)),
+        pause=float(section.get("pause_seconds", 0.05)),
+        interval=float(section.get("interval_hours", 24)) * 3600,
+        vacuum_pages=int(section.get("vacuum_pages", 2000)),
+        checkpoint=str(section.get("checkpoint", "TRUNCATE")),
+    )
+
+
+async def _main(args: argparse.Namespace):
+    config_path = "config.toml" if os.path.exists("config.toml") else "config.example.toml"
+    with open(config_path, "rb") as f:
+        cfg = tomllib.load(f)
+    db_path = args.db or cfg["app"]["db_path"]
+    await ensure_schema(db_path)
+    try:
+        if args.command == "run":
+            print(format_report(await retention_from_config(cfg, db_path).run()))
+        elif args.command == "vacuum":
+            start = time.perf_counter()
+            await vacuum_full(db_path)
+            print(f"Rewrote {db_path} with auto_vacuum=INCREMENTAL in {time.perf_counter() - start:.1f} s; now {file_size(db_path) / 1e6:.1f} MB.")
+        else:
+            report = await last_report(db_path)
+            print(format_report(report) if report else "No retention run yet.")
+    finally:
+        await close_db()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ticket data retention: archive old rows, reclaim space")
+    parser.add_argument("command", choices=["run", "report", "vacuum"],
+                        help="run: archive and compact now; report: show the last run; vacuum: one-off full VACUUM that enables incremental vacuum")
+    parser.add_argument("--db", help="SQLite file (defaults to [app] db_path)")
+    asyncio.run(_main(parser.parse_args()))
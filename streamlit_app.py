@@ -1,87 +1,377 @@
 import os
+import re
+import json
 import sqlite3
+import datetime
+import threading
+import time
 import pandas as pd
 import streamlit as st
 import tomllib
 
+from transcripts import read_page, transcript_path
+from command_bus import send_commands
+from analytics import summarize
+from retention import archive_path_from_config, format_report, REPORT_KEY
+from db import ENQUEUE_TRANSCRIPT_SQL, CREATE_BULK_JOB_SQL, FINALIZE_BULK_JOB_SQL, CANCEL_BULK_JOB_SQL, BULK_JOBS_SQL, bulk_target_query, bulk_items_query, CATEGORIES_SQL, GUILDS_SQL, ticket_page_query, SEARCH_TICKETS_SQL, SEARCH_MESSAGES_SQL, ARCHIVE_SEARCH_TICKETS_SQL, ARCHIVE_SEARCH_MESSAGES_SQL, SEARCH_CANDIDATES, HIGHLIGHT_START, HIGHLIGHT_END, fts_query, merge_search_results, with_snippets
+
 CONFIG_PATH = "config.toml" if os.path.exists("config.toml") else "config.example.toml"
 with open(CONFIG_PATH, "rb") as f:
     cfg = tomllib.load(f)
 DB_PATH = cfg["app"]["db_path"]
+TRANSCRIPT_DIR = cfg.get("transcripts", {}).get("dir", "transcripts")
+ARCHIVE_PATH = archive_path_from_config(cfg, DB_PATH)
+BUS_CFG = cfg.get("command_bus", {})
+BUS_URL = f"http://{BUS_CFG.get('host', '127.0.0.1')}:{int(BUS_CFG['port'])}/commands" if BUS_CFG.get("port") else None
 
 st.set_page_config(page_title="Discord Ticket Dashboard", layout="wide")
 st.title("🎫 Discord Ticket Dashboard")
 
+PAGE_SIZE = 50
+TICKET_COLUMNS = "id, created_at, status, category, username, substr(reason, 1, 120) AS reason, steam_id, ko_fi, cftools_id, claimed_by, thread_id, channel_id"
+
+@st.cache_resource
+def get_connection() -> tuple[sqlite3.Connection, threading.Lock]:
+    # One connection per dashboard process, shared by all sessions; the lock serializes script threads.
+    con = sqlite3.connect(DB_PATH, check_same_thread=False)
+    con.execute("PRAGMA busy_timeout=5000")
+    return con, threading.Lock()
+
+def data_version() -> int:
+    # Moves whenever another connection (the bot) commits; cached queries are keyed on it.
+    con, lock = get_connection()
+    with lock:
+        return con.execute("PRAGMA data_version").fetchone()[0]
+
 def read_df(query: str, params=()):
-    con = sqlite3.connect(DB_PATH)
-    try:
-        df = pd.read_sql_query(query, con, params=params)
-    finally:
-        con.close()
-    return df
-
-def list_tickets(status: str | None = None) -> pd.DataFrame:
-    if status:
-        return read_df("SELECT id, created_at, status, category, username, reason, steam_id, ko_fi, cftools_id, thread_id, channel_id FROM tickets WHERE status = ? ORDER BY created_at DESC", (status,))
-    else:
-        return read_df("SELECT id, created_at, status, category, username, reason, steam_id, ko_fi, cftools_id, thread_id, channel_id FROM tickets ORDER BY created_at DESC")
+    con, lock = get_connection()
+    with lock:
+        return pd.read_sql_query(query, con, params=params)
 
-def queue_message(thread_id: int, message: str, created_by: str="dashboard"):
-    con = sqlite3.connect(DB_PATH)
-    try:
-        cur = con.cursor()
-        cur.execute(
-            "INSERT INTO outbox (thread_id, message, created_by, delivered) VALUES (?, ?, ?, 0)",
-            (thread_id, message, created_by)
+def read_rows(query: str, params=()) -> list[dict]:
+    con, lock = get_connection()
+    with lock:
+        cur = con.execute(query, params)
+        names = [d[0] for d in cur.description]
+        return [dict(zip(names, row)) for row in cur.fetchall()]
+
+def archive_attached() -> bool:
+    # The retention archive is attached to the shared connection the first time archived data is asked for.
+    if not os.path.exists(ARCHIVE_PATH):
+        return False
+    con, lock = get_connection()
+    with lock:
+        if not any(row[1] == "archive" for row in con.execute("PRAGMA database_list")):
+            con.execute("ATTACH DATABASE ? AS archive", (ARCHIVE_PATH,))
+    return True
+
+def execute_write(query: str, params_seq: list[tuple]):
+    execute_writes([(query, params_seq)])
+
+def execute_writes(statements: list[tuple[str, list[tuple]]]):
+    # All statements commit together.
+    con, lock = get_connection()
+    with lock:
+        try:
+            for query, params_seq in statements:
+                con.executemany(query, params_seq)
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+    # Our own commits don't move data_version on this connection.
+    st.cache_data.clear()
+
+def send_to_bot(commands: list[dict]) -> list[dict] | None:
+    # Through the bot's command bus when it is running; None means write SQLite instead.
+    if BUS_URL is None:
+        return None
+    results = send_commands(BUS_URL, commands, str(BUS_CFG.get("token", "") or ""))
+    if results is not None:
+        st.cache_data.clear()
+    return results
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def list_tickets_page(version: int, guild_id: int, status: str | None, category: str | None, created_from: str | None, created_to: str | None,
+                      claimed_by: int | None, cursor: tuple[str, int] | None, page_size: int = PAGE_SIZE) -> pd.DataFrame:
+    query, params = ticket_page_query(TICKET_COLUMNS, guild_id, status, category, created_from, created_to, claimed_by, cursor, page_size)
+    return read_df(query, params)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def list_guilds(version: int) -> dict[int, str | None]:
+    return {row["guild_id"]: row["name"] for row in read_rows(GUILDS_SQL)}
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def list_categories(version: int, guild_id: int) -> list[str]:
+    return [row["category"] for row in read_rows(CATEGORIES_SQL, {"guild_id": guild_id})]
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def search(version: int, guild_id: int, text: str, page: int, page_size: int = 20, include_archive: bool = False) -> list[dict]:
+    query = fts_query(text)
+    if not query:
+        return []
+    offset = page * page_size
+    params = {"q": query, "candidates": SEARCH_CANDIDATES, "limit": offset + page_size, "guild_id": guild_id}
+    tickets = read_rows(SEARCH_TICKETS_SQL, params)
+    messages = read_rows(SEARCH_MESSAGES_SQL, params)
+    if include_archive and archive_attached():
+        # A row caught mid-move by a crash can be in both files until the next retention run; the live copy wins.
+        for rows, sql in ((tickets, ARCHIVE_SEARCH_TICKETS_SQL), (messages, ARCHIVE_SEARCH_MESSAGES_SQL)):
+            live = {r["id"] for r in rows}
+            rows.extend(dict(r, archived=True) for r in read_rows(sql, params) if r["id"] not in live)
+    return with_snippets(merge_search_results(tickets, messages, page_size, offset), text)
+
+def escape_markdown(text: str) -> str:
+    return re.sub(r"([\\`*_{}\[\]()#+\-.!|~>])", r"\\\1", text)
+
+def render_snippet(snippet: str) -> str:
+    return escape_markdown(snippet).replace(HIGHLIGHT_START, "**").replace(HIGHLIGHT_END, "**")
+
+def queue_messages(guild_id: int, thread_ids: list[int], message: str, created_by: str="dashboard") -> list[dict] | None:
+    # Returns the bot's per-thread results, or None when it was down and the messages wait in the outbox.
+    results = send_to_bot([{"op": "queue_message", "guild_id": guild_id, "channel_id": t, "message": message, "created_by": created_by}
+                           for t in thread_ids])
+    if results is None:
+        execute_write(
+            "INSERT INTO outbox (thread_id, message, created_by, delivered, guild_id) VALUES (?, ?, ?, 0, ?)",
+            [(t, message, created_by, guild_id) for t in thread_ids]
         )
-        con.commit()
-    finally:
-        con.close()
+    return results
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def list_dead_letters(version: int, guild_id: int, limit: int = 200) -> pd.DataFrame:
+    return read_df("SELECT id, created_at, thread_id, created_by, attempts, last_error, message FROM outbox WHERE guild_id = ? AND delivered = 2 ORDER BY id DESC LIMIT ?",
+                   (guild_id, limit))
+
+def requeue_dead_letters(outbox_ids: list[int]):
+    execute_write(
+        "UPDATE outbox SET delivered = 0, attempts = 0, next_attempt_at = NULL, lease_owner = NULL, lease_until = NULL WHERE id = ? AND delivered = 2",
+        [(i,) for i in outbox_ids]
+    )
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def get_transcript(version: int, guild_id: int, ticket_id: int) -> tuple[dict | None, list[dict]]:
+    # Live tables first, then the retention archive.
+    for schema in ("main", "archive"):
+        if schema == "archive" and not archive_attached():
+            break
+        jobs = read_rows(f"SELECT j.* FROM {schema}.transcript_jobs j JOIN {schema}.tickets t ON t.id = j.ticket_id WHERE j.ticket_id = ? AND t.guild_id = ?",
+                         (ticket_id, guild_id))
+        if jobs:
+            pages = read_rows(f"SELECT page, byte_offset, byte_length, message_count FROM {schema}.transcript_pages WHERE ticket_id = ? ORDER BY page", (ticket_id,))
+            return jobs[0], pages
+    return None, []
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_retention_report(version: int) -> dict | None:
+    rows = read_rows("SELECT value FROM kv WHERE key = ?", (REPORT_KEY,))
+    return json.loads(rows[0]["value"]) if rows else None
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def load_transcript_page(path: str, byte_offset: int, byte_length: int) -> list[dict]:
+    # Archived pages never change, so (path, offset, length) is a complete cache key; only this page is read.
+    return read_page(TRANSCRIPT_DIR, path, byte_offset, byte_length)
+
+# Rollups only: each window reads at most (buckets x categories x staff) rows, however long the history is.
+ANALYTICS_WINDOWS = {"Last 48 hours": ("hour", 3600, 48), "Last 30 days": ("day", 86400, 30), "Last 90 days": ("day", 86400, 90)}
 
-def set_ticket_status(thread_id: int, status: str):
-    con = sqlite3.connect(DB_PATH)
+@st.cache_data(max_entries=32, show_spinner=False)
+def load_rollups(version: int, guild_id: int, granularity: str, since: int) -> list[dict]:
+    return read_rows("SELECT * FROM ticket_rollups WHERE guild_id = ? AND granularity = ? AND bucket_start >= ?", (guild_id, granularity, since))
+
+def render_analytics(version: int, guild_id: int):
+    st.subheader("Analytics")
+    window = st.selectbox("Window", options=list(ANALYTICS_WINDOWS), index=1)
+    granularity, width, buckets = ANALYTICS_WINDOWS[window]
+    since = (int(time.time()) // width - buckets + 1) * width
+    rows = load_rollups(version, guild_id, granularity, since)
+    if not rows:
+        st.info("No ticket activity in this window yet. Run `python analytics.py backfill` once to include tickets from before the event log.")
+        return
+    categories = sorted({r["category"] for r in rows})
+    chosen = st.multiselect("Categories", options=categories, default=categories)
+    overall = [r for r in rows if r["staff_id"] == 0 and r["category"] in chosen]
+    by_staff = [r for r in rows if r["staff_id"] != 0 and r["category"] in chosen]
+    if not overall:
+        st.info("No activity for the selected categories.")
+        return
+    volume = pd.DataFrame(overall).pivot_table(index="bucket_start", columns="category", values="opened", aggfunc="sum", fill_value=0)
+    volume.index = pd.to_datetime(volume.index, unit="s")
+    st.markdown(f"**Tickets opened per {granularity}**")
+    st.bar_chart(volume)
+    st.markdown("**By category**")
+    st.dataframe(pd.DataFrame(summarize(overall, "category")), width="stretch")
+    if by_staff:
+        st.markdown("**By staff member**")
+        st.dataframe(pd.DataFrame(summarize(by_staff, "staff_id")).drop(columns=["opened", "failed"]), width="stretch")
+    st.caption("Times are minutes from the ticket being opened. Percentiles come from mergeable sketches and are accurate to about 1%.")
+
+STATUS_NOTICES = {
+    "open": "This ticket was reopened by staff.",
+    "claimed": "Staff have claimed this ticket.",
+    "closed": "This ticket was closed by staff. If you need anything else, open a new one with `/ticket_panel`.",
+}
+
+def set_ticket_status(guild_id: int, thread_ids: list[int], status: str) -> list[dict] | None:
+    results = send_to_bot([{"op": "set_status", "guild_id": guild_id, "channel_id": t, "status": status} for t in thread_ids])
+    if results is not None:
+        return results
+    # Bot down: the status change, the notice the bot would have posted and (on close) the transcript job are
+    # written together, so the ticket's channel hears about it once the bot is back.
+    # The unary + keeps SQLite on the thread/channel indexes instead of walking the guild's index.
+    tickets = [row for t in thread_ids for row in read_rows(
+        "SELECT id, status, thread_id, channel_id FROM tickets WHERE (thread_id = ? OR channel_id = ?) AND +guild_id = ?", (t, t, guild_id))]
+    changed = [t for t in tickets if t["status"] != status]
+    statements = [
+        ("UPDATE tickets SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", [(status, t["id"]) for t in changed]),
+        ("INSERT INTO outbox (thread_id, message, created_by, delivered, guild_id) VALUES (?, ?, 'dashboard', 0, ?)",
+         [(t["thread_id"] or t["channel_id"], STATUS_NOTICES[status], guild_id) for t in changed]),
+    ]
+    if status == "closed":
+        statements.append((ENQUEUE_TRANSCRIPT_SQL, [(t["id"], t["thread_id"] or t["channel_id"], transcript_path(t["id"])) for t in changed]))
+    execute_writes(statements)
+    return None
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def count_bulk_targets(version: int, guild_id: int, status: str | None, category: str | None, created_from: str | None, created_to: str | None,
+                       claimed_by: int | None) -> int:
+    query, params = bulk_target_query("COUNT(*)", guild_id, status, category, created_from, created_to, claimed_by)
+    return read_rows(query, params)[0]["COUNT(*)"]
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def list_bulk_jobs(version: int, guild_id: int, limit: int = 10) -> list[dict]:
+    return read_rows(BULK_JOBS_SQL, (guild_id, limit))
+
+def create_bulk_job(filters: tuple, action: str, params: dict, created_by: str) -> tuple[int, int]:
+    # The job and its snapshot of matching tickets commit together; the bot runs it (now, through the bus, or
+    # within a few seconds when it polls), so closing the dashboard doesn't stop it.
+    guild_id, status, category, created_from, created_to, claimed_by = filters
+    con, lock = get_connection()
+    with lock:
+        try:
+            job_id = con.execute(CREATE_BULK_JOB_SQL, (guild_id, action, json.dumps(params), created_by)).fetchone()[0]
+            con.execute(*bulk_items_query(job_id, guild_id, status=status, category=category, created_from=created_from, created_to=created_to,
+                                          claimed_by=claimed_by))
+            total = con.execute(FINALIZE_BULK_JOB_SQL, {"id": job_id}).fetchone()[0]
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+    st.cache_data.clear()
     try:
-        cur = con.cursor()
-        cur.execute(
-            "UPDATE tickets SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE thread_id = ?",
-            (status, thread_id)
-        )
-        con.commit()
-    finally:
-        con.close()
+        send_to_bot([{"op": "bulk_start", "job_id": job_id}])
+    except Exception:
+        pass
+    return job_id, total
+
+version = data_version()
+
+guilds = list_guilds(version)
+if not guilds:
+    st.info("No servers yet. Run `/ticket_setup` in a server, or open a ticket, and it will show up here.")
+    st.stop()
+guild_id = st.sidebar.selectbox("Server", options=list(guilds), format_func=lambda g: f"{guilds[g]} ({g})" if guilds[g] else str(g))
+
+view = st.sidebar.radio("View", options=["Tickets", "Analytics"], horizontal=True)
+if view == "Analytics":
+    render_analytics(version, guild_id)
+    st.stop()
 
 # Sidebar filters
 st.sidebar.header("Filters")
-status_filter = st.sidebar.selectbox("Status", options=["all", "open", "claimed", "closed"], index=0)
+status_filter = st.sidebar.selectbox("Status", options=["all", "open", "claimed", "closed", "pending", "failed"], index=0)
+category_filter = st.sidebar.selectbox("Category", options=["all"] + list_categories(version, guild_id), index=0)
+date_range = st.sidebar.date_input("Created between", value=())
+claimed_filter = st.sidebar.text_input("Claimed by (user ID)", value="")
 
-category_filter = st.sidebar.text_input("Category contains", value="")
+created_from = created_to = None
+if len(date_range) == 2:
+    created_from = date_range[0].isoformat()
+    created_to = (date_range[1] + datetime.timedelta(days=1)).isoformat()
+filters = (
+    guild_id,
+    None if status_filter == "all" else status_filter,
+    None if category_filter == "all" else category_filter,
+    created_from,
+    created_to,
+    int(claimed_filter) if claimed_filter.strip().isdigit() else None,
+)
 
-if status_filter == "all":
-    df = list_tickets(None)
-else:
-    df = list_tickets(status_filter)
+# Cursor stack for keyset paging; any filter change starts again at page 1.
+if st.session_state.get("ticket_filters") != filters:
+    st.session_state["ticket_filters"] = filters
+    st.session_state["page_cursors"] = [None]
+cursors = st.session_state["page_cursors"]
+
+st.subheader("Search")
+search_text = st.text_input("Search ticket reasons, users, Steam IDs, categories and sent messages", value="")
+include_archive = st.checkbox("Include archived tickets and messages", value=False)
+if search_text.strip():
+    if st.session_state.get("search_text") != (search_text, include_archive):
+        st.session_state["search_text"] = (search_text, include_archive)
+        st.session_state["search_page"] = 0
+    search_page = st.session_state["search_page"]
+    results = search(version, guild_id, search_text, search_page, include_archive=include_archive)
+    if not results:
+        st.info("No matches." if search_page == 0 else "No more matches.")
+    for hit in results:
+        if hit["kind"] == "ticket":
+            st.markdown(f"**Ticket #{hit['id']}**{' · archived' if hit.get('archived') else ''} · {hit['status']} · {hit['category'] or '—'} · {hit['username']} · {hit['created_at']} · thread/channel `{hit['thread_id'] or hit['channel_id']}`  \n{render_snippet(hit['snippet'])}")
+        else:
+            st.markdown(f"**Message #{hit['id']}**{' · archived' if hit.get('archived') else ''} · by {hit['username']} · {hit['created_at']} · thread `{hit['thread_id']}`  \n{render_snippet(hit['snippet'])}")
+    s_prev, s_page, s_next = st.columns([1, 2, 1])
+    if s_prev.button("← Better matches", disabled=search_page == 0):
+        st.session_state["search_page"] -= 1
+        st.rerun()
+    s_page.caption(f"Results page {search_page + 1}")
+    if s_next.button("More matches →", disabled=len(results) < 20):
+        st.session_state["search_page"] += 1
+        st.rerun()
 
 st.subheader("Tickets")
-if category_filter:
-    df = df[df['category'].fillna('').str.contains(category_filter, case=False)]
+df = list_tickets_page(version, *filters, cursors[-1])
 if df.empty:
-    st.info("No tickets yet.")
+    st.info("No tickets match these filters." if len(cursors) == 1 else "No more tickets.")
 else:
-    st.dataframe(df, use_container_width=True)
+    st.dataframe(df, width="stretch")
+
+prev_col, page_col, next_col = st.columns([1, 2, 1])
+if prev_col.button("← Newer", disabled=len(cursors) == 1):
+    cursors.pop()
+    st.rerun()
+page_col.caption(f"Page {len(cursors)}")
+if next_col.button("Older →", disabled=len(df) < PAGE_SIZE):
+    last = df.iloc[-1]
+    cursors.append((last["created_at"], int(last["id"])))
+    st.rerun()
 
 st.subheader("Manage a Ticket")
 col1, col2 = st.columns(2)
 
+def report(results: list[dict] | None, thread_ids: list[int], done: str, offline: str):
+    if results is None:
+        st.info(offline)
+        return
+    for t, r in zip(thread_ids, results):
+        if not r.get("ok"):
+            st.error(f"{t}: {r.get('error')}")
+        elif r.get("delivery", "delivered") != "delivered":
+            st.warning(f"{t}: not delivered yet ({r['delivery']}); the bot will keep retrying.")
+    ok = sum(1 for r in results if r.get("ok") and r.get("delivery", "delivered") == "delivered")
+    if ok:
+        st.success(done.format(n=ok))
+
 with col1:
-    thread_id = st.text_input("Thread ID", placeholder="Enter the Discord thread ID from the table")
+    thread_id = st.text_input("Thread ID(s)", placeholder="Discord thread or channel IDs from the table, separated by commas")
     canned = st.text_area("Message to send (bot will post in the thread)", height=120, placeholder="Type a reply for the user...")
     who = st.text_input("From (label)", value="dashboard")
     send_btn = st.button("Queue Message")
+    thread_ids = [int(t) for t in re.split(r"[\s,]+", thread_id.strip()) if t.isdigit()]
     if send_btn:
-        if thread_id and canned:
+        if thread_ids and canned:
             try:
-                queue_message(int(thread_id), canned, who)
-                st.success("Queued! The bot will deliver this in a few seconds.")
+                report(queue_messages(guild_id, thread_ids, canned, who), thread_ids, "Delivered to {n} ticket(s).",
+                       "Queued. The bot is offline and will deliver this when it is back.")
             except Exception as e:
                 st.error(f"Error: {e}")
         else:
@@ -91,13 +381,89 @@ with col2:
     new_status = st.selectbox("Set Status", options=["open", "claimed", "closed"])
     set_status_btn = st.button("Update Status")
     if set_status_btn:
-        if thread_id:
+        if thread_ids:
             try:
-                set_ticket_status(int(thread_id), new_status)
-                st.success(f"Status set to {new_status}.")
+                report(set_ticket_status(guild_id, thread_ids, new_status), thread_ids, f"Status set to {new_status} on {{n}} ticket(s).",
+                       f"Status set to {new_status}. The bot is offline; the ticket will be notified when it is back.")
             except Exception as e:
                 st.error(f"Error: {e}")
         else:
             st.warning("Enter a Thread ID first.")
 
+st.subheader("Bulk Actions")
+bulk_matches = count_bulk_targets(version, *filters)
+st.caption(f"{bulk_matches} open or claimed ticket(s) match the sidebar filters. Bulk actions apply to all of them, not just the page shown.")
+b1, b2 = st.columns(2)
+with b1:
+    bulk_action = st.selectbox("Bulk action", options=["close", "reassign", "broadcast"])
+    bulk_staff = st.text_input("Reassign to (staff user ID)", value="")
+with b2:
+    bulk_message = st.text_area("Bulk message (broadcast; replaces the default notice for close and reassign)", height=80)
+    bulk_by = st.text_input("Bulk job started by (label)", value="dashboard")
+bulk_confirm = st.checkbox(f"Yes, {bulk_action} {bulk_matches} ticket(s)")
+if st.button("Start Bulk Job", disabled=not bulk_matches or not bulk_confirm):
+    if bulk_action == "reassign" and not bulk_staff.strip().isdigit():
+        st.warning("Enter the staff user ID to reassign the tickets to.")
+    elif bulk_action == "broadcast" and not bulk_message.strip():
+        st.warning("A broadcast needs a message.")
+    else:
+        try:
+            job_id, total = create_bulk_job(filters, bulk_action, {"message": bulk_message.strip() or None,
+                                                                   "staff_id": int(bulk_staff) if bulk_staff.strip().isdigit() else None}, bulk_by)
+            st.success(f"Bulk job #{job_id} queued for {total} ticket(s).")
+        except Exception as e:
+            st.error(f"Error: {e}")
+for job in list_bulk_jobs(version, guild_id):
+    finished = job["done"] + job["failed"] + job["skipped"]
+    j1, j2 = st.columns([4, 1])
+    j1.progress(finished / job["total"] if job["total"] else 1.0,
+                text=f"#{job['id']} {job['action']} by {job['created_by']} · {job['status']} · {job['done']} done, {job['failed']} failed, "
+                     f"{job['skipped']} skipped of {job['total']}" + (f" · last error: {job['last_error']}" if job["last_error"] else ""))
+    if job["status"] in ("pending", "running") and j2.button("Cancel", key=f"cancel_bulk_{job['id']}"):
+        execute_write(CANCEL_BULK_JOB_SQL, [(job["id"], guild_id)])
+        st.rerun()
+if st.button("Refresh Bulk Jobs"):
+    st.rerun()
+
+st.subheader("Dead Letters")
+dead = list_dead_letters(version, guild_id)
+if dead.empty:
+    st.info("No undeliverable messages.")
+else:
+    st.dataframe(dead, width="stretch")
+    requeue_ids = st.multiselect("Messages to requeue", options=dead["id"].tolist())
+    if st.button("Requeue Selected") and requeue_ids:
+        try:
+            requeue_dead_letters(requeue_ids)
+            st.success(f"Requeued {len(requeue_ids)} message(s).")
+        except Exception as e:
+            st.error(f"Error: {e}")
+
+st.subheader("Transcripts")
+transcript_ticket = st.text_input("Ticket # (transcript)", value="", placeholder="Ticket ID from the table; archived when the ticket is closed")
+if transcript_ticket.strip().isdigit():
+    job, pages = get_transcript(version, guild_id, int(transcript_ticket))
+    if job is None:
+        st.info("No transcript for this ticket. Transcripts are archived when a ticket is closed.")
+    else:
+        st.caption(f"{job['status']} · {job['messages']} messages · {job['pages']} pages" + (f" · last error: {job['last_error']}" if job["last_error"] else ""))
+        if pages:
+            page_no = st.number_input("Transcript page", min_value=1, max_value=len(pages), value=1, step=1)
+            page = pages[int(page_no) - 1]
+            try:
+                records = load_transcript_page(job["path"], page["byte_offset"], page["byte_length"])
+            except OSError as e:
+                st.error(f"Archive file unavailable: {e}")
+                records = []
+            for m in records:
+                files = " ".join(f"[{escape_markdown(a['filename'])}]({a['url']}) ({a['size'] // 1024} KB)" for a in m["attachments"])
+                st.markdown(f"**{escape_markdown(m['author'] or 'unknown')}** · {m['created_at']}  \n{escape_markdown(m['content'])}" + (f"  \n📎 {files}" if files else ""))
+
+st.subheader("Storage")
+retention_report = load_retention_report(version)
+if retention_report is None:
+    st.info("No retention run yet. Enable `[retention]` in config.toml, or run `python retention.py run`.")
+else:
+    st.text(format_report(retention_report))
+
 st.caption("Tip: Run the bot and this dashboard at the same time. Both share the same SQLite database for seamless ops.")
@@ -0,0 +1,33 @@
+import asyncio
+import os
+import sqlite3
+
+import db
+
+
+def test_data_version_only_moves_for_other_connections(tmp_path):
+    async def main():
+        path = os.path.join(tmp_path, "bot.db")
+        await db.ensure_schema(path)
+        try:
+            start = await db.data_version(path)
+            await db.set_kv(path, "a", "1")
+            assert await db.data_version(path) == start
+
+            con = sqlite3.connect(path)
+            con.execute("INSERT INTO kv (key, value) VALUES ('dashboard', '1')")
+            con.commit()
+            after_external = await db.data_version(path)
+            assert after_external != start
+            assert await db.data_version(path) == after_external
+
+            # Our own commit and another process's landing in the same poll interval still count as a change.
+            await db.set_kv(path, "b", "2")
+            con.execute("INSERT INTO kv (key, value) VALUES ('dashboard', '2') ON CONFLICT (key) DO UPDATE SET value = excluded.value")
+            con.commit()
+            con.close()
+            assert await db.data_version(path) != after_external
+        finally:
+            await db.close_db(path)
+
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+import db
+import integrations
+
+STEAM_ID = "76561190000000001"
+
+
+@pytest.fixture(autouse=True)
+def reset_integrations():
+    saved = dict(integrations.SETTINGS)
+    yield
+    integrations.SETTINGS.clear()
+    integrations.SETTINGS.update(saved)
+    integrations.configure()
+
+
+@asynccontextmanager
+async def profile_server(latency: Dict[str, float], **settings):
+    # Serves /<provider>/<key> like the real profile APIs and counts upstream requests per provider.
+    hits: Dict[str, int] = {}
+
+    async def handler(request: web.Request):
+        provider = request.match_info["provider"]
+        hits[provider] = hits.get(provider, 0) + 1
+        await asyncio.sleep(latency.get(provider, 0))
+        return web.json_response({"id": request.match_info["key"], "source": provider})
+
+    app = web.Application()
+    app.router.add_get("/{provider}/{key}", handler)
+    server = TestServer(app)
+    await server.start_server()
+    base = str(server.make_url("")).rstrip("/")
+    integrations.SETTINGS["db_path"] = None
+    integrations.configure(kofi_url=f"{base}/kofi", steam_url=f"{base}/steam", cftools_url=f"{base}/cftools", **settings)
+    try:
+        yield hits
+    finally:
+        await integrations.close()
+        await server.close()
+
+
+def test_concurrent_lookups_share_one_request():
+    async def main():
+        async with profile_server({"steam": 0.05}) as hits:
+            results = await asyncio.gather(*(integrations.lookup("steam", STEAM_ID) for _ in range(50)))
+            assert hits == {"steam": 1}
+            assert all(r == {"steam": {"id": STEAM_ID, "source": "steam"}} for r in results)
+            assert not integrations._inflight
+
+    asyncio.run(main())
+
+
+def test_slow_provider_is_left_out_at_the_timeout():
+    async def main():
+        async with profile_server({"steam": 0.5}, timeout_seconds=0.1) as hits:
+            start = time.perf_counter()
+            ctx = await integrations.enrich_context("https://ko-fi.com/player1", STEAM_ID, "cf1")
+            assert time.perf_counter() - start < 0.4
+            assert sorted(ctx) == ["cftools", "kofi"]
+            # The timed-out request keeps going in the background and warms the cache for the next lookup.
+            await asyncio.gather(*integrations._inflight.values())
+            assert await integrations.lookup("steam", STEAM_ID) == {"steam": {"id": STEAM_ID, "source": "steam"}}
+            assert hits == {"kofi": 1, "steam": 1, "cftools": 1}
+
+    asyncio.run(main())
+
+
+def test_cache_entries_expire_after_the_ttl():
+    async def main():
+        async with profile_server({}, cache_ttl_seconds=0.2) as hits:
+            await integrations.lookup("steam", STEAM_ID)
+            await integrations.lookup("steam", STEAM_ID)
+            assert hits == {"steam": 1}
+            await asyncio.sleep(0.3)
+            await integrations.lookup("steam", STEAM_ID)
+            assert hits == {"steam": 2}
+
+    asyncio.run(main())
+
+
+def test_cache_evicts_the_least_recently_used_key():
+    async def main():
+        async with profile_server({}, cache_size=2) as hits:
+            await integrations.lookup("cftools", "a")
+            await integrations.lookup("cftools", "b")
+            await integrations.lookup("cftools", "a")
+            await integrations.lookup("cftools", "c")
+            assert hits == {"cftools": 3}
+            await integrations.lookup("cftools", "a")
+            assert hits == {"cftools": 3}
+            await integrations.lookup("cftools", "b")
+            assert hits == {"cftools": 4}
+
+    asyncio.run(main())
+
+
+def test_lookups_persist_to_and_reload_from_sqlite(tmp_path):
+    async def main():
+        path = os.path.join(tmp_path, "enrich.db")
+        await db.ensure_schema(path)
+        try:
+            async with profile_server({}) as hits:
+                integrations.configure(db_path=path)
+                payload = await integrations.lookup("steam", f"https://steamcommunity.com/profiles/{STEAM_ID}/")
+                row = await db.get_cached_enrichment(path, "steam", STEAM_ID, 0)
+                assert row is not None and row["payload"] == '{"steam": {"id": "%s", "source": "steam"}}' % STEAM_ID
+
+                # A fresh memory cache on the same file, as after a restart, is served from enrichment_cache.
+                integrations.configure()
+                assert await integrations.lookup("steam", STEAM_ID) == payload
+                assert hits == {"steam": 1}
+
+                # Rows older than the TTL are refetched.
+                await db.put_cached_enrichment(path, "steam", STEAM_ID, row["payload"], time.time() - 7200)
+                integrations.configure(cache_ttl_seconds=3600)
+                assert await integrations.lookup("steam", STEAM_ID) == payload
+                assert hits == {"steam": 2}
+        finally:
+            await db.close_db(path)
+
+    asyncio.run(main())
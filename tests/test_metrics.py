@@ -0,0 +1,62 @@
+import asyncio
+import json
+from typing import Dict, List, Tuple
+
+import discord
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from discord.http import HTTPClient, Route
+
+import metrics
+# A 429 needs the Via header, or discord.py treats it as a Cloudflare ban.
+# Responses the fake Discord API gives, per path, in order. A 429 needs the Via header or discord.py treats it as a Cloudflare ban.
+RATE_LIMITED = {"Via": "1.1 google"}
+
+
+def too_many(retry_after: float, is_global: bool = False) -> Tuple[int, Dict, Dict[str, str]]:
+    return 429, {"message": "You are being rate limited.", "retry_after": retry_after, "global": is_global}, RATE_LIMITED
+
+
+async def fake_discord(script: Dict[str, List[Tuple[int, Dict, Dict[str, str]]]]) -> TestServer:
+    async def handler(request: web.Request):
+        status, body, headers = script[request.path].pop(0) if script.get(request.path) else (200, {}, {})
+        # Discord sends a bare application/json content type; discord.py only parses the body as JSON when it matches exactly.
+        return web.Response(body=json.dumps(body).encode(), status=status, headers={"Content-Type": "application/json", **headers})
+
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handler)
+    server = TestServer(app)
+    await server.start_server()
+    return server
+
+
+def rate_limited(method: str, scope: str) -> float:
+    return metrics.DISCORD_RATE_LIMITED.labels(method, scope).value
+
+
+def test_each_discord_429_is_counted_once(monkeypatch):
+    # Drives discord.py's own HTTPClient, so the filter sees the exact records discord.http logs.
+    metrics.watch_discord_rate_limits()
+
+    async def main():
+        server = await fake_discord({
+            "/users/@me": [too_many(0.01), (200, {"id": "1", "username": "bot"}, {})],
+            "/channels/1/messages": [too_many(0.01, is_global=True), (200, {}, {}), too_many(60)],
+        })
+        monkeypatch.setattr(Route, "BASE", str(server.make_url("")).rstrip("/"))
+        http = HTTPClient(asyncio.get_running_loop(), max_ratelimit_timeout=30)
+        before = {(m, s): rate_limited(m, s) for m in ("GET", "POST") for s in ("route", "global")}
+        try:
+            await http.static_login("token")
+            await http.request(Route("POST", "/channels/{channel_id}/messages", channel_id=1))
+            # Over max_ratelimit_timeout discord.py gives up instead of retrying; that raises, it isn't counted here.
+            with pytest.raises(discord.RateLimited):
+                await http.request(Route("POST", "/channels/{channel_id}/messages", channel_id=1))
+            await asyncio.sleep(0)
+        finally:
+            await http.close()
+            await server.close()
+        return {key: rate_limited(*key) - value for key, value in before.items()}
+
+    assert asyncio.run(main()) == {("GET", "route"): 1, ("GET", "global"): 0, ("POST", "route"): 0, ("POST", "global"): 1}
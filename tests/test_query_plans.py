@@ -0,0 +1,191 @@
+import asyncio
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+import analytics
+import db
+import transcripts
+from bench import generate_ticket_rows
+from guild_settings import GuildSettingsCache
+from retention import Retention
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Every query db.py and the dashboard send must use an index; `python bench.py plans` runs the same check with a report.
+
+def capture_queries(statements: Dict[str, str], source: List[str]):
+    # Routes every sqlite3 connection (aiosqlite uses sqlite3.connect too) through a trace callback.
+    real_connect = sqlite3.connect
+
+    def traced_connect(*args, **kwargs):
+        con = real_connect(*args, **kwargs)
+        con.set_trace_callback(lambda sql: statements.setdefault(" ".join(sql.split()), source[0]))
+        return con
+
+    sqlite3.connect = traced_connect
+    return real_connect
+
+async def exercise_db(path: str):
+    await db.add_ticket(path, 1, "alice", "legacy ticket", 1, 500)
+    ticket_id = await db.add_ticket_full(path, user_id=2, username="bob", reason="dupe glitch", guild_id=1, thread_id=None, channel_id=None,
+                                         forum_post_id=None, category="Bug Report", ko_fi=None, steam_id="76561190000000001", cftools_id=None, status="pending")
+    await db.finalize_ticket(path, ticket_id, thread_id=None, channel_id=600, forum_post_id=700)
+    await db.fail_stale_pending_tickets(path, 900)
+    await db.set_ticket_status(path, 500, "claimed", claimed_by=42)
+    await db.set_ticket_status_by_id(path, ticket_id, "claimed", claimed_by=42)
+    await db.get_ticket_by_thread(path, 500)
+    await db.get_ticket_by_channel(path, 600)
+    await db.get_ticket_by_channel(path, 600, 1)
+    await db.list_active_tickets(path)
+    await db.list_tickets(path)
+    await db.list_tickets(path, "open")
+    await db.list_tickets(path, "open", guild_id=1)
+    await db.queue_message(path, 500, "hello", guild_id=1)
+    await db.fetch_outbox(path)
+    rows = await db.claim_outbox(path, "plans", 10, shard=(0, 1))
+    await db.mark_outbox_delivered(path, rows[0]["id"])
+    await db.mark_outbox_delivered_many(path, [rows[0]["id"]])
+    await db.queue_message(path, 501, "will fail", guild_id=1)
+    rows = await db.claim_outbox(path, "plans", 10)
+    await db.record_outbox_failures(path, [(rows[0]["id"], 8, None, "NotFound")])
+    await db.list_dead_letters(path)
+    await db.outbox_stats(path)
+    await db.search(path, "glitch")
+    await db.search(path, "glitch", guild_id=1)
+    settings = GuildSettingsCache(path, {1: {"support_channel_id": 10, "ticket_categories": {"Bug Report": 0}}})
+    await settings.get(1)
+    await settings.update(1, staff_role_id=20)
+    await settings.get(2)
+    await settings.refresh_if_changed()
+    await db.set_kv(path, "command_sync_hash", "0" * 64)
+    await db.get_kv(path, "command_sync_hash")
+    await db.add_warm_channel(path, 900, 1, 5)
+    await db.warm_pool_counts(path)
+    await db.take_warm_channel(path, 1, 5)
+    await db.get_ticket_by_id(path, ticket_id)
+    await db.ticket_events_since(path, 0, 100)
+    await db.save_ticket_timers(path, [(ticket_id, "remind", time.time())], [(ticket_id, "escalate")], ("timers_cursor", "1"))
+    await db.load_ticket_timers(path)
+    await db.put_cached_enrichment(path, "steam", "76561190000000001", "{}", time.time())
+    await db.get_cached_enrichment(path, "steam", "76561190000000001", 0)
+    await db.data_version(path)
+    await db.requeue_outbox(path, [rows[0]["id"]])
+    await db.record_outbox_failures(path, [(rows[0]["id"], 8, None, "NotFound")])
+    await db.enqueue_transcript_job(path, ticket_id, 600, transcripts.transcript_path(ticket_id))
+    jobs = await db.claim_transcript_jobs(path, "plans", 2, 60)
+    await db.record_transcript_page(path, ticket_id, 0, 0, 100, 1, 2, 2, time.time() + 60)
+    await db.finish_transcript_job(path, jobs[0]["ticket_id"], "done")
+    await db.get_transcript_job(path, ticket_id)
+    await db.list_transcript_pages(path, ticket_id)
+    await analytics.backfill(path)
+    await analytics.apply_events(path)
+    await db.count_bulk_targets(path, 1, category="Bug Report")
+    job_id, _ = await db.create_bulk_job(path, 1, "close", {"message": None}, "plans", status="claimed", claimed_by=42)
+    job = await db.claim_bulk_job(path, "plans", 60)
+    await db.get_bulk_job(path, job_id)
+    items = await db.list_bulk_items(path, job["id"], 50)
+    started = await db.start_bulk_items(path, job["id"], [i["ticket_id"] for i in items], time.time() + 60)
+    await db.finish_bulk_items(path, job["id"], [(t, "done", 1, None) for t in started], time.time() + 60, "closed")
+    await db.finish_bulk_job(path, job["id"], "done")
+    job_id, _ = await db.create_bulk_job(path, 1, "broadcast", {"message": "hi"}, "plans", created_to="2999-01-01")
+    job = await db.claim_bulk_job(path, "plans", 60)
+    await db.start_bulk_items(path, job["id"], [i["ticket_id"] for i in await db.list_bulk_items(path, job["id"], 50)], time.time() + 60)
+    await db.finish_bulk_job(path, job["id"], "pending")
+    # Archive every closed ticket (this one with its transcript) and delivered message, as if they were old enough.
+    await db.set_ticket_status_by_id(path, ticket_id, "closed")
+    archive = os.path.splitext(path)[0] + "-archive.db"
+    report = await Retention(path, archive, days={"tickets": 1, "outbox": 1, "dead_letters": 36500}, batch_size=100, pause=0).run(now=time.time() + 2 * 86400)
+    assert report["archived"]["tickets"] > 0, report
+    await Retention(path, archive, days={"tickets": 1, "outbox": 1, "dead_letters": 1}).run_if_due()
+
+def exercise_dashboard(tmp: str, path: str):
+    from streamlit.testing.v1 import AppTest
+
+    with open(os.path.join(tmp, "config.toml"), "w") as f:
+        f.write(f'[discord]\nbot_token = ""\nguild_id = 1\nsupport_channel_id = 1\nstaff_role_id = 1\n[app]\ndb_path = "{path}"\n')
+    cwd = os.getcwd()
+    os.chdir(tmp)
+    try:
+        at = AppTest.from_file(os.path.join(ROOT, "streamlit_app.py")).run(timeout=60)
+        by_label = lambda widgets, label: next(w for w in widgets if w.label.startswith(label))
+        by_label(at.text_input, "Search").input("glitch").run()
+        by_label(at.sidebar.selectbox, "Status").select("open").run()
+        by_label(at.sidebar.selectbox, "Category").select("Bug Report").run()
+        by_label(at.sidebar.text_input, "Claimed by").input("42").run()
+        by_label(at.sidebar.selectbox, "Category").select("all").run()
+        by_label(at.sidebar.selectbox, "Status").select("all").run()
+        by_label(at.sidebar.text_input, "Claimed by").input("").run()
+        by_label(at.button, "Older").click().run()
+        by_label(at.text_input, "Thread ID").input("500").run()
+        by_label(at.text_area, "Message").input("from the dashboard").run()
+        by_label(at.button, "Queue Message").click().run()
+        by_label(at.button, "Update Status").click().run()
+        by_label(at.selectbox, "Bulk action").select("broadcast").run()
+        by_label(at.text_area, "Bulk message").input("maintenance tonight").run()
+        by_label(at.checkbox, "Yes, broadcast").check().run()
+        by_label(at.button, "Start Bulk Job").click().run()
+        by_label(at.button, "Cancel").click().run()
+        dead = by_label(at.multiselect, "Messages to requeue")
+        dead.select(dead.options[0]).run()
+        by_label(at.button, "Requeue Selected").click().run()
+        by_label(at.text_input, "Ticket #").input("2").run()
+        by_label(at.checkbox, "Include archived").check().run()
+        by_label(at.text_input, "Search").input("dupe").run()
+        at.sidebar.radio[0].set_value("Analytics").run()
+        by_label(at.selectbox, "Window").select("Last 48 hours").run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+    finally:
+        os.chdir(cwd)
+
+# One row per guild: reading all of them is the right plan.
+SMALL_TABLES = {"guild_settings"}
+SKIP_PLAN = re.compile(r"^(--|PRAGMA|BEGIN|COMMIT|ROLLBACK|CREATE|ALTER|DROP|SAVEPOINT|RELEASE|ATTACH|DETACH|VACUUM|INSERT INTO \w+ ?\([^)]*\) VALUES)", re.I)
+
+async def collect_full_scans(rows: int) -> Tuple[int, List[Tuple[str, str, List[str]]]]:
+    # Runs migrations, db.py and the dashboard against `rows` tickets, then EXPLAINs every distinct statement they sent.
+    statements: Dict[str, str] = {}
+    source = ["migrations"]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "plans.db")
+        real_connect = capture_queries(statements, source)
+        try:
+            await db.migrate(path)
+            con = real_connect(path)
+            con.executemany(
+                "INSERT INTO tickets (user_id, username, reason, guild_id, thread_id, channel_id, forum_post_id, category, steam_id, status) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                generate_ticket_rows(rows)
+            )
+            con.commit()
+            con.close()
+            source[0] = "db.py"
+            await exercise_db(path)
+            await db.close_db(path)
+            source[0] = "streamlit_app.py"
+            exercise_dashboard(tmp, path)
+        finally:
+            sqlite3.connect = real_connect
+
+        con = sqlite3.connect(path)
+        con.execute("ATTACH DATABASE ? AS archive", (os.path.splitext(path)[0] + "-archive.db",))
+        tables = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        checked = 0
+        full_scans = []
+        for sql, origin in statements.items():
+            if origin == "migrations" or SKIP_PLAN.match(sql):
+                continue
+            checked += 1
+            plan = [r[3] for r in con.execute(f"EXPLAIN QUERY PLAN {sql}")]
+            if any((m := re.match(r"SCAN (\w+)$", p)) and m.group(1) in tables - SMALL_TABLES for p in plan):
+                full_scans.append((origin, sql, plan))
+        con.close()
+    return checked, full_scans
+
+def test_hot_queries_use_an_index():
+    checked, full_scans = asyncio.run(collect_full_scans(2000))
+    assert checked > 100
+    assert not full_scans, "\n".join(f"[{origin}] {sql[:160]}: {plan}" for origin, sql, plan in full_scans)
@@ -0,0 +1,61 @@
+import asyncio
+import os
+import sqlite3
+import time
+
+import db
+from retention import Retention
+
+# Tables keyed by ticket_id that must not outlive their ticket in the main database.
+TICKET_CHILDREN = ("ticket_timers", "bulk_job_items", "ticket_events", "transcript_jobs", "transcript_pages")
+
+
+async def open_ticket(path: str, user_id: int) -> int:
+    ticket_id = await db.add_ticket_full(path, user_id=user_id, username=f"player{user_id}", reason="stuck in wall", guild_id=1,
+                                         thread_id=None, channel_id=600 + user_id, forum_post_id=None, category="Bug Report",
+                                         ko_fi=None, steam_id=None, cftools_id=None, status="open")
+    await db.save_ticket_timers(path, [(ticket_id, "remind", time.time() + 3600)], [], None)
+    return ticket_id
+
+
+def test_archiving_leaves_no_orphans_in_main(tmp_path):
+    async def main():
+        path = os.path.join(tmp_path, "bot.db")
+        archive = os.path.join(tmp_path, "bot-archive.db")
+        await db.ensure_schema(path)
+        try:
+            done, in_flight, still_open = [await open_ticket(path, user_id) for user_id in (1, 2, 3)]
+            job_id, _ = await db.create_bulk_job(path, 1, "broadcast", {"message": "maintenance"}, "test")
+            job = await db.claim_bulk_job(path, "test", 60)
+            await db.start_bulk_items(path, job["id"], [done, in_flight], time.time() + 60)
+            await db.finish_bulk_items(path, job["id"], [(done, "done", 1, None)], time.time() + 60)
+            await db.enqueue_transcript_job(path, done, 601, "transcripts/1.jsonl.gz")
+            await db.finish_transcript_job(path, done, "done")
+            for ticket_id in (done, in_flight):
+                await db.set_ticket_status_by_id(path, ticket_id, "closed")
+
+            report = await Retention(path, archive, days={"tickets": 1, "outbox": 0, "dead_letters": 0}, pause=0).run(now=time.time() + 2 * 86400)
+        finally:
+            await db.close_db(path)
+        return done, in_flight, still_open, report
+
+    done, in_flight, still_open, report = asyncio.run(main())
+    # The ticket whose bulk item is still applying waits for the job; the open one isn't old enough to matter.
+    assert report["archived"]["tickets"] == 1
+    con = sqlite3.connect(os.path.join(tmp_path, "bot.db"))
+    try:
+        assert [r[0] for r in con.execute("SELECT id FROM tickets ORDER BY id")] == [in_flight, still_open]
+        for table in TICKET_CHILDREN:
+            orphans = con.execute(f"SELECT COUNT(*) FROM {table} WHERE ticket_id NOT IN (SELECT id FROM tickets)").fetchone()[0]
+            assert orphans == 0, table
+        assert con.execute("SELECT COUNT(*) FROM ticket_events WHERE ticket_id = ?", (in_flight,)).fetchone()[0] > 0
+        # The job keeps its progress after its finished item is gone.
+        assert con.execute("SELECT done FROM bulk_jobs").fetchone()[0] == 1
+    finally:
+        con.close()
+    con = sqlite3.connect(os.path.join(tmp_path, "bot-archive.db"))
+    try:
+        assert [r[0] for r in con.execute("SELECT id FROM tickets")] == [done]
+        assert [r[0] for r in con.execute("SELECT ticket_id FROM transcript_jobs")] == [done]
+    finally:
+        con.close()
@@ -0,0 +1,107 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from db import data_version, get_ticket_by_channel, get_ticket_by_id, list_active_tickets, set_ticket_status_by_id
+
+ACTIVE_STATUSES = ("pending", "open", "claimed")
+DISCORD_ID_FIELDS = ("thread_id", "channel_id", "forum_post_id")
+
+OwnerKey = Tuple[int, int, str]  # (guild_id, user_id, category)
+
+
+def owner_key(row: Dict[str, Any]) -> OwnerKey:
+    return (row.get("guild_id") or 0, row.get("user_id") or 0, row.get("category") or "Uncategorized")
+
+
+class TicketIndex:
+    # Maps every Discord ID a ticket owns (thread, private channel, forum post) to its row for active
+    # tickets. SQLite stays authoritative: writes go to the DB first, and commits made by other processes
+    # (the dashboard) trigger a reload via PRAGMA data_version.
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._by_discord_id: Dict[int, Dict[str, Any]] = {}
+        self._by_ticket_id: Dict[int, Dict[str, Any]] = {}
+        self._by_owner: Dict[OwnerKey, Dict[int, Dict[str, Any]]] = {}
+        self._data_version: Optional[int] = None
+
+    def __len__(self) -> int:
+        return len(self._by_ticket_id)
+
+    async def warm(self):
+        self._data_version = await data_version(self.db_path)
+        self._load(await list_active_tickets(self.db_path))
+
+    def _load(self, rows: Iterable[Dict[str, Any]]):
+        by_discord_id: Dict[int, Dict[str, Any]] = {}
+        by_ticket_id: Dict[int, Dict[str, Any]] = {}
+        by_owner: Dict[OwnerKey, Dict[int, Dict[str, Any]]] = {}
+        for row in rows:
+            by_ticket_id[row["id"]] = row
+            by_owner.setdefault(owner_key(row), {})[row["id"]] = row
+            for field in DISCORD_ID_FIELDS:
+                if row.get(field):
+                    by_discord_id[row[field]] = row
+        self._by_discord_id = by_discord_id
+        self._by_ticket_id = by_ticket_id
+        self._by_owner = by_owner
+
+    async def refresh_if_changed(self) -> bool:
+        version = await data_version(self.db_path)
+        if version == self._data_version:
+            return False
+        self._data_version = version
+        self._load(await list_active_tickets(self.db_path))
+        return True
+
+    def put(self, row: Dict[str, Any]):
+        old = self._by_ticket_id.pop(row["id"], None)
+        if old is not None:
+            for field in DISCORD_ID_FIELDS:
+                if old.get(field):
+                    self._by_discord_id.pop(old[field], None)
+            owned = self._by_owner.get(owner_key(old))
+            if owned is not None:
+                owned.pop(row["id"], None)
+                if not owned:
+                    del self._by_owner[owner_key(old)]
+        if row.get("status") not in ACTIVE_STATUSES:
+            return
+        self._by_ticket_id[row["id"]] = row
+        self._by_owner.setdefault(owner_key(row), {})[row["id"]] = row
+        for field in DISCORD_ID_FIELDS:
+            if row.get(field):
+                self._by_discord_id[row[field]] = row
+
+    def get(self, discord_id: int) -> Optional[Dict[str, Any]]:
+        return self._by_discord_id.get(discord_id)
+
+    def owned(self, guild_id: int, user_id: int, category: str) -> List[Dict[str, Any]]:
+        # A user's active tickets in one category that have a channel or thread to point them to, oldest first.
+        rows = self._by_owner.get((guild_id, user_id, category))
+        if not rows:
+            return []
+        return sorted((r for r in rows.values() if r.get("channel_id") or r.get("thread_id")), key=lambda r: r["id"])
+
+    async def resolve(self, discord_id: int, guild_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        # Active tickets answer from memory; closed or unknown IDs fall back to one indexed lookup.
+        # With guild_id, a ticket belonging to another guild is treated as unknown.
+        row = self._by_discord_id.get(discord_id)
+        if row is not None:
+            return row if guild_id is None or row.get("guild_id") == guild_id else None
+        return await get_ticket_by_channel(self.db_path, discord_id, guild_id)
+
+    async def resolve_id(self, ticket_id: int) -> Optional[Dict[str, Any]]:
+        row = self._by_ticket_id.get(ticket_id)
+        return row if row is not None else await get_ticket_by_id(self.db_path, ticket_id)
+
+    async def set_status(self, ticket_id: int, status: str, claimed_by: Optional[int] = None):
+        await set_ticket_status_by_id(self.db_path, ticket_id, status, claimed_by=claimed_by)
+        self.mark(ticket_id, status, claimed_by)
+
+    def mark(self, ticket_id: int, status: str, claimed_by: Optional[int] = None):
+        # For a status change already committed, e.g. by a bulk job for a whole chunk of tickets.
+        row = self._by_ticket_id.get(ticket_id)
+        if row is not None:
+            row = dict(row, status=status)
+            if claimed_by is not None:
+                row["claimed_by"] = claimed_by
+            self.put(row)
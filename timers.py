@@ -0,0 +1,164 @@
+import asyncio
+import heapq
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from db import get_kv, load_ticket_timers, save_ticket_timers, ticket_events_since
+from metrics import counter, gauge
+
+REMIND = "remind"
+ESCALATE = "escalate"
+AUTO_CLOSE = "auto_close"
+CURSOR_KEY = "timers_cursor"
+
+# Called with (ticket_id, kind, due_at) when a timer is due. Returns a new due time to re-arm it, or None.
+Handler = Callable[[int, str, float], Awaitable[Optional[float]]]
+
+FIRED = counter("sla_timers_fired_total", "SLA timers that came due, by kind and result (fired, rearmed, expired, retry, error)", ("kind", "result"))
+PENDING = gauge("sla_timers_pending", "Armed SLA timers")
+
+
+class TimerScheduler:
+    # SLA deadlines per ticket: a reminder and an escalation while a ticket sits unclaimed, and an inactivity
+    # auto-close while it is open or claimed. Deadlines are rows in ticket_timers and, in memory, a min-heap
+    # keyed by due time, so each tick looks only at the heap's top: O(log n) per fired or rescheduled timer,
+    # however many tickets exist. Schedules are derived from ticket_events (after a kv cursor), so status
+    # changes from the bot and the dashboard both re-arm or cancel them. Cancelled entries stay in the heap
+    # and are skipped when they surface (lazy deletion); `_due` holds each timer's current deadline. A handler
+    # that raises (Discord down, a 429 that got through) has its timer re-armed with exponential backoff, up to
+    # max_attempts; only then is the timer dropped.
+    def __init__(self, db_path: str, fire: Handler, *, remind_after: float = 0.0, escalate_after: float = 0.0,
+                 auto_close_after: float = 0.0, max_lateness: float = 3600.0, sync_interval: float = 1.0, batch_size: int = 1000,
+                 max_attempts: int = 5, retry_base: float = 30.0, retry_max: float = 600.0):
+        self.db_path = db_path
+        self.fire = fire
+        self.delays = {REMIND: remind_after, ESCALATE: escalate_after, AUTO_CLOSE: auto_close_after}
+        # A reminder or escalation later than this (e.g. the bot was down) is dropped instead of sent.
+        self.max_lateness = max_lateness
+        self.sync_interval = sync_interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        # Failed attempts per timer, in memory: a restart gives a failing timer a fresh set of retries.
+        self._attempts: Dict[Tuple[int, str], int] = {}
+        self._heap: List[Tuple[float, int, str]] = []
+        self._due: Dict[Tuple[int, str], float] = {}
+        self._cursor: Optional[int] = None
+        self._wakeup = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def next_due(self) -> Optional[float]:
+        while self._heap and self._due.get((self._heap[0][1], self._heap[0][2])) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    async def load(self):
+        # Once per process. Without a stored cursor every past event is replayed: that arms timers for tickets
+        # opened before this table existed (long-overdue reminders are then dropped by max_lateness).
+        self._heap = await load_ticket_timers(self.db_path)
+        self._due = {(ticket_id, kind): due_at for due_at, ticket_id, kind in self._heap}
+        self._cursor = int(await get_kv(self.db_path, CURSOR_KEY) or 0)
+        PENDING.set(len(self._due))
+
+    def _arm(self, changes: Dict[Tuple[int, str], Optional[float]], ticket_id: int, kind: str, at: float):
+        if self.delays[kind] > 0:
+            changes[(ticket_id, kind)] = at + self.delays[kind]
+
+    def plan(self, event: Dict[str, object], changes: Dict[Tuple[int, str], Optional[float]]):
+        # Maps one status event to timer changes: a due time to (re)arm, or None to cancel.
+        ticket_id, status, at = int(event["ticket_id"]), event["status"], float(event["at"])
+        if status == "open":
+            for kind in (REMIND, ESCALATE, AUTO_CLOSE):
+                self._arm(changes, ticket_id, kind, at)
+        elif status == "claimed":
+            changes[(ticket_id, REMIND)] = None
+            changes[(ticket_id, ESCALATE)] = None
+            self._arm(changes, ticket_id, AUTO_CLOSE, at)
+        elif status in ("closed", "failed"):
+            for kind in (REMIND, ESCALATE, AUTO_CLOSE):
+                changes[(ticket_id, kind)] = None
+
+    async def _apply(self, changes: Dict[Tuple[int, str], Optional[float]], cursor: Optional[int] = None):
+        upserts = [(ticket_id, kind, due) for (ticket_id, kind), due in changes.items() if due is not None]
+        deletes = [key for key, due in changes.items() if due is None and key in self._due]
+        if upserts or deletes or cursor is not None:
+            await save_ticket_timers(self.db_path, upserts, deletes, (CURSOR_KEY, str(cursor)) if cursor is not None else None)
+        earliest = self.next_due()
+        for ticket_id, kind, due in upserts:
+            self._due[(ticket_id, kind)] = due
+            heapq.heappush(self._heap, (due, ticket_id, kind))
+        for key in deletes:
+            self._due.pop(key, None)
+        PENDING.set(len(self._due))
+        if upserts and (earliest is None or min(u[2] for u in upserts) < earliest):
+            self._wakeup.set()
+
+    async def sync(self) -> int:
+        # Folds status events written since the last sync; the cost is the number of new events.
+        if self._cursor is None:
+            await self.load()
+        total = 0
+        while True:
+            events = await ticket_events_since(self.db_path, self._cursor, self.batch_size)
+            if not events:
+                return total
+            changes: Dict[Tuple[int, str], Optional[float]] = {}
+            for event in events:
+                self.plan(event, changes)
+            for key in changes:
+                self._attempts.pop(key, None)
+            await self._apply(changes, cursor=int(events[-1]["id"]))
+            self._cursor = int(events[-1]["id"])
+            total += len(events)
+            if len(events) < self.batch_size:
+                return total
+
+    async def run_due(self, now: Optional[float] = None) -> int:
+        now = time.time() if now is None else now
+        fired = 0
+        while (due_at := self.next_due()) is not None and due_at <= now:
+            _, ticket_id, kind = heapq.heappop(self._heap)
+            key = (ticket_id, kind)
+            self._due.pop(key, None)
+            rearm: Optional[float] = None
+            if kind != AUTO_CLOSE and now - due_at > self.max_lateness:
+                self._attempts.pop(key, None)
+                FIRED.labels(kind, "expired").inc()
+            else:
+                try:
+                    rearm = await self.fire(ticket_id, kind, due_at)
+                    FIRED.labels(kind, "rearmed" if rearm is not None else "fired").inc()
+                    self._attempts.pop(key, None)
+                except Exception as e:
+                    attempts = self._attempts.get(key, 0) + 1
+                    if attempts < self.max_attempts:
+                        self._attempts[key] = attempts
+                        rearm = now + min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+                        print(f"SLA timer {kind} for ticket {ticket_id} failed (attempt {attempts}), retrying:", e)
+                        FIRED.labels(kind, "retry").inc()
+                    else:
+                        self._attempts.pop(key, None)
+                        print(f"SLA timer {kind} for ticket {ticket_id} failed after {attempts} attempts:", e)
+                        FIRED.labels(kind, "error").inc()
+            # If the handler closed the ticket, the resulting event cancels its other timers on the next sync.
+            if rearm is not None:
+                await self._apply({key: rearm})
+            else:
+                await save_ticket_timers(self.db_path, [], [key])
+                PENDING.set(len(self._due))
+            fired += 1
+        return fired
+
+    async def step(self):
+        await self.sync()
+        await self.run_due()
+        due_at = self.next_due()
+        timeout = self.sync_interval if due_at is None else max(0.0, min(self.sync_interval, due_at - time.time()))
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
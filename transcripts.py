@@ -0,0 +1,196 @@
+import asyncio
+import gzip
+import json
+import os
+import random
+import socket
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from db import claim_transcript_jobs, enqueue_transcript_job, finish_transcript_job, record_transcript_page
+from metrics import counter, histogram
+
+# Resolves a Discord channel/thread ID to something with an async `history()`, or raises.
+Resolver = Callable[[int], Awaitable[Any]]
+
+PAGES_WRITTEN = counter("transcript_pages_total", "Transcript pages archived")
+MESSAGES_ARCHIVED = counter("transcript_messages_total", "Messages archived into transcripts")
+JOBS_FINISHED = counter("transcript_jobs_total", "Transcript jobs by result (done, retry, failed)", ("result",))
+JOB_SECONDS = histogram("transcript_job_seconds", "Wall time of a transcript job run", buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800))
+
+
+class _After:
+    # Minimal snowflake for history(after=...): discord.py only reads `.id`.
+    def __init__(self, id: int):
+        self.id = id
+
+
+def transcript_path(ticket_id: int) -> str:
+    return os.path.join(f"{ticket_id // 1000:04d}", f"ticket-{ticket_id}.jsonl.gz")
+
+
+def message_record(message: Any) -> Dict[str, Any]:
+    author = getattr(message, "author", None)
+    reference = getattr(message, "reference", None)
+    created_at = getattr(message, "created_at", None)
+    edited_at = getattr(message, "edited_at", None)
+    return {
+        "id": message.id,
+        "author_id": getattr(author, "id", None),
+        "author": str(author) if author is not None else None,
+        "created_at": created_at.isoformat() if created_at else None,
+        "edited_at": edited_at.isoformat() if edited_at else None,
+        "content": getattr(message, "content", ""),
+        "attachments": [
+            {"id": a.id, "filename": a.filename, "size": a.size, "content_type": getattr(a, "content_type", None), "url": a.url}
+            for a in getattr(message, "attachments", [])
+        ],
+        "embeds": len(getattr(message, "embeds", [])),
+        "reply_to": getattr(reference, "message_id", None),
+    }
+
+
+def encode_page(records: List[Dict[str, Any]]) -> bytes:
+    return gzip.compress("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8"), compresslevel=6)
+
+
+def read_page(archive_dir: str, path: str, byte_offset: int, byte_length: int) -> List[Dict[str, Any]]:
+    # Each page is a complete gzip member, so it decompresses without reading anything else in the file.
+    with open(os.path.join(archive_dir, path), "rb") as f:
+        f.seek(byte_offset)
+        data = f.read(byte_length)
+    return [json.loads(line) for line in gzip.decompress(data).decode("utf-8").splitlines() if line]
+
+
+def _append(full_path: str, committed: int, data: bytes) -> int:
+    # Drops whatever an interrupted run wrote past the last recorded page, then appends durably.
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, "r+b" if os.path.exists(full_path) else "wb") as f:
+        f.truncate(committed)
+        f.seek(committed)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    return len(data)
+
+
+class TranscriptArchiver:
+    # Archives closed tickets in the background. Jobs live in SQLite with a lease, so a crashed worker's
+    # jobs are picked up again once the lease lapses and resume after the last archived page.
+    def __init__(self, db_path: str, archive_dir: str, resolve: Resolver, *, concurrency: int = 2, page_size: int = 100,
+                 page_delay: float = 0.25, max_page_delay: float = 10.0, lease_seconds: float = 120.0, idle_interval: float = 5.0,
+                 max_attempts: int = 5, base_delay: float = 30.0, is_permanent: Callable[[Exception], bool] = lambda e: False,
+                 rate_limited: Callable[[], float] = lambda: 0.0):
+        self.db_path = db_path
+        self.archive_dir = archive_dir
+        self.resolve = resolve
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.page_delay = page_delay
+        self.max_page_delay = max_page_delay
+        self.lease_seconds = lease_seconds
+        self.idle_interval = idle_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.is_permanent = is_permanent
+        self.rate_limited = rate_limited
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{id(self):x}"
+        self._delay = page_delay
+        self._seen_rate_limits = rate_limited()
+        self._running: Set[asyncio.Task] = set()
+        self._wakeup = asyncio.Event()
+
+    async def enqueue(self, ticket_id: int, channel_id: int):
+        await enqueue_transcript_job(self.db_path, ticket_id, channel_id, transcript_path(ticket_id))
+        self._wakeup.set()
+
+    def notify(self):
+        # For jobs written by someone else in this process (bulk closes enqueue theirs with the chunk's results).
+        self._wakeup.set()
+
+    async def _pace(self):
+        # Every history page shares one delay. It doubles whenever discord.py reported a 429 since the
+        # last page and eases back towards page_delay otherwise, so archiving yields to interactive traffic.
+        seen = self.rate_limited()
+        if seen > self._seen_rate_limits:
+            self._delay = min(self.max_page_delay, self._delay * 2)
+        else:
+            self._delay = max(self.page_delay, self._delay * 0.75)
+        self._seen_rate_limits = seen
+        await asyncio.sleep(self._delay)
+
+    async def _write_page(self, job: Dict[str, Any], records: List[Dict[str, Any]]):
+        data = encode_page(records)
+        offset = job["bytes"]
+        await asyncio.to_thread(_append, os.path.join(self.archive_dir, job["path"]), offset, data)
+        await record_transcript_page(self.db_path, job["ticket_id"], job["pages"], offset, len(data),
+                                     records[0]["id"], records[-1]["id"], len(records), time.time() + self.lease_seconds)
+        job["bytes"] = offset + len(data)
+        job["pages"] += 1
+        job["last_message_id"] = records[-1]["id"]
+        PAGES_WRITTEN.inc()
+        MESSAGES_ARCHIVED.inc(len(records))
+
+    async def archive(self, job: Dict[str, Any]):
+        channel = await self.resolve(job["channel_id"])
+        after = _After(job["last_message_id"]) if job["last_message_id"] else None
+        # history() fetches 100 messages per request; only one page of records is held at a time.
+        records: List[Dict[str, Any]] = []
+        async for message in channel.history(limit=None, after=after, oldest_first=True):
+            records.append(message_record(message))
+            if len(records) >= self.page_size:
+                await self._write_page(job, records)
+                records = []
+                await self._pace()
+        if records:
+            await self._write_page(job, records)
+
+    async def _run(self, job: Dict[str, Any]):
+        start = time.perf_counter()
+        try:
+            await self.archive(job)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back right away instead of waiting for the lease to lapse.
+            await finish_transcript_job(self.db_path, job["ticket_id"], "pending", job.get("last_error"))
+            raise
+        except Exception as e:
+            message = f"{type(e).__name__}: {e}"[:500]
+            attempts = int(job["attempts"]) + 1
+            if self.is_permanent(e) or attempts >= self.max_attempts:
+                print(f"Transcript for ticket {job['ticket_id']} failed:", message)
+                JOBS_FINISHED.labels("failed").inc()
+                await finish_transcript_job(self.db_path, job["ticket_id"], "failed", message, attempts=attempts)
+            else:
+                delay = getattr(e, "retry_after", None) or self.base_delay * 2 ** (attempts - 1) * random.uniform(0.5, 1.0)
+                JOBS_FINISHED.labels("retry").inc()
+                await finish_transcript_job(self.db_path, job["ticket_id"], "pending", message, retry_at=time.time() + delay, attempts=attempts)
+        else:
+            JOBS_FINISHED.labels("done").inc()
+            await finish_transcript_job(self.db_path, job["ticket_id"], "done")
+        finally:
+            JOB_SECONDS.observe(time.perf_counter() - start)
+
+    def _done(self, task: asyncio.Task):
+        self._running.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print("Transcript worker error:", task.exception())
+        self._wakeup.set()
+
+    async def step(self):
+        free = self.concurrency - len(self._running)
+        if free > 0:
+            for job in await claim_transcript_jobs(self.db_path, self.owner, free, self.lease_seconds):
+                task = asyncio.create_task(self._run(job))
+                self._running.add(task)
+                task.add_done_callback(self._done)
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.idle_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def close(self):
+        tasks = list(self._running)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
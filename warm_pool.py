@@ -0,0 +1,201 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional, Set, Tuple
+
+import discord
+
+from db import add_warm_channel, take_warm_channel, warm_pool_counts
+from metrics import counter, gauge
+
+PoolKey = Tuple[int, int]  # (guild_id, parent category ID)
+
+POOL_CHANNEL_NAME = "ticket-pending"
+
+TAKES = counter("warm_pool_takes_total", "Ticket channel requests served by the warm pool, by result (hit, miss, stale)", ("result",))
+CREATED = counter("warm_pool_created_total", "Channels pre-created for the warm pool, by result (ok, failed)", ("result",))
+IDLE = gauge("warm_pool_idle_channels", "Idle pre-created ticket channels across all pools")
+
+
+class WarmPool:
+    # Keeps hidden, pre-created text channels under each ticket parent category, so opening a ticket is one
+    # channel edit (name + overwrites) instead of a create, which Discord rate-limits per guild. Pool channels
+    # are rows in SQLite and survive restarts. Each pool's target size follows its recent open rate (enough for
+    # lead_seconds of opens, between min_size and max_size); refills spend from a per-guild budget of
+    # creates_per_minute that halves whenever discord.py reported a 429 since the last step.
+    def __init__(self, db_path: str, get_guild: Callable[[int], Any], get_settings: Callable[[int], Awaitable[Dict[str, Any]]], *,
+                 guild_ids: Iterable[int] = (), min_size: int = 1, max_size: int = 10, lead_seconds: float = 300.0,
+                 window_seconds: float = 900.0, creates_per_minute: float = 10.0, idle_interval: float = 10.0,
+                 rate_limited: Callable[[], float] = lambda: 0.0):
+        self.db_path = db_path
+        self.get_guild = get_guild
+        self.get_settings = get_settings
+        self.guild_ids: Set[int] = {g for g in guild_ids if g}
+        self.min_size = min_size
+        self.max_size = max_size
+        self.lead_seconds = lead_seconds
+        self.window_seconds = window_seconds
+        self.creates_per_minute = creates_per_minute
+        self.idle_interval = idle_interval
+        self.rate_limited = rate_limited
+        self._counts: Optional[Dict[PoolKey, int]] = None
+        self._opens: Dict[PoolKey, Deque[float]] = {}
+        self._budget: Dict[int, Tuple[float, float]] = {}  # guild_id -> (tokens, last refill)
+        self._budget_scale = 1.0
+        self._seen_rate_limits = rate_limited()
+        self._wakeup = asyncio.Event()
+
+    def idle(self, key: Optional[PoolKey] = None) -> int:
+        counts = self._counts or {}
+        return counts.get(key, 0) if key is not None else sum(counts.values())
+
+    def target(self, key: PoolKey) -> int:
+        opens = self._opens.get(key)
+        cutoff = time.monotonic() - self.window_seconds
+        while opens and opens[0] < cutoff:
+            opens.popleft()
+        rate = len(opens or ()) / self.window_seconds
+        return max(self.min_size, min(self.max_size, math.ceil(rate * self.lead_seconds)))
+
+    async def load(self):
+        self._counts = await warm_pool_counts(self.db_path)
+        self.guild_ids.update(guild_id for guild_id, _ in self._counts)
+        IDLE.set(self.idle())
+
+    def add_guild(self, guild_id: int):
+        # Guilds come from the gateway (on_guild_available / on_guild_join), so every guild the bot is in gets its pools.
+        if guild_id not in self.guild_ids:
+            self.guild_ids.add(guild_id)
+            self._wakeup.set()
+
+    def remove_guild(self, guild_id: int):
+        self.guild_ids.discard(guild_id)
+
+    async def take(self, guild: discord.Guild, parent_id: int, name: str, overwrites: Dict[Any, discord.PermissionOverwrite],
+                   reason: Optional[str] = None) -> Optional[discord.TextChannel]:
+        # Returns a pool channel renamed and opened up to the ticket's user, or None (the caller creates one).
+        if self._counts is None:
+            await self.load()
+        key = (guild.id, parent_id)
+        self.guild_ids.add(guild.id)
+        self._opens.setdefault(key, deque()).append(time.monotonic())
+        self._wakeup.set()
+        for _ in range(3):
+            channel_id = await take_warm_channel(self.db_path, guild.id, parent_id)
+            if channel_id is None:
+                break
+            self._counts[key] = max(0, self._counts.get(key, 0) - 1)
+            IDLE.set(self.idle())
+            channel = guild.get_channel(channel_id)
+            if not isinstance(channel, discord.TextChannel):
+                # Deleted by hand while idle.
+                TAKES.labels("stale").inc()
+                continue
+            try:
+                await channel.edit(name=name, overwrites=self._with_bot(guild, overwrites), reason=reason)
+            except discord.NotFound:
+                TAKES.labels("stale").inc()
+                continue
+            except Exception as e:
+                # Its permissions are now unknown, so it can't go back into the pool.
+                print("Warm pool channel edit failed:", e)
+                TAKES.labels("stale").inc()
+                try:
+                    await channel.delete()
+                except Exception:
+                    pass
+                break
+            TAKES.labels("hit").inc()
+            return channel
+        TAKES.labels("miss").inc()
+        return None
+
+    def _pace(self):
+        seen = self.rate_limited()
+        if seen > self._seen_rate_limits:
+            self._budget_scale = max(1 / 16, self._budget_scale / 2)
+        else:
+            self._budget_scale = min(1.0, self._budget_scale * 1.25)
+        self._seen_rate_limits = seen
+
+    def _spend(self, guild_id: int) -> bool:
+        # Token bucket per guild; the burst is capped at a sixth of a minute's budget.
+        rate = self.creates_per_minute * self._budget_scale / 60
+        burst = max(1.0, self.creates_per_minute / 6)
+        now = time.monotonic()
+        tokens, last = self._budget.get(guild_id, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        if tokens < 1:
+            self._budget[guild_id] = (tokens, now)
+            return False
+        self._budget[guild_id] = (tokens - 1, now)
+        return True
+
+    @staticmethod
+    def _with_bot(guild: discord.Guild, overwrites: Dict[Any, discord.PermissionOverwrite]) -> Dict[Any, discord.PermissionOverwrite]:
+        # Pool channels are hidden from @everyone, so the bot keeps an explicit overwrite to see and manage them.
+        overwrites = dict(overwrites)
+        if guild.me is not None and guild.me not in overwrites:
+            overwrites[guild.me] = discord.PermissionOverwrite(view_channel=True, send_messages=True, read_message_history=True, manage_channels=True)
+        return overwrites
+
+    async def _create(self, guild: discord.Guild, parent: discord.CategoryChannel) -> bool:
+        overwrites = self._with_bot(guild, {guild.default_role: discord.PermissionOverwrite(view_channel=False)})
+        try:
+            channel = await guild.create_text_channel(POOL_CHANNEL_NAME, category=parent, overwrites=overwrites, reason="Ticket warm pool")
+        except Exception as e:
+            CREATED.labels("failed").inc()
+            print("Warm pool channel create failed:", e)
+            return False
+        await add_warm_channel(self.db_path, channel.id, guild.id, parent.id)
+        CREATED.labels("ok").inc()
+        key = (guild.id, parent.id)
+        self._counts[key] = self._counts.get(key, 0) + 1
+        return True
+
+    async def _drain(self, guild: discord.Guild, key: PoolKey):
+        # The category was unmapped: its idle channels are deleted, one per step.
+        channel_id = await take_warm_channel(self.db_path, *key)
+        self._counts[key] = max(0, self._counts.get(key, 0) - 1) if channel_id is not None else 0
+        channel = guild.get_channel(channel_id) if channel_id is not None else None
+        if channel is not None:
+            try:
+                await channel.delete(reason="Ticket category removed")
+            except discord.NotFound:
+                pass
+            except Exception as e:
+                print("Warm pool channel delete failed:", e)
+                await add_warm_channel(self.db_path, channel_id, *key)
+                self._counts[key] += 1
+
+    async def refill(self):
+        if self._counts is None:
+            await self.load()
+        self._pace()
+        for guild_id in list(self.guild_ids):
+            guild = self.get_guild(guild_id)
+            if guild is None:
+                continue
+            settings = await self.get_settings(guild_id)
+            parents = {p: guild.get_channel(p) for p in settings["ticket_categories"].values() if p}
+            parents = {p: c for p, c in parents.items() if isinstance(c, discord.CategoryChannel)}
+            for key in [k for k, n in self._counts.items() if k[0] == guild_id and n and k[1] not in parents]:
+                await self._drain(guild, key)
+            # Emptiest pool (relative to its target) first, while the guild's budget lasts.
+            while True:
+                short = [(self.idle((guild_id, p)) / self.target((guild_id, p)), p) for p in parents
+                         if self.idle((guild_id, p)) < self.target((guild_id, p))]
+                if not short or not self._spend(guild_id):
+                    break
+                if not await self._create(guild, parents[min(short)[1]]):
+                    break
+        IDLE.set(self.idle())
+
+    async def step(self):
+        await self.refill()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.idle_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()